@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+        from .authentication import token_changed, user_changed
+
+        post_save.connect(token_changed, sender=Token, dispatch_uid='auth-token-saved')
+        post_delete.connect(token_changed, sender=Token, dispatch_uid='auth-token-deleted')
+        post_save.connect(user_changed, sender=self.get_model('CustomUser'), dispatch_uid='auth-user-saved')
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Autenticación por token con caché.
+
+`TokenAuthentication` de DRF consulta el token y su usuario en cada
+petición. Con AUTH_TOKEN_CACHE, `CachedTokenAuthentication` guarda ambos en
+el caché de la API durante AUTH_TOKEN_CACHE_TIMEOUT segundos, bajo el
+SHA-256 del token para no dejar tokens en claro en el caché; sin él se
+comporta como `TokenAuthentication`.
+
+La entrada se borra en cuanto el token deja de ser válido o el usuario
+cambia: al eliminar o rotar el token (logout, restablecimiento de
+contraseña) y al guardar el usuario (cambio de contraseña, desactivación).
+Para que eso llegue a todos los procesos el caché debe ser compartido, por
+eso AUTH_TOKEN_CACHE está desactivado por defecto con LocMemCache. Los
+cambios hechos con `QuerySet.update()` no emiten señales y solo se notan
+al expirar la entrada.
+
+`SignedTokenAuthentication` acepta los tokens de acceso firmados de
+`signed_tokens` (`Authorization: Bearer <token>`) sin consultar nada.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from binmap_api.cache import get_cache
+from .signed_tokens import read_access_token
+
+
+def _cache_key(key):
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def forget_token(key):
+    get_cache().delete(_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE:
+            return super().authenticate_credentials(key)
+        cache = get_cache()
+        cache_key = _cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            return user, token
+        return token.user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Cabecera Bearer no válida")
+        try:
+            token = auth[1].decode()
+            return read_access_token(token), token
+        except (UnicodeError, signing.BadSignature):
+            raise exceptions.AuthenticationFailed("El token de acceso no es válido o expiró")
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+def token_changed(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        # Cada login actualiza last_login; no afecta a la autenticación
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        forget_token(key)
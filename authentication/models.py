@@ -10,3 +10,17 @@ class CustomUser(AbstractUser):
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ["username", "password", "first_name", "last_name"]
+
+
+class RefreshToken(models.Model):
+    """
+    Token de renovación de los tokens de acceso firmados. Solo se guarda el
+    SHA-256 del token; cada uso lo revoca y emite otro de la misma familia.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='refresh_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    family = models.UUIDField(default=uuid.uuid4, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Tokens de acceso firmados y tokens de renovación rotativos.
+
+El token de acceso es un valor firmado con `django.core.signing` (clave
+SECRET_KEY) que contiene el id del usuario y sus permisos de staff. Se
+comprueba solo con la firma y la fecha, sin consultar la base de datos, así
+que cualquier nodo de la API con la misma SECRET_KEY lo acepta. Dura
+ACCESS_TOKEN_LIFETIME segundos: desactivar un usuario o revocar sus tokens
+surte efecto, como mucho, cuando expira.
+
+El token de renovación es aleatorio y se guarda (su SHA-256) en
+`RefreshToken`. Cada uso lo revoca y emite otro de la misma familia; si se
+presenta un token ya usado, se revoca toda la familia, porque significa que
+alguien más lo tiene.
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RefreshToken
+
+ACCESS_SALT = 'authentication.signed_tokens.access'
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+def _hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def make_access_token(user):
+    return signing.dumps({'uid': str(user.pk), 'st': user.is_staff, 'su': user.is_superuser}, salt=ACCESS_SALT)
+
+
+def read_access_token(token):
+    """
+    Devuelve el usuario del token sin consultar la base de datos. Solo se
+    cargan id y permisos; el resto de campos se leen al usarlos por primera
+    vez, y `save()` guarda únicamente los campos cargados.
+
+    Lanza `signing.BadSignature` (o `SignatureExpired`) si no es válido.
+    """
+    claims = signing.loads(token, salt=ACCESS_SALT, max_age=settings.ACCESS_TOKEN_LIFETIME)
+    try:
+        uid = uuid.UUID(claims['uid'])
+    except (KeyError, TypeError, ValueError):
+        raise signing.BadSignature('Token sin usuario')
+    values = {'id': uid, 'is_staff': bool(claims.get('st')), 'is_superuser': bool(claims.get('su')), 'is_active': True}
+    User = get_user_model()
+    # from_db espera los valores en el orden de los campos del modelo
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(None, field_names, [values[name] for name in field_names])
+
+
+def _create_refresh_token(user, family=None):
+    token = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash(token),
+        family=family or uuid.uuid4(),
+        expires_at=timezone.now() + timedelta(seconds=settings.REFRESH_TOKEN_LIFETIME),
+    )
+    return token
+
+
+def _pair(user, refresh):
+    return {
+        'access': make_access_token(user),
+        'refresh': refresh,
+        'token_type': 'Bearer',
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def issue_tokens(user):
+    return _pair(user, _create_refresh_token(user))
+
+
+def rotate_refresh_token(token):
+    """
+    Revoca el token de renovación y devuelve un par nuevo.
+    """
+    now = timezone.now()
+    refresh = RefreshToken.objects.select_related('user').filter(token_hash=_hash(token)).first()
+    if refresh is None:
+        raise InvalidRefreshToken("El token de renovación no es válido")
+
+    if refresh.expires_at <= now or not refresh.user.is_active:
+        raise InvalidRefreshToken("El token de renovación expiró")
+
+    with transaction.atomic():
+        revoked = RefreshToken.objects.filter(pk=refresh.pk, revoked_at__isnull=True).update(revoked_at=now)
+        new_token = _create_refresh_token(refresh.user, refresh.family) if revoked else None
+    if new_token is None:
+        # Reutilización de un token ya rotado
+        revoke_family(refresh.family)
+        raise InvalidRefreshToken("El token de renovación ya se usó")
+    return _pair(refresh.user, new_token)
+
+
+def revoke_family(family):
+    RefreshToken.objects.filter(family=family, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+def revoke_refresh_token(token):
+    refresh = RefreshToken.objects.filter(token_hash=_hash(token)).only('family').first()
+    if refresh is not None:
+        revoke_family(refresh.family)
+
+
+def revoke_user_tokens(user):
+    RefreshToken.objects.filter(user=user, revoked_at__isnull=True).update(revoked_at=timezone.now())
@@ -1,3 +1,180 @@
-from django.test import TestCase
+import os
+import runpy
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from django_rest_passwordreset.signals import post_password_reset
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from binmap_api import settings as project_settings
+from binmap_api.throttling import get_store
+from .authentication import SignedTokenAuthentication
+from .models import RefreshToken
+
+User = get_user_model()
+
+
+@override_settings(AUTH_TOKEN_CACHE=True)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(
+            username='ana', email='ana@example.com', password='secreto123', first_name='Ana', last_name='López',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_user_detail(self):
+        return self.client.get('/api/v1/auth/user-detail/')
+
+    def test_token_is_cached(self):
+        self.assertEqual(self.get_user_detail().status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.get_user_detail()
+        self.assertEqual(response.data['email'], 'ana@example.com')
+
+    def test_cache_disabled(self):
+        with override_settings(AUTH_TOKEN_CACHE=False):
+            self.assertEqual(self.get_user_detail().status_code, 200)
+            # Otro proceso revoca el token sin que este caché se entere
+            Token.objects.filter(pk=self.token.pk).update(key='revocado')
+            self.assertEqual(self.get_user_detail().status_code, 401)
+
+        # Por defecto, solo con un caché compartido o en desarrollo
+        locmem = 'django.core.cache.backends.locmem.LocMemCache'
+        redis = 'django.core.cache.backends.redis.RedisCache'
+        self.assertFalse(self.load_settings(API_CACHE_BACKEND=locmem)['AUTH_TOKEN_CACHE'])
+        self.assertTrue(self.load_settings(API_CACHE_BACKEND=locmem, DEBUG='True')['AUTH_TOKEN_CACHE'])
+        self.assertTrue(self.load_settings(API_CACHE_BACKEND=redis)['AUTH_TOKEN_CACHE'])
+
+    def test_deactivated_user_is_rejected(self):
+        self.get_user_detail()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_user_detail().status_code, 401)
+
+    def test_logout_revokes_token(self):
+        self.get_user_detail()
+        self.assertEqual(self.client.post('/api/v1/auth/logout/').status_code, 200)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_user_detail().status_code, 401)
+
+    def test_password_reset_revokes_token(self):
+        self.get_user_detail()
+        post_password_reset.send(sender=self.__class__, user=self.user, reset_password_token=None)
+        self.assertEqual(self.get_user_detail().status_code, 401)
+
+    def load_settings(self, **environ):
+        # Solo con estas variables: ni el entorno ni el archivo .env influyen
+        with mock.patch.dict(os.environ, environ, clear=True), mock.patch('dotenv.load_dotenv'):
+            return runpy.run_path(project_settings.__file__)
+
+    def authentication_classes(self, **environ):
+        return self.load_settings(**environ)['REST_FRAMEWORK']['DEFAULT_AUTHENTICATION_CLASSES']
+
+    def test_basic_auth_disabled_outside_debug(self):
+        basic = f'{BasicAuthentication.__module__}.{BasicAuthentication.__name__}'
+        classes = self.authentication_classes
+        self.assertNotIn(basic, classes(DEBUG='False'))
+        self.assertNotIn(basic, classes())
+        self.assertIn(basic, classes(DEBUG='True'))
+        self.assertIn(basic, classes(DEBUG='False', API_BASIC_AUTH='True'))
+        self.assertNotIn(basic, classes(DEBUG='True', API_BASIC_AUTH='False'))
+
+
+@override_settings(SIGNED_TOKENS=True)
+class SignedTokenTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='luis', email='luis@example.com', password='secreto123', first_name='Luis', last_name='Pérez',
+        )
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post('/api/v1/auth/token/signed/', {'email': 'luis@example.com', 'password': 'secreto123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def refresh(self, token):
+        return self.client.post('/api/v1/auth/token/refresh/', {'refresh': token})
+
+    def test_access_token_verified_without_queries(self):
+        tokens = self.obtain()
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with self.assertNumQueries(0):
+            user, _ = SignedTokenAuthentication().authenticate(request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertFalse(user.is_staff)
+
+        # El resto de campos se cargan al usarlos
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/v1/auth/user-detail/').data['email'], 'luis@example.com')
+
+    def test_invalid_and_expired_access_tokens(self):
+        tokens = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}x")
+        response = self.client.get('/api/v1/auth/user-detail/')
+        self.assertEqual(response.status_code, 401)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            self.assertEqual(self.client.get('/api/v1/auth/user-detail/').status_code, 401)
+
+    def test_refresh_rotates_and_detects_reuse(self):
+        first = self.obtain()['refresh']
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        second = response.data['refresh']
+        self.assertNotEqual(first, second)
+
+        # Reusar un token ya rotado revoca toda la familia
+        self.assertEqual(self.refresh(first).status_code, 401)
+        self.assertEqual(self.refresh(second).status_code, 401)
+        self.assertFalse(RefreshToken.objects.filter(revoked_at__isnull=True).exists())
+
+    def test_revoke_and_deactivation(self):
+        token = self.obtain()['refresh']
+        self.assertEqual(self.client.post('/api/v1/auth/token/revoke/', {'refresh': token}).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+        token = self.obtain()['refresh']
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_disabled_by_default(self):
+        with override_settings(SIGNED_TOKENS=False):
+            response = self.client.post('/api/v1/auth/token/signed/', {'email': 'luis@example.com', 'password': 'secreto123'})
+        self.assertEqual(response.status_code, 404)
+
+
+class AuthThrottleTests(APITestCase):
+    def setUp(self):
+        get_store().clear()
+        self.addCleanup(get_store().clear)
+        User.objects.create_user(username='eva', email='eva@example.com', password='secreto123')
+
+    def test_login_attempts_are_limited(self):
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'auth': '2/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            for _ in range(2):
+                response = self.client.post('/api/v1/auth/token/', {'email': 'eva@example.com', 'password': 'incorrecta'})
+                self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/v1/auth/token/', {'email': 'eva@example.com', 'password': 'secreto123'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_refresh_attempts_are_limited(self):
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'auth': '2/min'}
+        with override_settings(SIGNED_TOKENS=True, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            for url in ('/api/v1/auth/token/refresh/', '/api/v1/auth/token/revoke/'):
+                self.client.post(url, {'refresh': 'no-existe'})
+            response = self.client.post('/api/v1/auth/token/refresh/', {'refresh': 'no-existe'})
+        self.assertEqual(response.status_code, 429)
@@ -2,18 +2,24 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.dispatch import receiver
-from django_rest_passwordreset.signals import reset_password_token_created
+from django_rest_passwordreset.signals import post_password_reset, reset_password_token_created
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 
-from .serializers import UserSerializer, CustomAuthTokenSerializer
+from binmap_api.metrics import timed
+from binmap_api.throttling import AuthThrottle
+from . import signed_tokens
+from .serializers import UserSerializer, CustomAuthTokenSerializer, RefreshTokenSerializer
 
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
 
     def post(self, request):
         email = request.data.get('email')
@@ -23,7 +29,7 @@ class LoginView(APIView):
 
         if user is not None:
             login(request, user)
-            return Response(UserSerializer(user).data, status=status.HTTP_200_OK)
+            return Response(timed(UserSerializer(user)).data, status=status.HTTP_200_OK)
         else:
             return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -32,15 +38,19 @@ class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        if isinstance(request.auth, Token):
+            # El token deja de valer también en el caché de autenticación
+            request.auth.delete()
         logout(request)
         return Response(status=status.HTTP_200_OK)
 
 
 class SignupView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
 
     def post(self, request):
-        serializer = UserSerializer(data=request.data)
+        serializer = timed(UserSerializer(data=request.data))
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -51,11 +61,11 @@ class UserDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        return Response(UserSerializer(request.user).data, status=status.HTTP_200_OK)
+        return Response(timed(UserSerializer(request.user)).data, status=status.HTTP_200_OK)
 
     def patch(self, request):
         user = request.user
-        serializer = UserSerializer(user, data=request.data, partial=True)
+        serializer = timed(UserSerializer(user, data=request.data, partial=True))
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -67,8 +77,16 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
     print(f"\nRecupera la contraseña del correo '{reset_password_token.user.email}' usando el token '{reset_password_token.key}' desde la API http://localhost:8000/api/v1/auth/reset/confirm/.")
 
 
+@receiver(post_password_reset)
+def password_reset_done(sender, user, *args, **kwargs):
+    # Con la contraseña nueva se revocan los tokens emitidos con la anterior
+    Token.objects.filter(user=user).delete()
+    signed_tokens.revoke_user_tokens(user)
+
+
 class CustomObtainAuthToken(ObtainAuthToken):
     serializer_class = CustomAuthTokenSerializer
+    throttle_classes = [AuthThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -81,3 +99,46 @@ class CustomObtainAuthToken(ObtainAuthToken):
             'email': user.email,
             'name': user.get_full_name() or user.email
         })
+
+
+class SignedTokenView(APIView):
+    """
+    Base de los endpoints de tokens firmados, disponibles con
+    SIGNED_TOKENS=True.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    # Sin autenticación y con una consulta por petición: límite por IP
+    throttle_classes = [AuthThrottle]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not settings.SIGNED_TOKENS:
+            raise NotFound("Los tokens firmados no están habilitados")
+
+    def get_refresh_token(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['refresh']
+
+
+class SignedTokenObtainView(SignedTokenView):
+    def post(self, request):
+        serializer = CustomAuthTokenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response(signed_tokens.issue_tokens(serializer.validated_data['user']))
+
+
+class SignedTokenRefreshView(SignedTokenView):
+    def post(self, request):
+        try:
+            tokens = signed_tokens.rotate_refresh_token(self.get_refresh_token(request))
+        except signed_tokens.InvalidRefreshToken as e:
+            return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(tokens)
+
+
+class SignedTokenRevokeView(SignedTokenView):
+    def post(self, request):
+        signed_tokens.revoke_refresh_token(self.get_refresh_token(request))
+        return Response(status=status.HTTP_200_OK)
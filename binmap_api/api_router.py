@@ -7,7 +7,8 @@ from places.views import (
     CategoryViewSet,
     PlaceViewSet,
     FavoriteViewSet,
-    VisitedPlaceViewSet
+    VisitedPlaceViewSet,
+    OfflineBundleViewSet
 )
 from routes.views import RouteViewSet, MunicipalityHasRouteViewSet
 
@@ -19,6 +20,7 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'places', PlaceViewSet)
 router.register(r'favorites', FavoriteViewSet, basename='favorites')
 router.register(r'visited-places', VisitedPlaceViewSet, basename='visited-places')
+router.register(r'offline-bundle', OfflineBundleViewSet, basename='offline-bundle')
 
 router.register(r'routes', RouteViewSet)
 router.register(r'municipality-routes', MunicipalityHasRouteViewSet) 
\ No newline at end of file
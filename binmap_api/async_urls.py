@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from django.urls import path
+
+from places.async_views import (
+    StateAsyncView,
+    MunicipalityAsyncView,
+    CategoryAsyncView,
+    PlaceAsyncView,
+    export_places,
+    catalog_changes,
+)
+from routes.async_views import RouteAsyncView
+
+urlpatterns = [
+    path('states/', StateAsyncView.as_view(), name='async-state-list'),
+    path('states/<uuid:pk>/', StateAsyncView.as_view(), name='async-state-detail'),
+    path('municipalities/', MunicipalityAsyncView.as_view(), name='async-municipality-list'),
+    path('municipalities/<uuid:pk>/', MunicipalityAsyncView.as_view(), name='async-municipality-detail'),
+    path('categories/', CategoryAsyncView.as_view(), name='async-category-list'),
+    path('categories/<uuid:pk>/', CategoryAsyncView.as_view(), name='async-category-detail'),
+    path('places/', PlaceAsyncView.as_view(), name='async-place-list'),
+    path('places/export/', export_places, name='async-place-export'),
+    path('places/<uuid:pk>/', PlaceAsyncView.as_view(), name='async-place-detail'),
+    path('routes/', RouteAsyncView.as_view(), name='async-route-list'),
+    path('routes/<uuid:pk>/', RouteAsyncView.as_view(), name='async-route-detail'),
+    path('catalog-changes/', catalog_changes, name='async-catalog-changes'),
+]
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Async read-only endpoints for ASGI deployments.
+
+DRF views are synchronous, so under an ASGI server every request to a
+viewset holds a worker thread from start to finish. These views are plain
+Django async views instead: rows are loaded with the async ORM
+(`aiterator`, `aget`) using the query plan of the same DRF serializer, and
+serialization runs on the event loop. The plan loads every relation up
+front, so serialization never touches the database; a missing relation
+fails loudly with `SynchronousOnlyOperation` instead of silently blocking.
+
+Django still runs the database driver in a thread, but only for the
+duration of each query, not of the whole request.
+
+These views do not authenticate, so every request is limited per client
+IP with the `anon_read` scope, sharing the buckets of the DRF views. They
+do not implement search, filters or ordering; query parameters other than
+the pagination ones are ignored.
+"""
+import math
+import uuid
+
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+from .metrics import timed
+from .query_plan import get_query_plan
+from .throttling import aconsume, client_ident
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def check_throttles(request, scopes=('anon_read',)):
+    """
+    Returns a 429 response if the client ran out of requests in any of
+    `scopes`, or None.
+    """
+    key = f'ip:{client_ident(request)}'
+    for scope in scopes:
+        wait = await aconsume(scope, key)
+        if wait:
+            response = json_response({"error": "Demasiadas peticiones, inténtalo más tarde"}, status=429)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+    return None
+
+
+class AsyncReadView(View):
+    """
+    Async list and retrieve for a queryset and a DRF serializer.
+
+    Lists are paginated by id with `?after=<id>&page_size=<n>` and return
+    `{"next": url, "results": [...]}`.
+    """
+    queryset = None
+    serializer_class = None
+    page_size = 50
+    max_page_size = 100
+    after_param = 'after'
+    page_size_param = 'page_size'
+    throttle_scopes = ('anon_read',)
+
+    def get_queryset(self):
+        return get_query_plan(self.serializer_class).apply(self.queryset.all())
+
+    def serialize(self, data, many=False):
+        serializer = timed(self.serializer_class(data, many=many, context={'request': self.request, 'view': self}))
+        return serializer.data
+
+    async def get(self, request, pk=None):
+        throttled = await check_throttles(request, self.throttle_scopes)
+        if throttled is not None:
+            return throttled
+        if pk is None:
+            return await self.list(request)
+        return await self.retrieve(request, pk)
+
+    async def retrieve(self, request, pk):
+        try:
+            instance = await self.get_queryset().aget(pk=pk)
+        except (ObjectDoesNotExist, ValidationError):
+            return json_response({"error": "No encontrado"}, status=404)
+        return json_response(self.serialize(instance))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get(self.page_size_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    async def list(self, request):
+        page_size = self.get_page_size(request)
+        queryset = self.get_queryset().order_by('pk')
+
+        after = request.GET.get(self.after_param)
+        if after:
+            try:
+                queryset = queryset.filter(pk__gt=uuid.UUID(after))
+            except ValueError:
+                return json_response({"error": f"'{self.after_param}' no es un identificador válido"}, status=400)
+
+        # chunk_size permite que aiterator() aplique los prefetch del plan
+        rows = [row async for row in queryset[:page_size + 1].aiterator(chunk_size=page_size + 1)]
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_url = replace_query_param(request.build_absolute_uri(), self.after_param, rows[-1].pk)
+
+        return json_response({
+            "next": next_url,
+            "results": self.serialize(rows, many=True),
+        })
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk create/update/delete for viewsets.
+
+Rows are validated one by one with a serializer that does not touch the
+database, foreign keys are checked with a single query per referenced
+table, and writes go through `bulk_create`/`bulk_update` in chunks, each in
+its own transaction. The response reports the result of every row.
+"""
+from collections import Counter
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DatabaseError, transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from .cache import bump_version
+from .parsers import NDJSONParser
+
+
+class BulkMixin:
+    """
+    Adds `POST`, `PATCH` and `DELETE` on `<prefix>/bulk/` accepting a JSON
+    array or NDJSON.
+
+    `bulk_serializer_class` validates a single row; foreign keys must be
+    declared as plain id fields whose source is the column attname (for
+    example `UUIDField(source='municipality_id')`) and listed in
+    `bulk_foreign_keys`, mapping that attname to the referenced model.
+    """
+    bulk_serializer_class = None
+    bulk_foreign_keys = {}
+    bulk_chunk_size = 500
+    bulk_max_rows = 5000
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk',
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Crea, actualiza o elimina varios registros en una sola petición
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({"error": "Se esperaba una lista de registros"})
+        if len(rows) > self.bulk_max_rows:
+            raise ValidationError({"error": f"Se permiten como máximo {self.bulk_max_rows} registros por petición"})
+
+        handler = {
+            'POST': self.perform_bulk_create,
+            'PATCH': self.perform_bulk_update,
+            'DELETE': self.perform_bulk_destroy,
+        }[request.method]
+        results = handler(rows)
+        self.bulk_written(results)
+
+        summary = Counter(result['status'] for result in results)
+        return Response({"summary": summary, "results": results}, status=status.HTTP_200_OK)
+
+    def get_bulk_model(self):
+        return self.bulk_serializer_class.Meta.model
+
+    def bulk_written(self, results):
+        """
+        Hook called after the writes; bulk operations do not send model
+        signals, so the cache version is bumped here.
+        """
+        bump_version(self.get_bulk_model())
+
+    def prepare_bulk_instance(self, instance):
+        """
+        Hook to fill derived columns that `save()` would normally compute.
+        """
+        return instance
+
+    def perform_bulk_create(self, rows):
+        model = self.get_bulk_model()
+        results = [None] * len(rows)
+        valid = self.validate_bulk_rows(rows, results)
+
+        pending = [(index, self.prepare_bulk_instance(model(**data))) for index, data in valid]
+        self.check_bulk_unique(pending, results)
+        pending = [(index, instance) for index, instance in pending if results[index] is None]
+
+        self.write_bulk_chunks(
+            pending, results, 'created',
+            lambda instances: model.objects.bulk_create(instances),
+        )
+        return results
+
+    def perform_bulk_update(self, rows):
+        model = self.get_bulk_model()
+        results = [None] * len(rows)
+        ids = {}
+        for index, row in enumerate(rows):
+            pk = self.parse_bulk_pk(row.get('id') if isinstance(row, dict) else None)
+            if pk is None:
+                results[index] = {"index": index, "status": "error", "errors": {"id": ["Se requiere un id válido"]}}
+            else:
+                ids[index] = pk
+        valid = self.validate_bulk_rows(rows, results, partial=True)
+
+        instances = model.objects.in_bulk(ids.values())
+        pending, fields = [], set()
+        for index, data in valid:
+            instance = instances.get(ids[index])
+            if instance is None:
+                results[index] = {"index": index, "status": "not_found", "id": str(ids[index])}
+                continue
+            for field, value in data.items():
+                setattr(instance, field, value)
+            fields.update(data)
+            pending.append((index, self.prepare_bulk_instance(instance)))
+
+        self.check_bulk_unique(pending, results)
+        pending = [(index, instance) for index, instance in pending if results[index] is None]
+        fields = self.get_bulk_update_fields(fields)
+
+        self.write_bulk_chunks(
+            pending, results, 'updated',
+            lambda instances: model.objects.bulk_update(instances, fields),
+        )
+        return results
+
+    def get_bulk_update_fields(self, fields):
+        return sorted(fields)
+
+    def perform_bulk_destroy(self, rows):
+        model = self.get_bulk_model()
+        results = [None] * len(rows)
+        ids = {}
+        for index, row in enumerate(rows):
+            pk = self.parse_bulk_pk(row.get('id') if isinstance(row, dict) else row)
+            if pk is None:
+                results[index] = {"index": index, "status": "error", "errors": {"id": ["Se requiere un id válido"]}}
+            else:
+                ids[index] = pk
+
+        existing = set(model.objects.filter(pk__in=ids.values()).values_list('pk', flat=True))
+        pending = []
+        for index, pk in ids.items():
+            if pk in existing:
+                pending.append((index, pk))
+            else:
+                results[index] = {"index": index, "status": "not_found", "id": str(pk)}
+
+        self.write_bulk_chunks(
+            pending, results, 'deleted',
+            lambda pks: model.objects.filter(pk__in=pks).delete(),
+        )
+        return results
+
+    def parse_bulk_pk(self, value):
+        if value is None:
+            return None
+        try:
+            return self.get_bulk_model()._meta.pk.to_python(value)
+        except DjangoValidationError:
+            return None
+
+    def validate_bulk_rows(self, rows, results, partial=False):
+        """
+        Validates each row and its foreign keys; returns `(index, data)` for
+        the valid rows and records the errors of the others in `results`.
+        """
+        valid = []
+        for index, row in enumerate(rows):
+            if results[index] is not None:
+                continue
+            if not isinstance(row, dict):
+                results[index] = {"index": index, "status": "error", "errors": {"non_field_errors": ["Se esperaba un objeto"]}}
+                continue
+            serializer = self.bulk_serializer_class(data=row, partial=partial)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"index": index, "status": "error", "errors": serializer.errors}
+
+        for attname, related_model in self.bulk_foreign_keys.items():
+            values = {data[attname] for _, data in valid if data.get(attname) is not None}
+            if not values:
+                continue
+            existing = set(related_model.objects.filter(pk__in=values).values_list('pk', flat=True))
+            field_name = attname[:-3] if attname.endswith('_id') else attname
+            for index, data in valid:
+                if data.get(attname) is not None and data[attname] not in existing:
+                    results[index] = {
+                        "index": index,
+                        "status": "error",
+                        "errors": {field_name: [f"No existe {related_model._meta.verbose_name} con id {data[attname]}"]},
+                    }
+        return [(index, data) for index, data in valid if results[index] is None]
+
+    def check_bulk_unique(self, pending, results):
+        """
+        Rejects rows that would break a `unique_together` constraint, either
+        against the database (one query per constraint) or within the batch.
+        """
+        model = self.get_bulk_model()
+        for fields in model._meta.unique_together:
+            attnames = [model._meta.get_field(field).attname for field in fields]
+            rows = [
+                (index, instance.pk if instance.pk is not None else ('new', index),
+                 tuple(getattr(instance, attname) for attname in attnames))
+                for index, instance in pending
+                if results[index] is None
+            ]
+            if not rows:
+                continue
+
+            lookups = {f'{attname}__in': {key[position] for _, _, key in rows} for position, attname in enumerate(attnames)}
+            taken = {
+                tuple(values[:-1]): values[-1]
+                for values in model.objects.filter(**lookups).values_list(*attnames, 'pk')
+            }
+            for index, pk, key in rows:
+                owner = taken.setdefault(key, pk)
+                if owner != pk:
+                    results[index] = {
+                        "index": index,
+                        "status": "error",
+                        "errors": {"non_field_errors": [f"Los campos {', '.join(fields)} deben formar un conjunto único."]},
+                    }
+
+    def write_bulk_chunks(self, pending, results, success_status, write):
+        for start in range(0, len(pending), self.bulk_chunk_size):
+            chunk = pending[start:start + self.bulk_chunk_size]
+            try:
+                with transaction.atomic():
+                    write([item for _, item in chunk])
+            except DatabaseError as exc:
+                for index, _ in chunk:
+                    results[index] = {"index": index, "status": "error", "errors": {"non_field_errors": [str(exc)]}}
+            else:
+                for index, item in chunk:
+                    pk = getattr(item, 'pk', item)
+                    results[index] = {"index": index, "status": success_status, "id": str(pk)}
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned read-through cache for API responses.
+
+Every tracked model has a version counter in the API cache. Cached
+responses are keyed by the request URL and the versions of the models they
+depend on, so bumping a counter invalidates exactly the responses built from
+that model; stale entries are simply never read again and age out of the
+cache (LRU in the local backend, TTL in shared ones).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _keys(model):
+    label = model._meta.label_lower
+    return f'version:{label}', f'changed:{label}'
+
+
+def _seed():
+    # Un contador nuevo (o expulsado del caché) arranca en un valor que no
+    # se haya usado antes, para no revivir respuestas antiguas.
+    return time.time_ns()
+
+
+def get_model_state(models):
+    """
+    Returns the current version of each model, keyed by model label, and
+    the last time any of them changed as a POSIX timestamp.
+    """
+    cache = get_cache()
+    keys = {}
+    for model in models:
+        version_key, changed_key = _keys(model)
+        keys[version_key] = keys[changed_key] = model._meta.label_lower
+    values = cache.get_many(keys)
+
+    missing = keys.keys() - values.keys()
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, _seed() if key.startswith('version:') else now, timeout=None)
+        values.update(cache.get_many(missing))
+
+    versions = {keys[key]: value for key, value in values.items() if key.startswith('version:')}
+    changes = [value for key, value in values.items() if key.startswith('changed:')]
+    return versions, max(changes, default=None)
+
+
+def get_versions(models):
+    """
+    Returns the current version of each model, keyed by model label.
+    """
+    return get_model_state(models)[0]
+
+
+def bump_version(*models):
+    """
+    Invalidates every cached response that depends on the given models.
+    """
+    cache = get_cache()
+    now = time.time()
+    for model in models:
+        version_key, changed_key = _keys(model)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.add(version_key, _seed(), timeout=None)
+        cache.set(changed_key, now, timeout=None)
+
+
+def _model_changed(sender, **kwargs):
+    bump_version(sender)
+    # Volver a invalidar al confirmar la transacción, por si otra petición
+    # guardó en caché datos anteriores al commit con la versión nueva.
+    transaction.on_commit(lambda: bump_version(sender), using=kwargs.get('using'))
+
+
+def track_model_changes(*models):
+    """
+    Bumps the version of the given models on every save and delete,
+    including admin changes and cascaded deletes.
+    """
+    for model in models:
+        uid = f'api-cache-{model._meta.label_lower}'
+        post_save.connect(_model_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(_model_changed, sender=model, dispatch_uid=uid)
+
+
+class ModelStateMixin:
+    """
+    Declares the models a viewset renders. `cache_models` lists every model
+    whose rows appear in the response, including the ones rendered by
+    nested serializers.
+    """
+    cache_models = ()
+
+    def get_cache_models(self):
+        return self.cache_models
+
+    def get_model_state(self):
+        # Se consulta una sola vez por petición aunque varios mixins lo usen
+        state = getattr(self, '_model_state', None)
+        if state is None:
+            state = self._model_state = get_model_state(self.get_cache_models())
+        return state
+
+
+class CachedResponseMixin(ModelStateMixin):
+    """
+    Caches the serialized data of `list` and `retrieve` responses.
+    """
+    def get_cache_key(self, request):
+        versions, _ = self.get_model_state()
+        parts = [request.build_absolute_uri()]
+        parts.extend(f'{label}={version}' for label, version in sorted(versions.items()))
+        digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+        return f'response:{self.__class__.__name__}:{self.action}:{digest}'
+
+    def should_cache_response(self, request):
+        """
+        Override to skip the cache for responses that depend on the user.
+        """
+        return True
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.should_cache_response(request):
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Conditional GET support for viewsets.
+
+ETag and Last-Modified are derived from the change stamps of the models a
+viewset renders (see `binmap_api.cache`), so they can be computed without
+querying or serializing anything. A matching If-None-Match or
+If-Modified-Since short-circuits `list` and `retrieve` with a 304.
+
+The versions must be shared by every worker, so conditional responses are
+only sent with `API_CONDITIONAL_GET`, which by default requires a shared API
+cache (see settings).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import ModelStateMixin
+
+
+class ConditionalGetMixin(ModelStateMixin):
+    """
+    Adds ETag/Last-Modified headers to `list` and `retrieve` and answers
+    conditional requests with 304 before the view runs.
+
+    Set `conditional_per_user` when the response depends on the requesting
+    user.
+    """
+    conditional_per_user = False
+
+    def get_etag(self, request):
+        versions, _ = self.get_model_state()
+        parts = [request.get_full_path(), request.accepted_media_type]
+        if self.conditional_per_user:
+            parts.append(str(request.user.pk))
+        parts.extend(f'{label}={version}' for label, version in sorted(versions.items()))
+        return '"%s"' % hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def get_last_modified(self, request):
+        _, last_modified = self.get_model_state()
+        return int(last_modified) if last_modified is not None else None
+
+    def check_object_exists(self):
+        """
+        Raises Http404 if the object of a `retrieve` does not exist, with a
+        single EXISTS query, so a 304 never hides a 404.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            exists = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).exists()
+        except (TypeError, ValueError, ValidationError):
+            exists = False
+        if not exists:
+            raise Http404
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if settings.API_CONDITIONAL_GET:
+            response = self.evaluate_conditional(handler, request, *args, **kwargs)
+        else:
+            response = handler(request, *args, **kwargs)
+        if self.conditional_per_user:
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+    def evaluate_conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        last_modified = self.get_last_modified(request)
+        headers = {'ETag': etag}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified)
+
+        conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if conditional is not None:
+            if self.action == 'retrieve':
+                self.check_object_exists()
+            return Response(status=conditional.status_code, headers=headers)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for header, value in headers.items():
+                response[header] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
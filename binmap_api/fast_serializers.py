@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled representation for read paths.
+
+`Serializer.to_representation` does the same generic work for every field
+of every row: `get_attribute` walks the source path with error handling,
+checks for `PKOnlyObject`, then calls `to_representation`. For a page of
+places with nested municipality, state, category and route that is most of
+the CPU time of the request.
+
+`compile_serializer` looks at the fields of a serializer instance once and
+returns a function that builds the same dict for an instance with a
+precompiled accessor and converter per field: `attrgetter` for model
+fields, `str` for UUIDs and text, the field's own `to_representation`
+otherwise, and nested serializers compiled recursively. Fields it cannot
+prove equivalent (custom sources, callables, dotted paths) keep DRF's
+generic path, so the output is identical.
+
+Serializers opt in with `list_serializer_class = FastListSerializer` in
+their `Meta`; writes and validation are untouched.
+"""
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, PrimaryKeyRelatedField
+
+
+def _identity(value):
+    return value
+
+
+def _converter(field):
+    field_type = type(field)
+    if field_type is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        return str
+    if field_type is serializers.CharField:
+        return str
+    if field_type is serializers.IntegerField:
+        return int
+    if isinstance(field, serializers.BaseSerializer):
+        return compile_serializer(field)
+    return field.to_representation
+
+
+def _model_field(serializer, field):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    try:
+        return model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+
+
+def _compile_field(serializer, field):
+    """
+    Returns (field, getter, converter); getter is None for fields that
+    keep DRF's generic path.
+    """
+    if field.source == '*':
+        return field, _identity, _converter(field)
+
+    model_field = _model_field(serializer, field)
+    if model_field is None or not model_field.concrete or model_field.many_to_many:
+        return field, None, None
+    if isinstance(field, PrimaryKeyRelatedField) and model_field.is_relation:
+        if field.pk_field is not None:
+            return field, None, None
+        # El mismo valor que PKOnlyObject sin cargar el objeto relacionado
+        return field, attrgetter(model_field.attname), _identity
+    return field, attrgetter(field.source), _converter(field)
+
+
+def compile_serializer(serializer):
+    """
+    Returns a function instance -> dict equivalent to
+    `serializer.to_representation`.
+    """
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        return serializer.to_representation
+    fields = [
+        (field.field_name, field, getter, converter)
+        for field, getter, converter in (_compile_field(serializer, field) for field in serializer._readable_fields)
+    ]
+
+    def represent(instance):
+        ret = {}
+        for name, field, getter, converter in fields:
+            if getter is None:
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+                check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                ret[name] = None if check_for_none is None else field.to_representation(attribute)
+                continue
+            value = getter(instance)
+            ret[name] = None if value is None else converter(value)
+        return ret
+
+    return represent
+
+
+class FastListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that renders its items with `compile_serializer`.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        represent = compile_serializer(self.child)
+        return [represent(item) for item in iterable]
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Per-request performance instrumentation.
+
+`PerformanceMiddleware` measures every request and tags it with the view
+that handled it (`PlaceViewSet.list`, `FavoriteViewSet.toggle`,
+`LoginView.post`, ...):
+
+- wall time, from the middleware to the returned response,
+- number and total time of database queries, through an execute wrapper
+  installed on every connection,
+- time spent building `serializer.data` for serializers returned by
+  `SerializerTimingMixin.get_serializer` or wrapped with `timed()`,
+- response size, when the body is not streamed.
+
+The numbers are sent back in a `Server-Timing` header, requests and
+queries slower than SLOW_REQUEST_MS / SLOW_QUERY_MS are logged to
+`binmap_api.metrics`, and every request feeds histograms served in
+Prometheus text format by `metrics_view`.
+
+The current request's counters live in a context variable, so queries run
+from `sync_to_async` threads are attributed to the async request that
+awaited them. Histograms are per process; with several workers Prometheus
+should scrape each one (or sum them). Streamed bodies are measured up to
+the moment the response is returned, not while they are sent.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current = contextvars.ContextVar('binmap_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('start', 'queries', 'db_time', 'serializer_time', 'serializing')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += duration
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning('Slow query (%.1f ms): %s', duration * 1000, sql)
+
+
+def _install_query_wrapper(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_installed = False
+
+
+def install():
+    """
+    Hooks query timing. Safe to call more than once.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_install_query_wrapper, dispatch_uid='binmap-metrics-queries')
+    for connection in connections.all(initialized_only=True):
+        _install_query_wrapper(connection=connection)
+
+
+class _TimedData:
+    @property
+    def data(self):
+        stats = _current.get()
+        if stats is None or stats.serializing:
+            # Los serializadores anidados cuentan dentro del exterior
+            return super().data
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            stats.serializer_time += time.perf_counter() - start
+            stats.serializing = False
+
+
+@lru_cache(maxsize=None)
+def _timed_class(cls):
+    return type(cls)(cls.__name__, (_TimedData, cls), {'__module__': cls.__module__, '__qualname__': cls.__qualname__})
+
+
+def timed(serializer):
+    """
+    Returns `serializer` with the time spent in its `data` added to the
+    current request. Only that instance changes; the serializer class and
+    DRF's base classes are left untouched.
+    """
+    if not isinstance(serializer, _TimedData):
+        serializer.__class__ = _timed_class(type(serializer))
+    return serializer
+
+
+class SerializerTimingMixin:
+    """
+    View mixin that times the serializers built with `get_serializer()`.
+    """
+    def get_serializer(self, *args, **kwargs):
+        return timed(super().get_serializer(*args, **kwargs))
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        series = self.series.get(label)
+        if series is None:
+            # [conteo de cada bucket..., conteo por encima del último, suma]
+            series = self.series.setdefault(label, [0] * (len(self.buckets) + 1) + [0])
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{view="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {float(series[-1])!r}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}
+        self.histograms = (
+            Histogram('binmap_request_duration_seconds', 'Request wall time', DURATION_BUCKETS),
+            Histogram('binmap_db_queries', 'Database queries per request', QUERY_BUCKETS),
+            Histogram('binmap_db_duration_seconds', 'Database time per request', DURATION_BUCKETS),
+            Histogram('binmap_serializer_duration_seconds', 'Serializer time per request', DURATION_BUCKETS),
+            Histogram('binmap_response_size_bytes', 'Response body size', SIZE_BUCKETS),
+        )
+
+    def observe(self, view, status, duration, stats, size):
+        duration_histogram, queries, db_time, serializer_time, response_size = self.histograms
+        with self.lock:
+            key = (view, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            duration_histogram.observe(view, duration)
+            queries.observe(view, stats.queries)
+            db_time.observe(view, stats.db_time)
+            serializer_time.observe(view, stats.serializer_time)
+            if size is not None:
+                response_size.observe(view, size)
+
+    def render(self):
+        with self.lock:
+            lines = ['# HELP binmap_requests_total Requests handled', '# TYPE binmap_requests_total counter']
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(f'binmap_requests_total{{view="{view}",status="{status}"}} {count}')
+            for histogram in self.histograms:
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+_view_names = {}
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    func, method = match.func, request.method.lower()
+    key = (func, method)
+    name = _view_names.get(key)
+    if name is None:
+        cls = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+        if cls is None:
+            name = getattr(func, '__name__', 'view')
+        else:
+            # Los viewsets de DRF guardan la acción de cada método en `actions`
+            actions = getattr(func, 'actions', None) or {}
+            name = f'{cls.__name__}.{actions.get(method, method)}'
+        _view_names[key] = name
+    return name
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - stats.start
+        view = view_name(request)
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, response.status_code, duration, stats, size)
+
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, '
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'ser;dur={stats.serializer_time * 1000:.1f}'
+            )
+        if duration * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, serializer %.1f ms',
+                request.method, request.path, view, duration * 1000,
+                stats.queries, stats.db_time * 1000, stats.serializer_time * 1000,
+            )
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics. Requires `Authorization: Bearer <METRICS_TOKEN>`;
+    without METRICS_TOKEN it is only available with DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
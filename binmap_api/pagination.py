@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+import bisect
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+
+def _hit_key(hit):
+    pk, score = hit
+    return -score, str(pk)
+
+
+def _field_name(field):
+    return field.lstrip('-')
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination, so every page is a single range scan whatever
+    its depth.
+
+    Unlike DRF's `CursorPagination`, whose position is only the leading
+    ordering field plus an offset inside ties, the cursor stores the values
+    of every ordering field and `id` is always appended as a tiebreaker. A
+    non-unique ordering such as `?ordering=popular` (mostly zero counts) then
+    stays a true keyset: no OFFSET, and no skipped or repeated rows when
+    other rows are written between pages.
+
+    The response includes the total `count` unless the client sends
+    `?count=false`.
+
+    A view can instead hand over a ranked list of (pk, score) pairs as
+    `view.search_hits` (see `places.filters.PlaceSearchFilter`): the list is
+    paged in memory with (score, pk) as the cursor position and only the
+    rows of the page are fetched.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+    links = (None, None)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        hits = getattr(view, 'search_hits', None)
+        if hits is not None:
+            return self.paginate_hits(hits, queryset, request)
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        if not any(_field_name(field) in ('id', 'pk') for field in self.ordering):
+            self.ordering = (*self.ordering, 'id')
+        self.count = queryset.count() if self.get_include_count(request) else None
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [self.flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            values = self.decode_keyset_position(self.cursor.position)
+            queryset = queryset.filter(self.keyset_filter(ordering, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, self.cursor is not None
+        self.set_links(
+            has_next and self.page and self.encode_keyset_position(self.page[-1]),
+            has_previous and self.page and self.encode_keyset_position(self.page[0]),
+        )
+        return self.page
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def keyset_filter(ordering, values):
+        """
+        Rows strictly after `values` in `ordering`, written as
+        `a <= x AND (a < x OR (b <= y AND (b < y OR c > z)))` so the leading
+        field bounds an index range scan.
+        """
+        condition = None
+        for field, value in reversed(list(zip(ordering, values))):
+            name = _field_name(field)
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after = Q(**{f'{name}__{lookup}': value})
+            if condition is None:
+                condition = after
+            else:
+                condition = Q(**{f'{name}__{lookup}e': value}) & (after | condition)
+        return condition
+
+    def encode_keyset_position(self, row):
+        return json.dumps([str(getattr(row, _field_name(field))) for field in self.ordering])
+
+    def decode_keyset_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def set_links(self, next_position, previous_position):
+        self.links = (
+            next_position and self.encode_cursor(Cursor(offset=0, reverse=False, position=next_position)) or None,
+            previous_position and self.encode_cursor(Cursor(offset=0, reverse=True, position=previous_position)) or None,
+        )
+        self.display_page_controls = any(self.links)
+
+    def paginate_hits(self, hits, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        if queryset.query.has_filters():
+            # Los demás filtros de la vista se aplican con una consulta de ids
+            allowed = set(queryset.values_list('pk', flat=True))
+            hits = [hit for hit in hits if hit[0] in allowed]
+        self.count = len(hits) if self.get_include_count(request) else None
+
+        self.cursor = self.decode_cursor(request)
+        start, end = 0, self.page_size
+        if self.cursor is not None and self.cursor.position is not None:
+            position = self.decode_hit_position(self.cursor.position)
+            if self.cursor.reverse:
+                end = bisect.bisect_left(hits, position, key=_hit_key)
+                start = max(0, end - self.page_size)
+            else:
+                start = bisect.bisect_right(hits, position, key=_hit_key)
+                end = start + self.page_size
+        page = hits[start:end]
+
+        self.set_links(
+            end < len(hits) and page and self.encode_hit_position(page[-1]),
+            start > 0 and page and self.encode_hit_position(page[0]),
+        )
+
+        rows = {row.pk: row for row in queryset.filter(pk__in=[pk for pk, _ in page])}
+        self.page = [rows[pk] for pk, _ in page if pk in rows]
+        return self.page
+
+    def encode_hit_position(self, hit):
+        pk, score = hit
+        return f'{score!r}:{pk}'
+
+    def decode_hit_position(self, position):
+        score, _, pk = position.partition(':')
+        try:
+            return -float(score), pk
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        return self.links[0]
+
+    def get_previous_link(self):
+        return self.links[1]
+
+    def get_include_count(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in ('0', 'false', 'no')
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'] = {
+            'count': {'type': 'integer', 'example': 123},
+            **response_schema['properties'],
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Set to false to skip the total count.',
+            'schema': {'type': 'boolean'},
+        })
+        return parameters
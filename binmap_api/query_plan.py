@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Query plans derived from serializers.
+
+A serializer declares the relations it renders through its nested
+serializers and related fields; relations that are reached in other ways
+(method fields, properties) can be declared explicitly in its ``Meta``::
+
+    class Meta:
+        model = Place
+        select_related = ('municipality__state',)
+        prefetch_related = ('visits',)
+
+``QueryPlanMixin`` applies the resulting ``select_related`` and
+``prefetch_related`` calls to the viewset queryset, so listing a page costs
+a fixed number of queries whatever its size.
+
+A plan built with ``only=True`` also restricts the query to the columns the
+serializer reads. Fields whose source is not a model field must then
+declare the columns they read in ``Meta.field_columns``; if any field is
+unknown the plan loads every column::
+
+    class Meta:
+        field_columns = {'derivatives': ('image', 'video', 'media_derivatives')}
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+class QueryPlan:
+    def __init__(self, select_related=(), prefetch_related=(), only=None):
+        self.select_related = list(select_related)
+        self.prefetch_related = list(prefetch_related)
+        # None carga todas las columnas
+        self.only = None if only is None else list(only)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+def _relations(model):
+    """
+    Maps attribute names (forward fields and reverse accessors) to the
+    relation fields of a model.
+    """
+    relations = {}
+    for field in model._meta.get_fields():
+        if not field.is_relation:
+            continue
+        if field.auto_created and not field.concrete:
+            relations[field.get_accessor_name()] = field
+        else:
+            relations[field.name] = field
+    return relations
+
+
+def _is_to_many(field):
+    return field.many_to_many or field.one_to_many
+
+
+def _is_concrete(model, name):
+    try:
+        return model._meta.get_field(name).concrete
+    except FieldDoesNotExist:
+        return False
+
+
+def _add_columns(plan, columns):
+    if plan.only is not None:
+        plan.only.extend(columns)
+
+
+def _collect(serializer, model, prefix, plan):
+    meta = getattr(serializer, 'Meta', None)
+    plan.select_related.extend(prefix + path for path in getattr(meta, 'select_related', ()))
+    plan.prefetch_related.extend(prefix + path for path in getattr(meta, 'prefetch_related', ()))
+    field_columns = getattr(meta, 'field_columns', {})
+
+    relations = _relations(model)
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in field_columns:
+            _add_columns(plan, (prefix + column for column in field_columns[name]))
+        if field.source == '*':
+            if name not in field_columns:
+                # No se sabe qué columnas lee: se cargan todas
+                plan.only = None
+            continue
+
+        path = field.source.replace('.', '__')
+        relation = relations.get(field.source_attrs[0])
+        if relation is None:
+            if name in field_columns:
+                continue
+            if _is_concrete(model, field.source_attrs[0]):
+                _add_columns(plan, (prefix + field.source_attrs[0],))
+            else:
+                # Propiedades y anotaciones
+                plan.only = None
+            continue
+        if relation.concrete and not relation.many_to_many:
+            if len(field.source_attrs) > 1:
+                plan.only = None
+            _add_columns(plan, (prefix + path,))
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            queryset = relation.related_model._default_manager.all()
+            if isinstance(child, serializers.ModelSerializer):
+                queryset = build_query_plan(child).apply(queryset)
+            plan.prefetch_related.append(Prefetch(prefix + path, queryset=queryset))
+        elif isinstance(field, serializers.ModelSerializer):
+            if _is_to_many(relation):
+                continue
+            plan.select_related.append(prefix + path)
+            _collect(field, relation.related_model, f'{prefix}{path}__', plan)
+        elif isinstance(field, ManyRelatedField):
+            plan.prefetch_related.append(prefix + path)
+        elif isinstance(field, RelatedField) and not field.use_pk_only_optimization():
+            plan.select_related.append(prefix + path)
+            # Lee columnas del modelo relacionado que no se conocen
+            plan.only = None
+
+
+def build_query_plan(serializer, only=False):
+    """
+    Builds the query plan for a serializer instance, restricted to the
+    columns it reads with `only`.
+    """
+    plan = QueryPlan(only=[] if only else None)
+    _collect(serializer, serializer.Meta.model, '', plan)
+    return plan
+
+
+@lru_cache(maxsize=None)
+def get_query_plan(serializer_class):
+    """
+    Query plan of a serializer class, computed once per class.
+    """
+    return build_query_plan(serializer_class())
+
+
+class QueryPlanMixin:
+    """
+    Applies the query plan of the serializer used by the current action to
+    the viewset queryset.
+    """
+    def get_query_plan(self):
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, serializers.ModelSerializer):
+            return None
+        return get_query_plan(serializer_class)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = self.get_query_plan()
+        return queryset if plan is None else plan.apply(queryset)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Echo:
+    """
+    File-like object that returns what is written to it, used to feed
+    `csv.writer` output to a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return ''.join(self.render_line(item) for item in items).encode(self.charset)
+
+    @staticmethod
+    def render_line(item):
+        return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        if not items:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(items[0]))
+        writer.writeheader()
+        writer.writerows(items)
+        return buffer.getvalue().encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+
+    The output is byte for byte the one of `JSONRenderer` with the default
+    settings (compact, UTF-8, U+2028/U+2029 escaped). orjson writes some
+    floats differently than `json`; when the output may contain one of
+    them (strings that look like one also count, which only costs the
+    speedup), and for anything orjson cannot encode (non-string keys, huge
+    integers), the data is rendered again with `json`. Datetimes and types
+    orjson does not know go through DRF's `JSONEncoder`. NaN and infinity,
+    which `JSONRenderer` rejects, come out as null.
+    """
+    # orjson escribe 1e16 y 1e-7 donde json escribe 1e+16 y 1e-07, y
+    # 0.00001 donde json escribe 1e-05; basta con que pueda haber alguno
+    EXPONENT_RE = re.compile(rb'e-?[0-9]+[,}\]]')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or isinstance(data, float)
+            or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'0.0000' in ret or self.EXPONENT_RE.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # U+2028 y U+2029 en UTF-8, escapados como hace JSONRenderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
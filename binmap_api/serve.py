@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Serving of MEDIA_ROOT.
+
+The view resolves the file and answers the cache headers itself, but how
+the bytes are sent depends on `MEDIA_SERVE_MODE`:
+
+- `x-accel`: an empty response with `X-Accel-Redirect` pointing at an
+  internal nginx location (`MEDIA_ACCEL_PREFIX`) mapped to MEDIA_ROOT.
+- `x-sendfile`: an empty response with `X-Sendfile` and the absolute path,
+  for Apache (mod_xsendfile) or lighttpd.
+- `python`: Django streams the file, including single Range requests with
+  206 responses. Development only: without DEBUG it answers 404, as the
+  media route did before this view existed.
+
+The default is `python` with DEBUG and `x-accel` otherwise.
+
+In the first two modes the web server sends the file with sendfile(2) and
+handles Range itself, so media bytes never pass through Python.
+
+Names with a content hash (see `binmap_api.storage`) use that hash as
+their ETag and are cached as immutable. Other files get an ETag built from
+their size and modification time, so no file is ever read to compute one.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .storage import content_hash
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def get_etag(name, stat):
+    digest = content_hash(name)
+    if digest:
+        return f'"{digest}"'
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Returns the (first, last) byte positions of a single `bytes=` range, or
+    None when the header should be ignored and the whole file sent
+    (malformed or multiple ranges).
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    last = int(last) if last else size - 1
+    return first, min(last, size - 1)
+
+
+def _read_range(path, first, length):
+    with open(path, 'rb') as file:
+        file.seek(first)
+        while length:
+            block = file.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _content_type(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    if encoding == 'gzip':
+        # Se envía tal cual, sin Content-Encoding
+        return 'application/gzip'
+    return content_type or 'application/octet-stream'
+
+
+def _python_response(request, path, stat, etag):
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(header, stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=_content_type(path))
+
+    first, last = byte_range
+    length = last - first + 1
+    response = StreamingHttpResponse(_read_range(path, first, length), status=206, content_type=_content_type(path))
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    return response
+
+
+def serve_media(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if settings.MEDIA_SERVE_MODE not in ('x-accel', 'x-sendfile') and not settings.DEBUG:
+        # Un worker de Python no debe enviar los archivos en producción
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = get_etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if content_hash(path) else DEFAULT_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        mode = settings.MEDIA_SERVE_MODE
+        if mode == 'x-accel':
+            response = HttpResponse(content_type=_content_type(full_path))
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(path)
+        elif mode == 'x-sendfile':
+            response = HttpResponse(content_type=_content_type(full_path))
+            response['X-Sendfile'] = full_path
+        else:
+            response = _python_response(request, full_path, stat, etag)
+
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'binmap_api.metrics.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -87,13 +88,96 @@ WSGI_APPLICATION = 'binmap_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgresql para producción; SQLite por defecto en desarrollo
+DB_ENGINE = getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': getenv('DB_NAME', 'binmap'),
+            'USER': getenv('DB_USER', ''),
+            'PASSWORD': getenv('DB_PASSWORD', ''),
+            'HOST': getenv('DB_HOST', 'localhost'),
+            'PORT': getenv('DB_PORT', '5432'),
+            # Conexiones persistentes, comprobadas antes de reutilizarse
+            'CONN_MAX_AGE': int(getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if getenv('DB_POOL') == 'True':
+        # Pool de conexiones de psycopg 3 (psycopg[pool]); sustituye a
+        # las conexiones persistentes
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(getenv('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / getenv('DB_NAME', 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL permite leer mientras se escribe; las escrituras
+                # esperan su turno en lugar de fallar con "database is locked"
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'timeout': int(getenv('DB_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # SQLite en memoria no admite escrituras desde varios hilos, que
+            # usan las pruebas de concurrencia
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# El caché de la API es local al proceso (LRU) por defecto; en despliegues
+# con varios procesos conviene usar uno compartido, por ejemplo
+# API_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# API_CACHE_LOCATION=redis://127.0.0.1:6379
+API_CACHE_ALIAS = 'api'
+API_CACHE_BACKEND = getenv('API_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    API_CACHE_ALIAS: {
+        'BACKEND': API_CACHE_BACKEND,
+        'LOCATION': getenv('API_CACHE_LOCATION', 'binmap-api'),
+        'TIMEOUT': int(getenv('API_CACHE_TIMEOUT', 60 * 10)),
+    },
 }
 
+if API_CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES[API_CACHE_ALIAS]['OPTIONS'] = {'MAX_ENTRIES': int(getenv('API_CACHE_MAX_ENTRIES', 5000))}
+
+# ETag y Last-Modified salen de las versiones de los modelos guardadas en el
+# caché de la API. Con un caché por proceso (LocMemCache) cada worker tiene
+# sus propias versiones y otro worker respondería 304 con datos viejos, así
+# que por defecto solo se activan con un caché compartido o en desarrollo
+API_CONDITIONAL_GET = getenv(
+    'API_CONDITIONAL_GET',
+    str(DEBUG or not API_CACHE_BACKEND.endswith(('LocMemCache', 'DummyCache'))),
+) == 'True'
+
+# Cada proceso consulta el registro de cambios del catálogo al menos cada
+# tantos segundos para actualizar su índice de búsqueda (ver places.search)
+SEARCH_INDEX_POLL_SECONDS = float(getenv('SEARCH_INDEX_POLL_SECONDS', 10))
+# Los ids del registro de cambios del catálogo se asignan al insertar, así
+# que una transacción larga puede hacer visible un cambio con un id menor
+# que la versión que ya vio un cliente. Los paquetes delta y el índice de
+# búsqueda vuelven a leer los cambios de estos últimos segundos
+CATALOG_CHANGES_RESCAN_SECONDS = int(getenv('CATALOG_CHANGES_RESCAN_SECONDS', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -142,21 +226,66 @@ AUTH_USER_MODEL = 'authentication.CustomUser'
 
 # REST Framework settings
 
+# BasicAuthentication ejecuta el hash de la contraseña en cada petición; por
+# eso solo se habilita en desarrollo o con API_BASIC_AUTH=True
+API_BASIC_AUTH = getenv('API_BASIC_AUTH', str(DEBUG)) == 'True'
+
+# El token y su usuario se guardan en el caché de la API durante
+# AUTH_TOKEN_CACHE_TIMEOUT segundos. Revocarlos borra la entrada solo en el
+# caché del proceso que atiende el logout o la desactivación, así que con un
+# caché por proceso (LocMemCache) los demás workers seguirían aceptando el
+# token: por defecto solo se activa con un caché compartido o en desarrollo
+AUTH_TOKEN_CACHE = getenv(
+    'AUTH_TOKEN_CACHE',
+    str(DEBUG or not API_CACHE_BACKEND.endswith(('LocMemCache', 'DummyCache'))),
+) == 'True'
+AUTH_TOKEN_CACHE_TIMEOUT = int(getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60 * 5))
+
+# Tokens de acceso firmados (se validan sin consultar la base de datos) con
+# tokens de renovación rotativos; los endpoints se habilitan con SIGNED_TOKENS=True
+SIGNED_TOKENS = getenv('SIGNED_TOKENS') == 'True'
+ACCESS_TOKEN_LIFETIME = int(getenv('ACCESS_TOKEN_LIFETIME', 60 * 15))
+REFRESH_TOKEN_LIFETIME = int(getenv('REFRESH_TOKEN_LIFETIME', 60 * 60 * 24 * 30))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
+        *(['rest_framework.authentication.BasicAuthentication'] if API_BASIC_AUTH else []),
+        # Antes que la sesión, para que las peticiones sin credenciales sigan
+        # recibiendo 401 con WWW-Authenticate
+        'authentication.authentication.CachedTokenAuthentication',
+        'authentication.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
         'rest_framework.permissions.IsAuthenticated',
         'rest_framework.permissions.IsAdminUser',
     ],
+    # Mismo JSON que JSONRenderer, codificado con orjson si está instalado
+    'DEFAULT_RENDERER_CLASSES': [
+        'binmap_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'binmap_api.throttling.AnonReadThrottle',
+        'binmap_api.throttling.UserWriteThrottle',
+    ],
+    # Una cadena vacía desactiva el límite del scope
+    'DEFAULT_THROTTLE_RATES': {
+        'anon_read': getenv('THROTTLE_ANON_READ', '600/min'),
+        'user_write': getenv('THROTTLE_USER_WRITE', '120/min'),
+        'auth': getenv('THROTTLE_AUTH', '20/min'),
+        'search': getenv('THROTTLE_SEARCH', '60/min'),
+    },
 }
 
+# Dónde se guardan los buckets de los límites de peticiones: en memoria de
+# cada proceso o, con CacheBucketStore, en un caché compartido por todos
+THROTTLE_STORE = getenv('THROTTLE_STORE', 'binmap_api.throttling.LocalBucketStore')
+THROTTLE_CACHE_ALIAS = getenv('THROTTLE_CACHE_ALIAS', API_CACHE_ALIAS)
+
 # CORS settings
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -186,11 +315,55 @@ CORS_ALLOW_HEADERS = [
 MEDIA_ROOT = path.join(BASE_DIR, "media")
 MEDIA_URL = '/media/'
 
+# Las imágenes y vídeos de los lugares se guardan con el hash de su
+# contenido en el nombre, por lo que se pueden cachear indefinidamente
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'media': {'BACKEND': 'binmap_api.storage.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Entrega de MEDIA_ROOT: 'python' sirve los archivos desde Django (solo con
+# DEBUG); 'x-accel' (nginx) y 'x-sendfile' (Apache, lighttpd) dejan que el
+# servidor web envíe los bytes y Django solo responde las cabeceras
+MEDIA_SERVE_MODE = getenv('MEDIA_SERVE_MODE', 'python' if DEBUG else 'x-accel')
+# Location interna de nginx que apunta a MEDIA_ROOT (modo x-accel)
+MEDIA_ACCEL_PREFIX = getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 
 # Carga de archivos
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 30
+# Los archivos de más de 1 MB se escriben en un temporal en disco en lugar
+# de quedarse en memoria mientras se reciben
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 30
 
+# Subidas reanudables de vídeos: los fragmentos se escriben directamente en
+# RESUMABLE_UPLOAD_DIR (mejor en el mismo disco que MEDIA_ROOT, para que al
+# finalizar el archivo solo se mueva)
+RESUMABLE_UPLOAD_DIR = getenv('RESUMABLE_UPLOAD_DIR', path.join(BASE_DIR, 'uploads'))
+RESUMABLE_UPLOAD_MAX_SIZE = int(getenv('RESUMABLE_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024 * 2))
+RESUMABLE_UPLOAD_MAX_CHUNK = int(getenv('RESUMABLE_UPLOAD_MAX_CHUNK', 1024 * 1024 * 16))
+
+
+# Tareas en segundo plano (miniaturas de imágenes y vídeos)
+# TASKS_MODE=sync las ejecuta durante la propia petición
+TASKS_MODE = getenv('TASKS_MODE', 'thread')
+TASKS_WORKERS = int(getenv('TASKS_WORKERS', 2))
+
+# ffmpeg se usa para extraer el fotograma de portada de los vídeos; sin él
+# los vídeos no tienen portada
+FFMPEG_BINARY = getenv('FFMPEG_BINARY', 'ffmpeg')
+
+
+# Métricas de rendimiento (binmap_api.metrics): cabecera Server-Timing en
+# cada respuesta y registro de peticiones y consultas lentas
+SERVER_TIMING = getenv('SERVER_TIMING', 'True') == 'True'
+SLOW_REQUEST_MS = int(getenv('SLOW_REQUEST_MS', 1000))
+SLOW_QUERY_MS = int(getenv('SLOW_QUERY_MS', 200))
+# /metrics (formato Prometheus) exige `Authorization: Bearer <METRICS_TOKEN>`;
+# sin token solo está disponible con DEBUG
+METRICS_TOKEN = getenv('METRICS_TOKEN', '')
+
 
 # Session settings
 
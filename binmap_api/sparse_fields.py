@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse fieldsets and expansion of relations.
+
+`?fields=id,name,latitude` limits a response to the listed fields (`id`
+is always included) and `?expand=category` chooses which relations are
+rendered as nested objects; the other relations listed in the serializer's
+`Meta.expandable_fields` are rendered as their primary key. Without
+`expand` every relation keeps its nested representation, so responses are
+unchanged for clients that send neither parameter.
+
+The query for a sparse response comes from the query plan of the
+serializer instance built with those options, so it only joins the
+expanded relations and only fetches the columns the fields read (see
+`binmap_api.query_plan`).
+"""
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from .query_plan import build_query_plan
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Serializer options `fields` (names to render) and `expand` (relations
+    to nest). None keeps the full representation.
+    """
+    always_included_fields = ('id',)
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.requested_fields = fields
+        self.expanded_fields = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.requested_fields is not None:
+            fields = {
+                name: field for name, field in fields.items()
+                if name in self.requested_fields or name in self.always_included_fields
+            }
+        if self.expanded_fields is not None:
+            for name in self.Meta.expandable_fields:
+                if name in fields and name not in self.expanded_fields:
+                    fields[name] = PrimaryKeyRelatedField(read_only=True)
+        return fields
+
+
+@lru_cache(maxsize=None)
+def _field_names(serializer_class):
+    return frozenset(serializer_class().fields)
+
+
+def _parse_names(value, allowed, param):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError({param: f"Campos desconocidos: {', '.join(unknown)}"})
+    return frozenset(names)
+
+
+class SparseFieldsMixin:
+    """
+    Reads `?fields=` and `?expand=` on `sparse_actions`, passes them to the
+    serializer and queries only what it renders. Must come before
+    `QueryPlanMixin`.
+
+    `sparse_extra_columns` lists columns the view reads besides the
+    serializer, such as the ones pagination orders by.
+    """
+    fields_param = 'fields'
+    expand_param = 'expand'
+    sparse_actions = ('list', 'retrieve')
+    sparse_extra_columns = ()
+
+    def get_sparse_fields(self):
+        """
+        Returns the (fields, expand) options requested by the client.
+        """
+        options = getattr(self, '_sparse_fields', None)
+        if options is None:
+            fields = expand = None
+            params = self.request.query_params
+            if self.action in self.sparse_actions:
+                serializer_class = self.get_serializer_class()
+                if self.fields_param in params:
+                    fields = _parse_names(params[self.fields_param], _field_names(serializer_class), self.fields_param)
+                if self.expand_param in params:
+                    expand = _parse_names(
+                        params[self.expand_param], serializer_class.Meta.expandable_fields, self.expand_param,
+                    )
+            options = self._sparse_fields = (fields, expand)
+        return options
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if expand is not None:
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_query_plan(self):
+        if self.get_sparse_fields() == (None, None):
+            return super().get_query_plan()
+        plan = build_query_plan(self.get_serializer(), only=True)
+        if plan.only is not None:
+            plan.only.extend(self.sparse_extra_columns)
+        return plan
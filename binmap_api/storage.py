@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed file storage for uploaded media.
+
+Files are stored under a name that carries a hash of their content
+(`places/images/photo.3f2a9c1b7d4e.jpg`). A name therefore always refers
+to the same bytes: clients and proxies may cache it forever, the hash
+doubles as its ETag, and uploading the same file twice stores it once.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+
+HASH_LENGTH = 12
+HASHED_NAME_RE = re.compile(r'\.([0-9a-f]{%d})(\.[^./]+)?$' % HASH_LENGTH)
+
+
+def content_hash(name):
+    """
+    Returns the content hash embedded in a stored name, or None.
+    """
+    match = HASHED_NAME_RE.search(os.path.basename(name))
+    return match.group(1) if match else None
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    def hashed_name(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        root, ext = os.path.splitext(name)
+        suffix = f'.{digest.hexdigest()[:HASH_LENGTH]}{ext}'
+        if max_length is not None and len(root) + len(suffix) > max_length:
+            # Se recorta el nombre original, nunca el hash
+            root = root[:max(1, max_length - len(suffix))]
+        return root + suffix
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(self.generate_filename(name), content, max_length)
+        if self.exists(name):
+            # Mismo contenido ya guardado
+            return name
+        return super().save(name, content, max_length)
+
+
+def media_storage():
+    """
+    Storage for place images, videos and their derivatives (the `media`
+    alias in STORAGES).
+    """
+    return storages['media']
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal background task runner.
+
+Tasks run in a process-wide thread pool, which suits the work we hand off
+(Pillow releases the GIL while resizing and ffmpeg runs as a subprocess).
+With `TASKS_MODE = 'sync'` tasks run inline instead, which is what tests
+and management commands want.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.TASKS_WORKERS, thread_name_prefix='binmap-task')
+    return _executor
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background task %s failed', func.__qualname__)
+    finally:
+        # Cada hilo del pool abre sus propias conexiones
+        connections.close_all()
+
+
+def enqueue(func, *args):
+    if settings.TASKS_MODE == 'sync':
+        func(*args)
+    else:
+        get_executor().submit(_run, func, args)
+
+
+def enqueue_on_commit(func, *args, using=None):
+    """
+    Enqueues the task once the current transaction commits, so the worker
+    sees the rows it was scheduled for.
+    """
+    transaction.on_commit(lambda: enqueue(func, *args), using=using)
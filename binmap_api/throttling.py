@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Token-bucket rate limiting for DRF views.
+
+Each scope has a rate such as `60/min` in `DEFAULT_THROTTLE_RATES`: a
+bucket holds up to 60 tokens, refills at one per second and every request
+takes one. The bucket is stored as a single number, the time at which it
+will be full again (the GCRA formulation of a token bucket), so checking a
+request is one read, a little arithmetic and one write.
+
+Buckets live in the store named by `THROTTLE_STORE`:
+
+- `LocalBucketStore` keeps them in a dict of this process. It takes no
+  lock; under concurrent requests for the same key one extra request may
+  occasionally get through, which is fine for rate limiting. Limits apply
+  per process.
+- `CacheBucketStore` keeps them in a Django cache (`THROTTLE_CACHE_ALIAS`)
+  shared by every API node. Django's cache API has no compare-and-set, so
+  each update takes a short per-key lock with `cache.add`: four round
+  trips instead of two, but concurrent requests cannot reuse a token.
+
+Rejected requests get a 429 with `Retry-After`. A scope without a rate is
+not limited. Views outside DRF (the async views) use `consume` and
+`aconsume` with the same scopes and buckets.
+"""
+import functools
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Returns (seconds per token, bucket period in seconds) for `N/period`.
+    """
+    count, period = rate.split('/')
+    seconds = PERIODS[period[0]]
+    return seconds / int(count), seconds
+
+
+class LocalBucketStore:
+    max_keys = 100_000
+    # No hace E/S: se puede usar directamente desde el bucle de eventos
+    blocking = False
+
+    def __init__(self):
+        self.buckets = {}
+
+    def consume(self, key, interval, period):
+        """
+        Takes a token from the bucket and returns 0, or returns how many
+        seconds remain until one is available.
+        """
+        now = time.monotonic()
+        full_at = max(self.buckets.get(key, now), now) + interval
+        wait = full_at - now - period
+        if wait > 0:
+            return wait
+        if len(self.buckets) >= self.max_keys:
+            self.prune(now)
+        self.buckets[key] = full_at
+        return 0
+
+    def prune(self, now):
+        # Un bucket ya lleno equivale a no tenerlo
+        for key, full_at in list(self.buckets.items()):
+            if full_at <= now:
+                self.buckets.pop(key, None)
+
+    def clear(self):
+        self.buckets.clear()
+
+
+class CacheBucketStore:
+    blocking = True
+    # El candado caduca solo si el proceso muere mientras lo tiene
+    lock_timeout = 1
+    lock_attempts = 20
+    lock_wait = 0.005
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def consume(self, key, interval, period):
+        key = f'throttle:{key}'
+        lock = f'{key}:lock'
+        for _ in range(self.lock_attempts):
+            if self.cache.add(lock, 1, timeout=self.lock_timeout):
+                try:
+                    return self.update(key, interval, period)
+                finally:
+                    self.cache.delete(lock)
+            time.sleep(self.lock_wait)
+        # Si el candado no se libera (~100 ms) se decide sin él: como mucho
+        # se cuela una petición más por cada una que compita en ese momento
+        return self.update(key, interval, period)
+
+    def update(self, key, interval, period):
+        now = time.time()
+        full_at = max(self.cache.get(key, now), now) + interval
+        wait = full_at - now - period
+        if wait > 0:
+            return wait
+        self.cache.set(key, full_at, timeout=math.ceil(full_at - now))
+        return 0
+
+    def clear(self):
+        pass
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.THROTTLE_STORE)()
+    return _store
+
+
+def consume(scope, key):
+    """
+    Takes a token from the bucket `key` of `scope` and returns 0, or the
+    seconds until one is available.
+    """
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if not rate:
+        return 0
+    interval, period = parse_rate(rate)
+    return get_store().consume(f'{scope}:{key}', interval, period)
+
+
+async def aconsume(scope, key):
+    if get_store().blocking:
+        return await sync_to_async(consume)(scope, key)
+    return consume(scope, key)
+
+
+def client_ident(request):
+    """
+    Client IP as DRF throttles see it (honours NUM_PROXIES).
+    """
+    return BaseThrottle().get_ident(request)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limits requests per user, or per client IP for anonymous requests,
+    within `scope`. Subclasses narrow which requests count with `applies`.
+    """
+    scope = None
+
+    def __init__(self):
+        self.wait_time = None
+
+    def applies(self, request, view):
+        return True
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'{self.scope}:user:{request.user.pk}'
+        return f'{self.scope}:ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if not rate or not self.applies(request, view):
+            return True
+        interval, period = parse_rate(rate)
+        self.wait_time = get_store().consume(self.get_cache_key(request, view), interval, period)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonReadThrottle(TokenBucketThrottle):
+    scope = 'anon_read'
+
+    def applies(self, request, view):
+        return request.method in SAFE_METHODS and not request.user.is_authenticated
+
+
+class UserWriteThrottle(TokenBucketThrottle):
+    scope = 'user_write'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS and request.user.is_authenticated
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """
+    For login, signup and token endpoints: always per client IP.
+    """
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return f'{self.scope}:ip:{self.get_ident(request)}'
+
+
+class SearchThrottle(TokenBucketThrottle):
+    scope = 'search'
+
+    def applies(self, request, view):
+        return bool(request.query_params.get('search'))
@@ -15,19 +15,31 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from .api_router import router
-from authentication.views import CustomObtainAuthToken
+from .metrics import metrics_view
+from .serve import serve_media
+from authentication.views import (
+    CustomObtainAuthToken, SignedTokenObtainView, SignedTokenRefreshView, SignedTokenRevokeView,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include(router.urls)),
+    path('api/v1/async/', include('binmap_api.async_urls')),
     path('api/v1/', include('authentication.urls')),
     path('api/v1/auth/token/', CustomObtainAuthToken.as_view(), name='api_token_auth'),
+    path('api/v1/auth/token/signed/', SignedTokenObtainView.as_view(), name='api_signed_token'),
+    path('api/v1/auth/token/refresh/', SignedTokenRefreshView.as_view(), name='api_token_refresh'),
+    path('api/v1/auth/token/revoke/', SignedTokenRevokeView.as_view(), name='api_token_revoke'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
-# Server static files in development server
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media files: served by Django in development and delegated to the web
+# server in production (see MEDIA_SERVE_MODE)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
 
 
 class PlacesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'places'
+
+    def ready(self):
+        from binmap_api.cache import track_model_changes
+        from .media import schedule_place_media
+        from .offline import track_catalog_changes
+        from .popularity import recount_user_places, remember_user_places
+        from .uploads import remove_part
+
+        track_model_changes(
+            self.get_model('State'),
+            self.get_model('Municipality'),
+            self.get_model('Category'),
+            self.get_model('Place'),
+            self.get_model('Favorite'),
+            self.get_model('VisitedPlace'),
+        )
+        track_catalog_changes()
+        post_save.connect(schedule_place_media, sender=self.get_model('Place'), dispatch_uid='place-media')
+        pre_delete.connect(remember_user_places, sender=get_user_model(), dispatch_uid='user-popularity-places')
+        post_delete.connect(recount_user_places, sender=get_user_model(), dispatch_uid='user-popularity-places')
+        post_delete.connect(remove_part, sender=self.get_model('UploadSession'), dispatch_uid='upload-session-part')
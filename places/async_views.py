@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Vistas asíncronas de solo lectura del catálogo (ver `binmap_api.async_views`).
+"""
+import asyncio
+import time
+
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from binmap_api.async_views import AsyncReadView, check_throttles, json_response
+from . import offline
+from .export import aexport_rows, astream_ndjson
+from .models import State, Municipality, Category, Place
+from .serializers import StateSerializer, MunicipalitySerializer, CategorySerializer, PlaceSerializer
+
+CHANGES_POLL_INTERVAL = 1
+CHANGES_MAX_TIMEOUT = 30
+
+
+class StateAsyncView(AsyncReadView):
+    queryset = State.objects.all()
+    serializer_class = StateSerializer
+
+
+class MunicipalityAsyncView(AsyncReadView):
+    queryset = Municipality.objects.all()
+    serializer_class = MunicipalitySerializer
+
+
+class CategoryAsyncView(AsyncReadView):
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+
+
+class PlaceAsyncView(AsyncReadView):
+    queryset = Place.objects.all()
+    serializer_class = PlaceSerializer
+
+
+@require_GET
+async def export_places(request):
+    """
+    Exporta el catálogo completo como NDJSON sin ocupar un hilo mientras
+    se envía la respuesta
+    """
+    throttled = await check_throttles(request)
+    if throttled is not None:
+        return throttled
+    rows = aexport_rows(Place.objects.all(), request)
+    return StreamingHttpResponse(astream_ndjson(rows), content_type='application/x-ndjson; charset=utf-8')
+
+
+@require_GET
+async def catalog_changes(request):
+    """
+    Espera hasta `timeout` segundos a que la versión del catálogo supere
+    `since` y devuelve la versión actual; los clientes sin conexión lo usan
+    para saber cuándo pedir un paquete nuevo
+    """
+    throttled = await check_throttles(request)
+    if throttled is not None:
+        return throttled
+    try:
+        since = int(request.GET.get('since', 0))
+        timeout = float(request.GET.get('timeout', CHANGES_MAX_TIMEOUT))
+    except ValueError:
+        return json_response({"error": "'since' y 'timeout' deben ser números"}, status=400)
+    timeout = max(0, min(timeout, CHANGES_MAX_TIMEOUT))
+
+    deadline = time.monotonic() + timeout
+    version = await offline.acurrent_version()
+    while version <= since and time.monotonic() < deadline:
+        await asyncio.sleep(min(CHANGES_POLL_INTERVAL, max(0, deadline - time.monotonic())))
+        version = await offline.acurrent_version()
+
+    return json_response({"version": version, "changed": version > since})
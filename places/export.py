@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Exportación del catálogo de lugares como flujo NDJSON o CSV.
+
+Las filas se leen con `.values()` resolviendo los nombres relacionados en
+la misma consulta y se recorren con `.iterator()`, de modo que la memoria
+usada no depende del número de lugares.
+"""
+import csv
+
+from binmap_api.renderers import Echo, NDJSONRenderer
+from binmap_api.storage import media_storage
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Columna exportada -> lookup sobre Place
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'image': 'image',
+    'video': 'video',
+    'municipality_id': 'municipality_id',
+    'municipality_name': 'municipality__name',
+    'state_id': 'municipality__state_id',
+    'state_name': 'municipality__state__name',
+    'category_id': 'category_id',
+    'category_name': 'category__name',
+    'route_id': 'route_id',
+    'route_name': 'route__name',
+}
+
+
+def _export_values(queryset):
+    # values() y no values_list(): este último no funciona con aiterator()
+    return queryset.order_by('id').values(*EXPORT_COLUMNS.values())
+
+
+def _export_row(values, request):
+    row = {column: values[lookup] for column, lookup in EXPORT_COLUMNS.items()}
+    for column in ('id', 'municipality_id', 'state_id', 'category_id', 'route_id', 'latitude', 'longitude'):
+        row[column] = str(row[column])
+    for column in ('image', 'video'):
+        if row[column]:
+            row[column] = request.build_absolute_uri(media_storage().url(row[column]))
+        else:
+            row[column] = None
+    return row
+
+
+def export_rows(queryset, request):
+    """
+    Genera un diccionario plano por lugar, en orden de id.
+    """
+    for values in _export_values(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield _export_row(values, request)
+
+
+async def aexport_rows(queryset, request):
+    """
+    Versión asíncrona de `export_rows` para las vistas ASGI.
+    """
+    async for values in _export_values(queryset).aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield _export_row(values, request)
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield NDJSONRenderer.render_line(row)
+
+
+async def astream_ndjson(rows):
+    async for row in rows:
+        yield NDJSONRenderer.render_line(row)
+
+
+def stream_csv(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=list(EXPORT_COLUMNS))
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
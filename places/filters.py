@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import uuid
+
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from . import geo
+from .popularity import POPULAR_ORDERING
+from .search import place_index
+
+
+def _parse_floats(value, count, param):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValidationError({param: f"Se esperaban {count} números separados por comas"})
+    return numbers
+
+
+def _check_coordinates(latitude, longitude, param):
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValidationError({param: "Coordenadas fuera de rango"})
+
+
+class GeoFilter(filters.BaseFilterBackend):
+    """
+    Filters places inside a bounding box (`bbox=min_lon,min_lat,max_lon,max_lat`)
+    or within a radius in kilometers of a point (`near=lat,lon&radius=km`).
+
+    Candidates are located through the geohash index and then refined with
+    the exact window or haversine distance.
+
+    The window is applied as a subquery on the primary key: with the ranges
+    in the outer query the planner may instead walk the table in the
+    pagination order (`ORDER BY id LIMIT ...`) and test every row, so the
+    cost would grow with the table instead of with the window.
+    """
+    bbox_param = 'bbox'
+    near_param = 'near'
+    radius_param = 'radius'
+    max_radius_km = 500
+
+    def filter_queryset(self, request, queryset, view):
+        bbox = request.query_params.get(self.bbox_param)
+        near = request.query_params.get(self.near_param)
+
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = _parse_floats(bbox, 4, self.bbox_param)
+            _check_coordinates(min_lat, min_lon, self.bbox_param)
+            _check_coordinates(max_lat, max_lon, self.bbox_param)
+            if min_lat > max_lat or min_lon > max_lon:
+                raise ValidationError({self.bbox_param: "La esquina mínima debe estar antes que la máxima"})
+            queryset = self.filter_window(queryset, min_lat, min_lon, max_lat, max_lon)
+
+        if near:
+            latitude, longitude = _parse_floats(near, 2, self.near_param)
+            _check_coordinates(latitude, longitude, self.near_param)
+            radius = self.get_radius(request)
+            window = geo.bounding_box(latitude, longitude, radius)
+            queryset = self.filter_window(queryset, *window)
+            queryset = queryset.alias(
+                distance=geo.distance_expression(latitude, longitude)
+            ).filter(distance__lte=radius)
+
+        return queryset
+
+    def get_radius(self, request):
+        value = request.query_params.get(self.radius_param)
+        if value is None:
+            raise ValidationError({self.radius_param: "Se requiere el radio en kilómetros junto con 'near'"})
+        try:
+            radius = float(value)
+        except ValueError:
+            raise ValidationError({self.radius_param: "El radio debe ser un número"})
+        if not 0 < radius <= self.max_radius_km:
+            raise ValidationError({self.radius_param: f"El radio debe estar entre 0 y {self.max_radius_km} km"})
+        return radius
+
+    def filter_window(self, queryset, min_lat, min_lon, max_lat, max_lon):
+        candidates = queryset.model._base_manager.filter(
+            geo.cover_q(min_lat, min_lon, max_lat, max_lon),
+            latitude__gte=min_lat,
+            latitude__lte=max_lat,
+            longitude__gte=min_lon,
+            longitude__lte=max_lon,
+        )
+        return queryset.filter(pk__in=candidates.values('pk'))
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.bbox_param,
+                'required': False,
+                'in': 'query',
+                'description': 'min_lon,min_lat,max_lon,max_lat',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.near_param,
+                'required': False,
+                'in': 'query',
+                'description': 'lat,lon',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.radius_param,
+                'required': False,
+                'in': 'query',
+                'description': 'km',
+                'schema': {'type': 'number'},
+            },
+        ]
+
+
+class RelatedIdFilter(filters.BaseFilterBackend):
+    """
+    Exact filters on foreign keys, declared on the view as
+    `related_id_filters = {'param': 'field_id'}` (`?municipality=<uuid>`).
+    """
+    def filter_queryset(self, request, queryset, view):
+        for param, field in getattr(view, 'related_id_filters', {}).items():
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                value = uuid.UUID(value)
+            except ValueError:
+                raise ValidationError({param: "Identificador no válido"})
+            queryset = queryset.filter(**{field: value})
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': param,
+                'required': False,
+                'in': 'query',
+                'description': 'uuid',
+                'schema': {'type': 'string', 'format': 'uuid'},
+            }
+            for param in getattr(view, 'related_id_filters', {})
+        ]
+
+
+class PlaceSearchFilter(filters.BaseFilterBackend):
+    """
+    `?search=` over the in-process search index (see `places.search`).
+
+    When a paginated list is ordered by relevance the hits are handed to
+    the paginator as `view.search_hits` and the queryset is left as is:
+    `KeysetPagination` ranks and pages them in Python and only fetches the
+    rows of the page. Otherwise (another `?ordering=`, the export) the
+    queryset is filtered to the hits.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        hits = place_index.search(terms)
+        if hits is None:
+            return queryset
+        if not hits:
+            return queryset.none()
+        if self.pages_hits(request, view):
+            view.search_hits = hits
+            return queryset
+        return queryset.filter(pk__in=[pk for pk, _ in hits])
+
+    def pages_hits(self, request, view):
+        ordering = request.query_params.get(PlaceOrderingFilter.ordering_param)
+        return (
+            getattr(view, 'action', None) == 'list'
+            and getattr(view, 'pagination_class', None) is not None
+            and ordering not in PlaceOrderingFilter.ordering_aliases
+        )
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Nombre del lugar, categoría, municipio, estado o ruta',
+            'schema': {'type': 'string'},
+        }]
+
+
+class PlaceOrderingFilter(filters.OrderingFilter):
+    """
+    `?ordering=popular` sorts places by favorites and then visits, matching
+    the popularity index on `Place`. Search results default to relevance
+    (see `PlaceSearchFilter`).
+    """
+    ordering_aliases = {
+        'popular': POPULAR_ORDERING,
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering_aliases.get(request.query_params.get(self.ordering_param))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.ordering_param,
+            'required': False,
+            'in': 'query',
+            'description': ', '.join(self.ordering_aliases),
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Utilidades de indexación espacial basadas en geohash.
+
+Cada lugar guarda el geohash de sus coordenadas en una columna indexada;
+una ventana geográfica se traduce a unas pocas celdas de geohash y cada
+celda a un rango sobre ese índice, de modo que la consulta solo recorre
+las filas cercanas en lugar de toda la tabla.
+"""
+import math
+
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# Número máximo de celdas en las que se descompone una ventana. Con más
+# celdas la cobertura se ajusta mejor a la ventana, pero la consulta lleva
+# más rangos OR'd.
+MAX_COVER_CELLS = 16
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Codifica unas coordenadas como geohash de `precision` caracteres.
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    latitude, longitude = float(latitude), float(longitude)
+
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """
+    Devuelve el alto y ancho en grados de una celda de geohash.
+    """
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _cell_span(lo, hi, origin, size, count):
+    first = min(int((lo - origin) // size), count - 1)
+    last = min(int((hi - origin) // size), count - 1)
+    return max(first, 0), max(last, 0)
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS):
+    """
+    Devuelve los prefijos de geohash cuyas celdas cubren la ventana dada,
+    usando la mayor precisión que no supere `max_cells` celdas.
+    """
+    best = ['']
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows_total = round(180.0 / height)
+        cols_total = round(360.0 / width)
+        row_lo, row_hi = _cell_span(min_lat, max_lat, -90.0, height, rows_total)
+        col_lo, col_hi = _cell_span(min_lon, max_lon, -180.0, width, cols_total)
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > max_cells:
+            break
+        best = [
+            encode(-90.0 + (row + 0.5) * height, -180.0 + (col + 0.5) * width, precision)
+            for row in range(row_lo, row_hi + 1)
+            for col in range(col_lo, col_hi + 1)
+        ]
+    return sorted(best)
+
+
+def _successor(prefix):
+    """
+    Siguiente prefijo de la misma longitud en el orden del alfabeto base32,
+    o None si el prefijo es el último posible.
+    """
+    chars = list(prefix)
+    for index in range(len(chars) - 1, -1, -1):
+        position = BASE32.index(chars[index])
+        if position < len(BASE32) - 1:
+            chars[index] = BASE32[position + 1]
+            return ''.join(chars[:index + 1])
+    return None
+
+
+def cover_q(min_lat, min_lon, max_lat, max_lon, field='geohash'):
+    """
+    Construye un Q con un rango sobre la columna de geohash por cada celda
+    que cubre la ventana.
+    """
+    query = Q()
+    for prefix in cover(min_lat, min_lon, max_lat, max_lon):
+        if not prefix:
+            return Q()
+        cell = Q(**{f'{field}__gte': prefix})
+        upper = _successor(prefix)
+        if upper is not None:
+            cell &= Q(**{f'{field}__lt': upper})
+        query |= cell
+    return query
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Ventana (min_lat, min_lon, max_lat, max_lon) que contiene el círculo
+    de `radius_km` kilómetros alrededor del punto.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    delta_lat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(latitude - delta_lat, -90.0),
+        max(longitude - delta_lon, -180.0),
+        min(latitude + delta_lat, 90.0),
+        min(longitude + delta_lon, 180.0),
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distancia en kilómetros sobre la esfera terrestre entre dos puntos.
+    """
+    lat1, lon1, lat2, lon2 = (math.radians(float(value)) for value in (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def distance_expression(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """
+    Expresión SQL con la distancia haversine (km) desde el punto dado a las
+    coordenadas de cada fila.
+    """
+    lat_rad = math.radians(float(latitude))
+    lon_rad = math.radians(float(longitude))
+    row_lat = Radians(Cast(F(lat_field), FloatField()))
+    row_lon = Radians(Cast(F(lon_field), FloatField()))
+    a = (
+        Power(Sin((row_lat - lat_rad) / 2), 2)
+        + math.cos(lat_rad) * Cos(row_lat) * Power(Sin((row_lon - lon_rad) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
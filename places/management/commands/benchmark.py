@@ -0,0 +1,615 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de todos los endpoints de la API: el router, sus acciones extra
+(bulk, exportación, estado del usuario, alternar favoritos y visitas,
+subidas de vídeo), las vistas asíncronas y la autenticación, tanto
+lecturas como escrituras.
+
+Sin `--server` crea una base de datos de prueba desechable, la llena con
+`places.seed` a la escala indicada y lanza las peticiones con el cliente de
+pruebas de Django, una tras otra. Con `--server URL` las lanza por HTTP
+contra un servidor real (que debe tener datos de `seed_data` y los límites
+de peticiones desactivados) con `--concurrency` conexiones; los escenarios
+de escritura crean y borran registros en su base de datos.
+
+Las escrituras se hacen como el administrador de `seed_data` y lo que cada
+petición consume (el registro a borrar, la sesión de subida, el token a
+renovar) se crea antes de medirla. `--only` filtra los escenarios antes de
+esas peticiones previas.
+
+Para cada endpoint informa peticiones por segundo, latencias p50/p95/p99 y
+consultas por petición (de la cabecera Server-Timing). Si existe la línea
+base (`benchmarks/baseline.json` por defecto), la compara y termina con
+error ante una regresión: más consultas que en la línea base o p50 y p95
+más lentos que la tolerancia. `--save-baseline` guarda los resultados como
+nueva línea base.
+"""
+import http.client
+import json
+import os
+import re
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import cache
+from itertools import count, cycle
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.authtoken.models import Token
+
+from binmap_api.api_router import router
+from binmap_api.throttling import get_store
+from places.seed import ADMIN_EMAIL, DESCRIPTION, USER_EMAIL_DOMAIN, USER_PASSWORD, seed
+from .benchmark_async import percentile
+from .seed_data import add_scale_arguments, scale_from_options
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+# Diferencias de p95 menores que esto se consideran ruido
+MIN_REGRESSION_MS = 2
+PASSWORD_REQUESTS = 5
+ASYNC_PREFIXES = ('states', 'municipalities', 'categories', 'places', 'routes')
+UPLOAD_CHUNK = b'\0' * 64 * 1024
+
+
+@dataclass
+class Scenario:
+    name: str
+    path: str = None
+    method: str = 'GET'
+    data: object = None
+    # None (anónimo), 'user' o 'admin'
+    auth: str = None
+    expected: tuple = (200,)
+    headers: dict = None
+    # Para endpoints que calculan el hash de la contraseña en cada petición
+    max_requests: int = None
+    # Función sin medir antes de cada petición; devuelve valores que
+    # reemplazan a path, data o token
+    prepare: object = None
+
+
+@dataclass
+class Result:
+    rps: float
+    p50: float
+    p95: float
+    p99: float
+    queries: int = None
+    errors: int = 0
+    statuses: list = field(default_factory=list)
+
+
+async def _read(chunks):
+    return b''.join([chunk async for chunk in chunks])
+
+
+def _encode(data):
+    if isinstance(data, bytes):
+        return data, 'application/offset+octet-stream'
+    return (json.dumps(data) if data is not None else None), 'application/json'
+
+
+class ClientTransport:
+    """
+    Peticiones en proceso con el cliente de pruebas de Django.
+    """
+    def __init__(self):
+        # Los errores del servidor cuentan como respuestas 500, no como excepciones
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, data=None, token=None, headers=None):
+        extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        body, content_type = _encode(data)
+        response = self.client.generic(method, path, body or '', content_type=content_type, headers=headers, **extra)
+        # Sin la cookie de sesión del login cada petición es independiente
+        self.client.cookies.clear()
+        if not response.streaming:
+            content = response.content
+        elif response.is_async:
+            # Las vistas asíncronas devuelven un iterador asíncrono
+            content = async_to_sync(_read)(response.streaming_content)
+        else:
+            content = b''.join(response.streaming_content)
+        return response.status_code, content, response.headers.get('Server-Timing', '')
+
+
+class HTTPTransport:
+    """
+    Peticiones HTTP a un servidor real, con una conexión persistente por hilo.
+    """
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.local = threading.local()
+
+    def request(self, method, path, data=None, token=None, headers=None):
+        body, content_type = _encode(data)
+        headers = {'Content-Type': content_type, **(headers or {})}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        for attempt in range(2):
+            connection = getattr(self.local, 'connection', None)
+            if connection is None:
+                connection = self.local.connection = self.connection_class(self.netloc, timeout=30)
+                connection.connect()
+                # Sin Nagle: las peticiones pequeñas no esperan al ACK retardado
+                connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read(), response.getheader('Server-Timing', '')
+            except (http.client.HTTPException, OSError):
+                # El servidor cerró la conexión persistente: se reintenta una vez
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+
+def _first_id(transport, path, token):
+    status, content, _ = transport.request('GET', path, token=token)
+    if status != 200:
+        return None
+    data = json.loads(content)
+    results = data.get('results', data) if isinstance(data, dict) else data
+    if results and isinstance(results, list) and isinstance(results[0], dict):
+        return results[0].get('id')
+    return None
+
+
+def build_scenarios(transport, tokens, only=None):
+    """
+    Devuelve los escenarios cuyo nombre contiene `only` (todos sin él).
+    `tokens` tiene los tokens de 'user' y 'admin'. Las peticiones previas
+    que necesita un escenario (ids, registros de apoyo) solo se hacen si se
+    selecciona.
+    """
+    scenarios = []
+
+    def add(name, make, *args, **kwargs):
+        if only and only not in name:
+            return
+        scenario = make(name, *args, **kwargs)
+        if scenario is not None:
+            scenarios.append(scenario)
+
+    def call(method, path, data=None, auth=None, expected=(200, 201)):
+        status, content, _ = transport.request(method, path, data, tokens.get(auth))
+        if status not in expected:
+            raise CommandError(f'{method} {path} devolvió {status} al preparar el benchmark')
+        return json.loads(content) if content else None
+
+    @cache
+    def needs_auth(path):
+        status, _, _ = transport.request('GET', path)
+        return status in (401, 403)
+
+    @cache
+    def first_id(path):
+        return _first_id(transport, path, tokens['user'] if needs_auth(path) else None)
+
+    @cache
+    def place():
+        """
+        Ids del primer lugar y de sus relaciones.
+        """
+        pk = first_id('/api/v1/places/')
+        data = call('GET', f'/api/v1/places/{pk}/')
+        return {
+            'id': pk,
+            'municipality': data['municipality']['id'],
+            'category': data['category']['id'],
+            'route': data['route']['id'],
+        }
+
+    @cache
+    def place_ids():
+        data = call('GET', '/api/v1/places/?page_size=50&fields=id')
+        return [item['id'] for item in data['results']]
+
+    def bulk_create(prefix, row):
+        data = call('POST', f'/api/v1/{prefix}/bulk/', [row], 'admin')
+        result = data['results'][0]
+        if result['status'] != 'created':
+            raise CommandError(f'No se pudo crear el registro de apoyo en {prefix}: {result}')
+        return result['id']
+
+    def new_place():
+        row = {key: value for key, value in place().items() if key != 'id'}
+        return bulk_create('places', {
+            **row, 'name': 'Benchmark', 'description': DESCRIPTION, 'latitude': '20.96', 'longitude': '-89.62',
+        })
+
+    def new_route():
+        return call('POST', '/api/v1/routes/', {'name': 'Benchmark', 'duration': '01:00'}, 'admin')['id']
+
+    def new_link():
+        # Cada enlace va a una ruta nueva para no chocar con unique_together
+        return bulk_create('municipality-routes', {'municipality': place()['municipality'], 'route': new_route()})
+
+    @cache
+    def link():
+        return new_link()
+
+    def detail_path(prefix):
+        if prefix == 'municipality-routes':
+            # Su representación no incluye el id: se usa un enlace creado aquí
+            return f'/api/v1/{prefix}/{link()}/'
+        pk = first_id(f'/api/v1/{prefix}/')
+        return None if pk is None else f'/api/v1/{prefix}/{pk}/'
+
+    # Lecturas del router
+    for prefix, viewset, _ in router.registry:
+        path = f'/api/v1/{prefix}/'
+        add(f'{prefix} list', lambda name, path: Scenario(name, path, auth='user' if needs_auth(path) else None), path)
+        if hasattr(viewset, 'retrieve'):
+            add(f'{prefix} detail', lambda name, prefix, path: (
+                Scenario(name, detail_path(prefix), auth='user' if needs_auth(path) else None)
+                if detail_path(prefix) else None
+            ), prefix, path)
+
+    # Una página grande, para que domine el coste por fila de la serialización
+    add('places page 100', Scenario, '/api/v1/places/?page_size=100')
+    add('places map page 100', Scenario,
+        '/api/v1/places/?page_size=100&fields=name,latitude,longitude,category&expand=')
+    add('places search', Scenario, '/api/v1/places/?search=cenote')
+    add('places export ndjson', Scenario, '/api/v1/places/export/?format=ndjson')
+    add('places export csv', Scenario, '/api/v1/places/export/?format=csv')
+    add('places user-state', lambda name: Scenario(
+        name, f"/api/v1/places/user-state/?ids={','.join(place_ids())}", auth='user',
+    ))
+    add('places user-state post', lambda name: Scenario(
+        name, '/api/v1/places/user-state/', 'POST', {'ids': place_ids()}, auth='user',
+    ))
+
+    # Altas, cambios y bajas del catálogo
+    payloads = {
+        'states': {'name': 'Benchmark'},
+        'categories': {'name': 'Benchmark'},
+        'routes': {'name': 'Benchmark', 'duration': '01:00'},
+    }
+    for prefix, payload in payloads.items():
+        path = f'/api/v1/{prefix}/'
+        add(f'{prefix} create', Scenario, path, 'POST', payload, 'admin', (201,))
+        add(f'{prefix} delete', lambda name, path, payload: Scenario(
+            name, method='DELETE', auth='admin', expected=(204,),
+            prepare=lambda: {'path': f"{path}{call('POST', path, payload, 'admin')['id']}/"},
+        ), path, payload)
+    for prefix in ('states', 'municipalities', 'categories', 'routes', 'places'):
+        add(f'{prefix} update', lambda name, prefix: Scenario(
+            name, detail_path(prefix), 'PATCH', {'description': DESCRIPTION}, 'admin',
+        ), prefix)
+    # El alta individual de lugares y enlaces no admite sus relaciones: se crean por bulk
+    add('places delete', lambda name: Scenario(
+        name, method='DELETE', auth='admin', expected=(204,),
+        prepare=lambda: {'path': f'/api/v1/places/{new_place()}/'},
+    ))
+    add('places bulk create', lambda name: Scenario(name, '/api/v1/places/bulk/', 'POST', lambda: [{
+        **{key: value for key, value in place().items() if key != 'id'},
+        'name': 'Benchmark', 'description': DESCRIPTION, 'latitude': '20.96', 'longitude': '-89.62',
+    }], 'admin'))
+    add('places bulk update', lambda name: Scenario(
+        name, '/api/v1/places/bulk/', 'PATCH', [{'id': place()['id'], 'description': DESCRIPTION}], 'admin',
+    ))
+    add('places bulk delete', lambda name: Scenario(
+        name, '/api/v1/places/bulk/', 'DELETE', auth='admin', prepare=lambda: {'data': [new_place()]},
+    ))
+    add('municipality-routes update', lambda name: Scenario(
+        name, detail_path('municipality-routes'), 'PATCH', {}, 'admin',
+    ))
+    add('municipality-routes delete', lambda name: Scenario(
+        name, method='DELETE', auth='admin', expected=(204,),
+        prepare=lambda: {'path': f'/api/v1/municipality-routes/{new_link()}/'},
+    ))
+    add('municipality-routes bulk create', lambda name: Scenario(
+        name, '/api/v1/municipality-routes/bulk/', 'POST', auth='admin',
+        prepare=lambda: {'data': [{'municipality': place()['municipality'], 'route': new_route()}]},
+    ))
+    add('municipality-routes bulk update', lambda name: Scenario(
+        name, '/api/v1/municipality-routes/bulk/', 'PATCH', [{'id': link(), 'municipality': place()['municipality']}],
+        'admin',
+    ))
+    add('municipality-routes bulk delete', lambda name: Scenario(
+        name, '/api/v1/municipality-routes/bulk/', 'DELETE', auth='admin', prepare=lambda: {'data': [new_link()]},
+    ))
+
+    # Favoritos y visitas del usuario
+    for prefix, key in (('favorites', 'favorite'), ('visited-places', 'visited_place')):
+        path = f'/api/v1/{prefix}/'
+
+        def created(path=path, key=key, places=cycle(range(50))):
+            # 201 si se creó, 200 con el registro existente si ya estaba
+            data = call('POST', path, {'place': place_ids()[next(places) % len(place_ids())]}, 'user')
+            return data.get(key, data)['id']
+
+        add(f'{prefix} create', lambda name, path: Scenario(
+            name, path, 'POST', auth='user', expected=(200, 201),
+            prepare=lambda places=cycle(range(50)): {'data': {'place': place_ids()[next(places) % len(place_ids())]}},
+        ), path)
+        add(f'{prefix} update', lambda name, prefix: Scenario(name, detail_path(prefix), 'PATCH', {}, 'user'), prefix)
+        add(f'{prefix} delete', lambda name, path, created: Scenario(
+            name, method='DELETE', auth='user', expected=(204,), prepare=lambda: {'path': f'{path}{created()}/'},
+        ), path, created)
+        # Alterna: crea (201) y elimina (200) en peticiones sucesivas
+        add(f'{prefix} toggle', lambda name, path: Scenario(
+            name, f'{path}toggle/', 'POST', lambda: {'place': place()['id']}, 'user', (200, 201),
+        ), path)
+    add('places toggle_visited', lambda name: Scenario(
+        name, f"/api/v1/places/{place()['id']}/toggle_visited/", 'POST', auth='user', expected=(200, 201),
+    ))
+
+    # Subida reanudable de vídeos
+    def upload_session(uploaded=False):
+        path = f"/api/v1/places/{place()['id']}/video-upload/"
+        url = urlsplit(call('POST', path, {'filename': 'benchmark.mp4', 'size': len(UPLOAD_CHUNK)}, 'admin')['url']).path
+        if uploaded:
+            status, _, _ = transport.request('PATCH', url, UPLOAD_CHUNK, tokens['admin'], {'Upload-Offset': '0'})
+            if status != 200:
+                raise CommandError(f'PATCH {url} devolvió {status} al preparar el benchmark')
+        return url
+
+    session = cache(upload_session)
+    add('places video-upload', lambda name: Scenario(
+        name, f"/api/v1/places/{place()['id']}/video-upload/", 'POST',
+        {'filename': 'benchmark.mp4', 'size': len(UPLOAD_CHUNK)}, 'admin', (201,),
+    ))
+    add('places video-upload status', lambda name: Scenario(name, session(), auth='admin'))
+    add('places video-upload chunk', Scenario, method='PATCH', data=UPLOAD_CHUNK, auth='admin',
+        headers={'Upload-Offset': '0'}, prepare=lambda: {'path': upload_session()})
+    add('places video-upload finalize', Scenario, method='POST', auth='admin',
+        prepare=lambda: {'path': f'{upload_session(uploaded=True)}finalize/'})
+    add('places video-upload cancel', Scenario, method='DELETE', auth='admin', expected=(204,),
+        prepare=lambda: {'path': upload_session()})
+
+    # Vistas asíncronas
+    for prefix in ASYNC_PREFIXES:
+        path = f'/api/v1/async/{prefix}/'
+        add(f'async {prefix} list', Scenario, path)
+        add(f'async {prefix} detail', lambda name, prefix, path: Scenario(
+            name, f'{path}{first_id(f"/api/v1/{prefix}/")}/',
+        ), prefix, path)
+    add('async places export', Scenario, '/api/v1/async/places/export/')
+    add('async catalog-changes', Scenario, '/api/v1/async/catalog-changes/?since=0')
+
+    # Autenticación
+    credentials = {'email': f'usuario1@{USER_EMAIL_DOMAIN}', 'password': USER_PASSWORD}
+    signups = count()
+
+    def signup():
+        # email y username son únicos
+        name = f'benchmark{next(signups)}-{time.time_ns()}'
+        return {
+            'email': f'{name}@{USER_EMAIL_DOMAIN}',
+            'username': name,
+            'password': USER_PASSWORD,
+            'first_name': 'Benchmark',
+            'last_name': 'Benchmark',
+        }
+
+    def new_token():
+        # Un usuario nuevo: cerrar sesión elimina su token
+        data = signup()
+        call('POST', '/api/v1/auth/signup/', data)
+        return call('POST', '/api/v1/auth/token/', {'email': data['email'], 'password': USER_PASSWORD})['token']
+
+    @cache
+    def signed_tokens_enabled():
+        status, _, _ = transport.request('POST', '/api/v1/auth/token/signed/', {})
+        return status != 404
+
+    def signed(name, path, prepare=None):
+        if not signed_tokens_enabled():
+            return None
+        return Scenario(name, path, 'POST', credentials, max_requests=PASSWORD_REQUESTS, prepare=prepare)
+
+    def refresh_token():
+        return {'data': {'refresh': call('POST', '/api/v1/auth/token/signed/', credentials)['refresh']}}
+
+    add('auth token', Scenario, '/api/v1/auth/token/', 'POST', credentials, max_requests=PASSWORD_REQUESTS)
+    add('auth login', Scenario, '/api/v1/auth/login/', 'POST', credentials, max_requests=PASSWORD_REQUESTS)
+    add('auth logout', Scenario, '/api/v1/auth/logout/', 'POST', max_requests=PASSWORD_REQUESTS,
+        prepare=lambda: {'token': new_token()})
+    add('auth user-detail', Scenario, '/api/v1/auth/user-detail/', auth='user')
+    add('auth user-detail update', Scenario, '/api/v1/auth/user-detail/', 'PATCH', {'first_name': 'Usuario'}, 'user')
+    add('auth signup', Scenario, '/api/v1/auth/signup/', 'POST', signup, expected=(201,), max_requests=PASSWORD_REQUESTS)
+    # Sin cuenta con ese correo y con tokens inválidos: el coste de la consulta sin enviar correos
+    add('auth password reset', Scenario, '/api/v1/auth/reset/', 'POST', {'email': f'sin-cuenta@{USER_EMAIL_DOMAIN}'})
+    add('auth password reset validate', Scenario, '/api/v1/auth/reset/validate_token/', 'POST',
+        {'token': 'invalido'}, expected=(404,))
+    add('auth password reset confirm', Scenario, '/api/v1/auth/reset/confirm/', 'POST',
+        {'token': 'invalido', 'password': USER_PASSWORD}, expected=(404,))
+    add('auth token signed', signed, '/api/v1/auth/token/signed/')
+    add('auth token refresh', signed, '/api/v1/auth/token/refresh/', refresh_token)
+    add('auth token revoke', signed, '/api/v1/auth/token/revoke/', refresh_token)
+    return scenarios
+
+
+def run_scenario(transport, scenario, tokens, total, concurrency):
+    token = tokens[scenario.auth] if scenario.auth else None
+    total = min(total, scenario.max_requests or total)
+
+    def request():
+        values = {'path': scenario.path, 'data': scenario.data, 'token': token}
+        if scenario.prepare:
+            values.update(scenario.prepare())
+        data = values['data']() if callable(values['data']) else values['data']
+        start = time.perf_counter()
+        status, _, timing = transport.request(scenario.method, values['path'], data, values['token'], scenario.headers)
+        elapsed = time.perf_counter() - start
+        match = QUERIES_RE.search(timing)
+        return elapsed, status, int(match.group(1)) if match else None
+
+    # Calentamiento: la primera petición llena cachés e índices
+    request()
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(lambda _: request(), range(total)))
+    else:
+        samples = [request() for _ in range(total)]
+    elapsed = time.perf_counter() - start
+    if scenario.prepare:
+        # Sin contar la preparación de cada petición
+        elapsed = sum(sample[0] for sample in samples) / concurrency
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    statuses = sorted({sample[1] for sample in samples})
+    return Result(
+        rps=round(total / elapsed, 1),
+        p50=round(percentile(latencies, 0.5), 2),
+        p95=round(percentile(latencies, 0.95), 2),
+        p99=round(percentile(latencies, 0.99), 2),
+        queries=round(statistics.median(queries)) if queries else None,
+        errors=sum(1 for sample in samples if sample[1] not in scenario.expected),
+        statuses=statuses,
+    )
+
+
+def compare(results, baseline, tolerance):
+    """
+    Devuelve la lista de regresiones respecto a la línea base.
+    """
+    regressions = []
+    for name, result in results.items():
+        if result.errors:
+            regressions.append(f'{name}: {result.errors} respuestas inesperadas ({result.statuses})')
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base['queries'] is not None and result.queries is not None and result.queries > base['queries']:
+            regressions.append(f"{name}: {base['queries']} -> {result.queries} consultas")
+        # Un pico aislado mueve el p95 pero no la mediana: solo cuenta si empeoran ambos
+        if all(
+            getattr(result, key) > base[key] * (1 + tolerance) and getattr(result, key) - base[key] > MIN_REGRESSION_MS
+            for key in ('p50', 'p95')
+        ):
+            regressions.append(f"{name}: p50 {base['p50']} -> {result.p50} ms, p95 {base['p95']} -> {result.p95} ms")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Mide rendimiento y consultas de cada endpoint y lo compara con una línea base'
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.add_argument('--requests', type=int, default=50, help='Peticiones por endpoint')
+        parser.add_argument('--server', help='URL de un servidor en marcha (por defecto, cliente de pruebas)')
+        parser.add_argument('--concurrency', type=int, default=1, help='Peticiones simultáneas (solo con --server)')
+        parser.add_argument('--only', help='Solo los endpoints cuyo nombre contenga este texto')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Archivo de la línea base')
+        parser.add_argument('--save-baseline', action='store_true', help='Guarda los resultados como línea base')
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help='Mantiene el caché de respuestas (por defecto se desactiva para medir las consultas)',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Aumento permitido respecto a la línea base; es regresión si lo superan a la vez p50 y p95 (0.5 = 50%%)',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests y --concurrency deben ser mayores que 0')
+        scale = scale_from_options(options)
+        if scale.users < 1:
+            raise CommandError('Se necesita al menos un usuario (--users) para los endpoints autenticados')
+        meta = {'requests': options['requests'], 'concurrency': options['concurrency'], 'cache': options['with_cache']}
+
+        if options['server']:
+            transport = HTTPTransport(options['server'])
+            tokens = {}
+            for key, email in (('user', f'usuario1@{USER_EMAIL_DOMAIN}'), ('admin', ADMIN_EMAIL)):
+                status, content, _ = transport.request('POST', '/api/v1/auth/token/', {
+                    'email': email, 'password': USER_PASSWORD,
+                })
+                if status != 200:
+                    raise CommandError(f'No se pudo obtener el token de {email}; ¿se ejecutó seed_data en el servidor?')
+                tokens[key] = json.loads(content)['token']
+            results = self.run(transport, tokens, options)
+            meta['server'] = True
+        else:
+            if options['concurrency'] > 1:
+                raise CommandError('--concurrency solo se admite con --server')
+            results = self.run_in_process(scale, options)
+            meta['scale'] = asdict(scale)
+            meta['seed'] = options['seed']
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                'meta': meta,
+                'results': {name: {key: value for key, value in asdict(result).items() if key != 'statuses'}
+                            for name, result in results.items()},
+            }, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Línea base guardada en {baseline_path}'))
+            return
+
+        baseline = {}
+        if baseline_path.exists():
+            stored = json.loads(baseline_path.read_text())
+            if stored['meta'] != meta:
+                raise CommandError(f'La línea base se generó con otros parámetros: {stored["meta"]}')
+            baseline = stored['results']
+        regressions = compare(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Regresiones respecto a la línea base:\n  ' + '\n  '.join(regressions))
+        if baseline:
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la línea base'))
+
+    def run_in_process(self, scale, options):
+        rates = {scope: '' for scope in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']}
+        caches = settings.CACHES
+        if not options['with_cache']:
+            caches = {**caches, settings.API_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            CACHES=caches,
+            MEDIA_ROOT=media_root,
+            RESUMABLE_UPLOAD_DIR=os.path.join(media_root, 'uploads'),
+            TASKS_MODE='sync',
+            SERVER_TIMING=True,
+            SIGNED_TOKENS=True,
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates},
+            # django_rest_passwordreset limita las solicitudes a 3 al día; vacío usa los límites de la API
+            DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES=(),
+        ):
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            try:
+                seed(scale, options['seed'])
+                User = get_user_model()
+                tokens = {
+                    'user': Token.objects.create(user=User.objects.get(email=f'usuario1@{USER_EMAIL_DOMAIN}')).key,
+                    'admin': Token.objects.create(user=User.objects.get(email=ADMIN_EMAIL)).key,
+                }
+                return self.run(ClientTransport(), tokens, options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                get_store().clear()
+
+    def run(self, transport, tokens, options):
+        scenarios = build_scenarios(transport, tokens, options['only'])
+        results = {}
+        self.stdout.write(f"{'endpoint':<34} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'consultas':>9} {'errores':>7}")
+        for scenario in scenarios:
+            result = run_scenario(transport, scenario, tokens, options['requests'], options['concurrency'])
+            results[scenario.name] = result
+            queries = '-' if result.queries is None else result.queries
+            self.stdout.write(
+                f'{scenario.name:<34} {result.rps:>9.1f} {result.p50:>8.2f} {result.p95:>8.2f} '
+                f'{result.p99:>8.2f} {queries:>9} {result.errors:>7}'
+            )
+        return results
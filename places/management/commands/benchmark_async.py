@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, override_settings
+
+DEFAULT_PATHS = (
+    ('/api/v1/places/', '/api/v1/async/places/'),
+    ('/api/v1/routes/', '/api/v1/async/routes/'),
+    ('/api/v1/categories/', '/api/v1/async/categories/'),
+)
+
+
+async def run_load(path, total, concurrency):
+    """
+    Lanza `total` peticiones GET a `path` con `concurrency` en vuelo a la
+    vez y devuelve (segundos totales, latencias ordenadas, errores).
+    """
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def request():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    # Las vistas síncronas se ejecutaron en el hilo de sync_to_async
+    await sync_to_async(connections.close_all)()
+    return elapsed, sorted(latencies), errors
+
+
+def percentile(values, fraction):
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Compara peticiones por segundo y latencia p99 de las vistas síncronas y asíncronas bajo la misma concurrencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por ruta')
+        parser.add_argument('--concurrency', type=int, default=20, help='Peticiones simultáneas')
+        parser.add_argument(
+            '--path', action='append', dest='paths', metavar='SYNC,ASYNC',
+            help='Par de rutas a comparar (se puede repetir)',
+        )
+        parser.add_argument(
+            '--with-cache', action='store_true',
+            help='Mantiene el caché de respuestas de las vistas síncronas',
+        )
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+        if total < 1 or concurrency < 1:
+            raise CommandError('--requests y --concurrency deben ser mayores que 0')
+
+        pairs = DEFAULT_PATHS
+        if options['paths']:
+            pairs = [tuple(value.split(',')) for value in options['paths']]
+            if any(len(pair) != 2 for pair in pairs):
+                raise CommandError('--path debe tener la forma ruta_sincrona,ruta_asincrona')
+
+        caches = settings.CACHES
+        if not options['with_cache']:
+            # Sin caché ambas vistas hacen el mismo trabajo contra la base de datos
+            caches = {**caches, settings.API_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        self.stdout.write(f"{'ruta':<40} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errores':>8}")
+        with override_settings(CACHES=caches):
+            for pair in pairs:
+                for path in pair:
+                    elapsed, latencies, errors = asyncio.run(run_load(path, total, concurrency))
+                    self.stdout.write(
+                        f'{path:<40} {total / elapsed:>10.1f} '
+                        f'{percentile(latencies, 0.5) * 1000:>10.1f} '
+                        f'{percentile(latencies, 0.99) * 1000:>10.1f} {errors:>8}'
+                    )
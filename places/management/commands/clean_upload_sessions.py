@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from places.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Elimina las subidas reanudables sin actividad y sus archivos temporales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Horas sin recibir datos')
+
+    def handle(self, *args, **options):
+        limit = timezone.now() - timedelta(hours=options['hours'])
+        removed = 0
+        # delete() de cada sesión para que se borre su archivo temporal
+        for session in UploadSession.objects.filter(updated_at__lt=limit).iterator():
+            session.delete()
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f'{removed} subidas eliminadas'))
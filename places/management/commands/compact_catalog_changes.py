@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from places import offline
+
+
+class Command(BaseCommand):
+    help = 'Elimina los cambios del catálogo y los paquetes sin conexión antiguos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Días que se conservan los cambios')
+        parser.add_argument('--bundle-hours', type=int, default=24, help='Horas que se conservan los paquetes anteriores')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        changes = offline.compact_changes(now - timedelta(days=options['days']))
+        bundles = offline.clean_bundles(now - timedelta(hours=options['bundle_hours']))
+        self.stdout.write(self.style.SUCCESS(f'{changes} cambios y {bundles} paquetes eliminados'))
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from places.media import needs_processing, process_place_media
+from places.models import Place
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas y portadas que falten (o todas con --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenera también las que ya existen')
+
+    def handle(self, *args, **options):
+        places = Place.objects.filter(Q(image__gt='') | Q(video__gt='')).only('id', 'image', 'video', 'media_derivatives')
+        processed = 0
+        for place in places.iterator():
+            if options['all'] or needs_processing(place):
+                process_place_media(place.pk)
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Miniaturas generadas para {processed} lugares'))
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from places.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de favoritos y visitas de todos los lugares'
+
+    def handle(self, *args, **options):
+        updated = rebuild_popularity()
+        self.stdout.write(self.style.SUCCESS(f'Contadores recalculados para {updated} lugares'))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from places.seed import ADMIN_EMAIL, USER_EMAIL_DOMAIN, USER_PASSWORD, Scale, clear, seed
+
+HELP = {
+    'states': 'Estados',
+    'municipalities': 'Municipios por estado',
+    'routes': 'Rutas por estado',
+    'places': 'Lugares por municipio',
+    'users': 'Usuarios',
+    'favorites': 'Favoritos por usuario',
+    'visits': 'Visitas por usuario',
+}
+
+
+def add_scale_arguments(parser):
+    for field in fields(Scale):
+        parser.add_argument(f'--{field.name}', type=int, default=field.default, help=HELP[field.name])
+    parser.add_argument('--seed', type=int, default=0, help='Semilla del generador')
+
+
+def scale_from_options(options):
+    scale = Scale(**{field.name: options[field.name] for field in fields(Scale)})
+    if any(value < 0 for value in vars(scale).values()):
+        raise CommandError('Las cantidades no pueden ser negativas')
+    return scale
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos reproducibles: estados, municipios, rutas, lugares y usuarios con favoritos y visitas'
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.add_argument('--clear', action='store_true', help='Elimina antes el catálogo y los usuarios generados')
+
+    def handle(self, *args, **options):
+        scale = scale_from_options(options)
+        if options['clear']:
+            clear()
+        try:
+            counts = seed(scale, options['seed'])
+        except IntegrityError:
+            raise CommandError('Ya existen datos generados con esta semilla; usa --clear u otra --seed')
+        self.stdout.write(self.style.SUCCESS(', '.join(f'{count} {name}' for name, count in counts.items())))
+        if scale.users:
+            self.stdout.write(f'Usuarios usuario1..usuario{scale.users}@{USER_EMAIL_DOMAIN}, contraseña {USER_PASSWORD}')
+        self.stdout.write(f'Administrador {ADMIN_EMAIL}, contraseña {USER_PASSWORD}')
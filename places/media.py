@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Miniaturas de las imágenes de los lugares y portadas de sus vídeos.
+
+Al guardar un lugar con una imagen o un vídeo nuevos se programa, después
+del commit, una tarea en segundo plano (`binmap_api.tasks`) que genera
+versiones reducidas en WebP y JPEG para cada ancho de IMAGE_WIDTHS y, si
+hay ffmpeg, un fotograma del vídeo como portada con los mismos tamaños.
+
+El resultado se guarda en `Place.media_derivatives`:
+
+    {
+        "image": {"source": "places/images/a.jpg", "sizes": [
+            {"width": 320, "height": 213, "webp": "...", "jpeg": "..."}, ...
+        ]},
+        "poster": {"source": "places/videos/b.mp4", "sizes": [...]}
+    }
+
+`source` es el archivo del que salieron las miniaturas; si la imagen o el
+vídeo cambian, las miniaturas anteriores dejan de mostrarse hasta que la
+tarea genera las nuevas.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from binmap_api.cache import bump_version
+from binmap_api.storage import media_storage
+from binmap_api.tasks import enqueue_on_commit
+from .models import Place
+
+IMAGE_WIDTHS = (1280, 640, 320)
+DERIVATIVES_DIR = 'places/derivatives'
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+POSTER_OFFSET_SECONDS = 1
+FFMPEG_TIMEOUT = 60
+
+
+def _open_image(source):
+    image = Image.open(source)
+    # En JPEG se decodifica directamente a una escala reducida
+    image.draft('RGB', (IMAGE_WIDTHS[0], IMAGE_WIDTHS[0]))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def _encode(image, format, options):
+    if format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def render_sizes(source, place_id, stem):
+    """
+    Genera las miniaturas de la imagen `source` (ruta o archivo abierto) de
+    mayor a menor, cada una a partir de la anterior, y devuelve sus tamaños
+    y nombres en el almacenamiento.
+    """
+    image = _open_image(source)
+    sizes = []
+    for width in IMAGE_WIDTHS:
+        if width < image.width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        elif sizes:
+            # No se amplían imágenes pequeñas
+            continue
+        entry = {'width': image.width, 'height': image.height}
+        for extension, format, options in FORMATS:
+            name = f'{DERIVATIVES_DIR}/{place_id}/{stem}-{image.width}w.{extension}'
+            entry[extension] = media_storage().save(name, ContentFile(_encode(image, format, options)))
+        sizes.append(entry)
+    return sizes
+
+
+def _stem(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def render_image(place_id, name):
+    with media_storage().open(name, 'rb') as source:
+        return render_sizes(source, place_id, _stem(name))
+
+
+def render_poster(place_id, name):
+    """
+    Extrae un fotograma del vídeo con ffmpeg y genera sus miniaturas.
+    Devuelve None si ffmpeg no está disponible o no puede leer el vídeo.
+    """
+    ffmpeg = shutil.which(settings.FFMPEG_BINARY)
+    if ffmpeg is None:
+        return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            video_path = media_storage().path(name)
+        except NotImplementedError:
+            # Almacenamiento remoto: ffmpeg necesita un archivo local
+            video_path = os.path.join(directory, 'video')
+            with media_storage().open(name, 'rb') as source, open(video_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+
+        frame_path = os.path.join(directory, 'poster.png')
+        # Si el vídeo dura menos que POSTER_OFFSET_SECONDS se usa el primer fotograma
+        for offset in (POSTER_OFFSET_SECONDS, 0):
+            command = [
+                ffmpeg, '-v', 'error', '-y',
+                '-ss', str(offset), '-i', video_path,
+                '-frames:v', '1', frame_path,
+            ]
+            try:
+                subprocess.run(command, check=True, timeout=FFMPEG_TIMEOUT, capture_output=True)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                return None
+            if os.path.exists(frame_path):
+                return render_sizes(frame_path, place_id, _stem(name) + '-poster')
+        return None
+
+
+def _files(media):
+    for entry in media.values():
+        for size in entry.get('sizes', []):
+            for extension, _, _ in FORMATS:
+                yield size[extension]
+
+
+def process_place_media(place_id):
+    """
+    Genera las miniaturas de la imagen y la portada del vídeo de un lugar.
+    """
+    row = Place.objects.filter(pk=place_id).values('image', 'video', 'media_derivatives').first()
+    if row is None:
+        return
+    image, video, previous = row['image'] or None, row['video'] or None, row['media_derivatives'] or {}
+
+    media = {}
+    if image:
+        media['image'] = {'source': image, 'sizes': render_image(place_id, image)}
+    if video:
+        # Sin ffmpeg la portada queda vacía hasta que cambie el vídeo
+        media['poster'] = {'source': video, 'sizes': render_poster(place_id, video) or []}
+
+    # Si entretanto cambió la imagen o el vídeo, el nuevo guardado ya
+    # programó su propia tarea y estas miniaturas se descartan
+    updated = Place.objects.filter(pk=place_id, image=row['image'], video=row['video']).update(media_derivatives=media)
+    if updated:
+        stale = set(_files(previous)) - set(_files(media))
+        bump_version(Place)
+    else:
+        # Las miniaturas con el mismo contenido comparten nombre (ver
+        # binmap_api.storage): solo se borran las que la fila no usa
+        current = Place.objects.filter(pk=place_id).values_list('media_derivatives', flat=True).first() or {}
+        stale = set(_files(media)) - set(_files(current))
+    for name in stale:
+        media_storage().delete(name)
+
+
+def needs_processing(place):
+    media = place.media_derivatives or {}
+    return (
+        (place.image.name or None) != media.get('image', {}).get('source')
+        or (place.video.name or None) != media.get('poster', {}).get('source')
+    )
+
+
+def schedule_place_media(sender, instance, **kwargs):
+    if needs_processing(instance):
+        enqueue_on_commit(process_place_media, instance.pk, using=kwargs.get('using'))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('places', '0001_initial'),
+        ('routes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='route',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='routes.route'),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='place',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='places.place'),
+        ),
+        migrations.AddField(
+            model_name='municipality',
+            name='state',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='places.state'),
+        ),
+        migrations.AddField(
+            model_name='visitedplace',
+            name='place',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='places.place'),
+        ),
+        migrations.AddField(
+            model_name='visitedplace',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visited_places', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['-favorites_count', '-visits_count', 'id'], name='place_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['municipality', 'name'], name='place_municipality_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['category', 'name'], name='place_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['route', 'name'], name='place_route_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'place'], name='favorite_user_place_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='favorite',
+            unique_together={('place', 'user')},
+        ),
+        migrations.AddIndex(
+            model_name='visitedplace',
+            index=models.Index(fields=['user', 'place'], name='visited_user_place_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='visitedplace',
+            unique_together={('place', 'user')},
+        ),
+    ]
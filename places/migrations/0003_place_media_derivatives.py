@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='media_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
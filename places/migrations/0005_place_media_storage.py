@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+import binmap_api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0004_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=binmap_api.storage.media_storage, upload_to='places/images'),
+        ),
+        migrations.AlterField(
+            model_name='place',
+            name='video',
+            field=models.FileField(blank=True, null=True, storage=binmap_api.storage.media_storage, upload_to='places/videos'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0005_place_media_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCompaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Catalog Compaction',
+                'verbose_name_plural': 'Catalog Compactions',
+            },
+        ),
+        migrations.AddField(
+            model_name='catalogchange',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 import uuid
 from django.utils import timezone
+from binmap_api.storage import media_storage
+from . import geo
 
 
 class State(models.Model):
@@ -39,17 +41,53 @@ class Place(models.Model):
     description = models.TextField()
     latitude = models.DecimalField(max_digits=10, decimal_places=8)
     longitude = models.DecimalField(max_digits=11, decimal_places=8)
-    image = models.ImageField(upload_to='places/images', null=True, blank=True)
-    video = models.FileField(upload_to='places/videos', null=True, blank=True)
+    geohash = models.CharField(max_length=geo.GEOHASH_PRECISION, db_index=True, editable=False)
+    image = models.ImageField(upload_to='places/images', storage=media_storage, null=True, blank=True)
+    video = models.FileField(upload_to='places/videos', storage=media_storage, null=True, blank=True)
     is_visited = models.BooleanField(default=False)
     visited_date = models.DateField(null=True, blank=True)
     municipality = models.ForeignKey(Municipality, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     route = models.ForeignKey('routes.Route', on_delete=models.CASCADE)
+    # Contadores desnormalizados; los mantienen las vistas de favoritos y
+    # visitas y el borrado de usuarios (ver places/popularity.py), y
+    # `manage.py rebuild_popularity` los recalcula
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
+    visits_count = models.PositiveIntegerField(default=0, editable=False)
+    # Miniaturas y portada generadas en segundo plano (ver places/media.py)
+    media_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Campos que se escriben fuera de save() y que save() no debe pisar
+    DERIVED_FIELDS = ('favorites_count', 'visits_count', 'media_derivatives')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-favorites_count', '-visits_count', 'id'], name='place_popularity_idx'),
+            models.Index(fields=['municipality', 'name'], name='place_municipality_name_idx'),
+            models.Index(fields=['category', 'name'], name='place_category_name_idx'),
+            models.Index(fields=['route', 'name'], name='place_route_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def update_geohash(self):
+        self.geohash = geo.encode(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        # Mantener el geohash sincronizado con las coordenadas
+        self.update_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # No sobrescribir los contadores ni las miniaturas con valores leídos antes
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        elif update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
 
 class Favorite(models.Model):
     place = models.ForeignKey(Place, on_delete=models.CASCADE)
@@ -57,6 +95,9 @@ class Favorite(models.Model):
 
     class Meta:
         unique_together = ('place', 'user')
+        indexes = [
+            models.Index(fields=['user', 'place'], name='favorite_user_place_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.place.name}"
@@ -71,8 +112,74 @@ class VisitedPlace(models.Model):
 
     class Meta:
         unique_together = ('place', 'user')
+        indexes = [
+            models.Index(fields=['user', 'place'], name='visited_user_place_idx'),
+        ]
         verbose_name = 'Visited Place'
         verbose_name_plural = 'Visited Places'
 
     def __str__(self):
         return f"{self.user.username} visitó {self.place.name} el {self.visited_date}"
+
+
+class CatalogChange(models.Model):
+    """
+    Registro de altas, cambios y bajas del catálogo. El id del último
+    cambio es la versión del catálogo usada por la sincronización sin conexión.
+    """
+    model = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    deleted = models.BooleanField(default=False)
+    # Los ids se asignan al insertar y no al hacer commit: la fecha permite
+    # volver a leer los cambios que se hicieron visibles tarde
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Catalog Change'
+        verbose_name_plural = 'Catalog Changes'
+
+    def __str__(self):
+        action = 'baja' if self.deleted else 'cambio'
+        return f"{self.id}: {action} de {self.model} {self.object_id}"
+
+
+class CatalogCompaction(models.Model):
+    """
+    Versión hasta la que se eliminó el registro de cambios del catálogo:
+    desde versiones anteriores ya no se pueden generar paquetes delta.
+    """
+    version = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Catalog Compaction'
+        verbose_name_plural = 'Catalog Compactions'
+
+    def __str__(self):
+        return f"Compactado hasta {self.version}"
+
+
+class UploadSession(models.Model):
+    """
+    Subida reanudable del vídeo de un lugar. Los bytes recibidos se guardan
+    en un archivo temporal hasta que se finaliza (ver places/uploads.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # SHA-256 en hexadecimal del archivo completo, si el cliente lo envía
+    checksum = models.CharField(max_length=64, blank=True)
+    # Hay una escritura en curso desde este momento
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Paquetes del catálogo para uso sin conexión.
+
+Un paquete es una instantánea comprimida de estados, municipios,
+categorías, rutas y lugares (o solo de lo que cambió desde una versión
+anterior) en un formato binario por columnas:
+
+    b'BMB\\x01'
+    varint versión, varint versión base (0 = completo)
+    varint número de cadenas, y cada cadena como varint longitud + UTF-8
+    varint número de ids, y cada id como 16 bytes (UUID)
+    por cada tabla de TABLES, en orden:
+        varint filas
+        columna id (varint índice de id)
+        una columna por campo:
+            str     varint índice de cadena (0 = vacío)
+            ref     varint índice de id
+            coord   int32 little-endian en diezmillonésimas de grado
+            seconds varint
+        varint bajas, y cada baja como varint índice de id
+
+El resultado se comprime con gzip y se genera una sola vez por versión
+en el almacenamiento de medios, desde donde se sirve como archivo estático.
+
+La versión es el id del último `CatalogChange`. Como los ids se asignan al
+insertar y no al hacer commit, un delta incluye además los cambios
+registrados hasta CATALOG_CHANGES_RESCAN_SECONDS antes de su versión base
+(volver a enviar un registro no cambia nada en el cliente). El registro y
+los paquetes viejos se eliminan con `compact_catalog_changes`; desde una
+versión anterior a la compactación solo se sirve el paquete completo.
+"""
+import gzip
+import re
+import sys
+import uuid
+from array import array
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Max, Q
+from django.db.models.signals import post_delete, post_save
+
+from binmap_api.storage import media_storage
+from routes.models import Route
+from .models import State, Municipality, Category, Place, CatalogChange, CatalogCompaction
+
+MAGIC = b'BMB\x01'
+FORMAT = 'binmap-bundle/1'
+COORD_SCALE = 10 ** 7
+BUNDLE_DIR = 'bundles'
+
+TABLES = (
+    ('state', State, (('name', 'str'), ('description', 'str'))),
+    ('municipality', Municipality, (('name', 'str'), ('description', 'str'), ('state_id', 'ref'))),
+    ('category', Category, (('name', 'str'), ('description', 'str'))),
+    ('route', Route, (('name', 'str'), ('description', 'str'), ('duration', 'seconds'))),
+    ('place', Place, (
+        ('name', 'str'),
+        ('description', 'str'),
+        ('latitude', 'coord'),
+        ('longitude', 'coord'),
+        ('image', 'str'),
+        ('video', 'str'),
+        ('municipality_id', 'ref'),
+        ('category_id', 'ref'),
+        ('route_id', 'ref'),
+    )),
+)
+TABLE_NAMES = {model: name for name, model, _ in TABLES}
+
+
+# Registro de cambios
+
+def _record_change(sender, instance, **kwargs):
+    CatalogChange.objects.create(
+        model=TABLE_NAMES[sender],
+        object_id=instance.pk,
+        deleted=kwargs['signal'] is post_delete,
+    )
+
+
+def record_changes(model, pks, deleted=False):
+    """
+    Registra cambios hechos sin pasar por `save()` o `delete()`, como las
+    escrituras masivas.
+    """
+    CatalogChange.objects.bulk_create(
+        CatalogChange(model=TABLE_NAMES[model], object_id=pk, deleted=deleted) for pk in pks
+    )
+
+
+def track_catalog_changes():
+    for model in TABLE_NAMES:
+        uid = f'catalog-change-{model._meta.label_lower}'
+        post_save.connect(_record_change, sender=model, dispatch_uid=uid)
+        post_delete.connect(_record_change, sender=model, dispatch_uid=uid)
+
+
+def current_version():
+    return CatalogChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+async def acurrent_version():
+    return (await CatalogChange.objects.aaggregate(version=Max('id')))['version'] or 0
+
+
+def compacted_version():
+    """
+    Versión más antigua desde la que aún se puede generar un delta.
+    """
+    return CatalogCompaction.objects.aggregate(version=Max('version'))['version'] or 0
+
+
+def rescan_start(created_at):
+    return created_at - timedelta(seconds=settings.CATALOG_CHANGES_RESCAN_SECONDS)
+
+
+def changes_after(version):
+    """
+    Cambios posteriores a `version` más los de la ventana anterior que
+    pudieron hacerse visibles después (ver CATALOG_CHANGES_RESCAN_SECONDS).
+    """
+    condition = Q(id__gt=version)
+    base = CatalogChange.objects.filter(id__lte=version).order_by('-id').values_list('created_at', flat=True).first()
+    if base is not None:
+        condition |= Q(created_at__gte=rescan_start(base))
+    return CatalogChange.objects.filter(condition)
+
+
+# Codificación
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+class _Table:
+    def __init__(self):
+        self.items = ['']
+        self.index = {'': 0}
+
+    def add(self, item):
+        position = self.index.get(item)
+        if position is None:
+            position = self.index[item] = len(self.items)
+            self.items.append(item)
+        return position
+
+
+def _storage_url(name):
+    return media_storage().url(name) if name else ''
+
+
+def encode_bundle(version, since, tables):
+    """
+    Codifica `tables`, un diccionario nombre -> (filas, bajas) donde cada
+    fila es una tupla (id, *valores) en el orden de columnas de TABLES.
+    """
+    strings = _Table()
+    ids = _Table()
+    body = bytearray()
+
+    for name, _, columns in TABLES:
+        rows, deleted = tables.get(name, ([], []))
+        _write_varint(body, len(rows))
+        for row in rows:
+            _write_varint(body, ids.add(row[0]))
+        for position, (field, kind) in enumerate(columns, 1):
+            if kind == 'coord':
+                values = array('i', (int((row[position] * COORD_SCALE).to_integral_value()) for row in rows))
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                body += values.tobytes()
+                continue
+            for row in rows:
+                value = row[position]
+                if kind == 'str':
+                    value = strings.add(_storage_url(value) if field in ('image', 'video') else (value or ''))
+                elif kind == 'ref':
+                    value = ids.add(value)
+                elif kind == 'seconds':
+                    value = value.hour * 3600 + value.minute * 60 + value.second
+                _write_varint(body, value)
+        _write_varint(body, len(deleted))
+        for pk in deleted:
+            _write_varint(body, ids.add(pk))
+
+    out = bytearray(MAGIC)
+    _write_varint(out, version)
+    _write_varint(out, since)
+    _write_varint(out, len(strings.items))
+    for item in strings.items:
+        encoded = item.encode('utf-8')
+        _write_varint(out, len(encoded))
+        out += encoded
+    _write_varint(out, len(ids.items) - 1)
+    for pk in ids.items[1:]:
+        out += pk.bytes
+    out += body
+    return gzip.compress(bytes(out), compresslevel=9, mtime=0)
+
+
+def decode_bundle(payload):
+    """
+    Decodifica un paquete a diccionarios; lo usan las pruebas y sirve de
+    referencia para los clientes.
+    """
+    data = gzip.decompress(payload)
+    if data[:4] != MAGIC:
+        raise ValueError('Formato de paquete desconocido')
+    offset = 4
+    version, offset = _read_varint(data, offset)
+    since, offset = _read_varint(data, offset)
+
+    count, offset = _read_varint(data, offset)
+    strings = []
+    for _ in range(count):
+        length, offset = _read_varint(data, offset)
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    count, offset = _read_varint(data, offset)
+    ids = [None]
+    for _ in range(count):
+        ids.append(uuid.UUID(bytes=bytes(data[offset:offset + 16])))
+        offset += 16
+
+    tables = {}
+    for name, _, columns in TABLES:
+        count, offset = _read_varint(data, offset)
+        rows = [{} for _ in range(count)]
+        for row in rows:
+            position, offset = _read_varint(data, offset)
+            row['id'] = ids[position]
+        for field, kind in columns:
+            if kind == 'coord':
+                values = array('i')
+                values.frombytes(bytes(data[offset:offset + 4 * count]))
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                offset += 4 * count
+                for row, value in zip(rows, values):
+                    row[field] = value / COORD_SCALE
+                continue
+            for row in rows:
+                value, offset = _read_varint(data, offset)
+                if kind == 'str':
+                    value = strings[value]
+                elif kind == 'ref':
+                    value = ids[value]
+                elif kind == 'seconds':
+                    value = time(value // 3600, value // 60 % 60, value % 60)
+                row[field] = value
+        count, offset = _read_varint(data, offset)
+        deleted = []
+        for _ in range(count):
+            position, offset = _read_varint(data, offset)
+            deleted.append(ids[position])
+        tables[name] = {'rows': rows, 'deleted': deleted}
+
+    return {'version': version, 'since': since, 'tables': tables}
+
+
+# Generación
+
+def _collect(since, version):
+    """
+    Filas por tabla: todas si `since` es 0, o solo las que cambiaron entre
+    `since` y `version` junto con las bajas.
+    """
+    tables = {}
+    if since:
+        changes = {name: {} for name, _, _ in TABLES}
+        entries = (
+            changes_after(since)
+            .filter(id__lte=version)
+            .order_by('id')
+            .values_list('model', 'object_id', 'deleted')
+            .iterator()
+        )
+        for name, object_id, deleted in entries:
+            changes[name][object_id] = deleted
+
+    for name, model, columns in TABLES:
+        queryset = model.objects.order_by('pk')
+        deleted = []
+        if since:
+            changed = [pk for pk, gone in changes[name].items() if not gone]
+            deleted = sorted(pk for pk, gone in changes[name].items() if gone)
+            queryset = queryset.filter(pk__in=changed)
+        fields = [field for field, _ in columns]
+        rows = list(queryset.values_list('pk', *fields).iterator())
+        tables[name] = (rows, deleted)
+    return tables
+
+
+def bundle_name(version, since=0):
+    if since:
+        return f'{BUNDLE_DIR}/delta-{since}-{version}.bin.gz'
+    return f'{BUNDLE_DIR}/full-{version}.bin.gz'
+
+
+def get_bundle(version, since=0):
+    """
+    Devuelve el nombre en el almacenamiento del paquete de `version`,
+    generándolo solo si aún no existe.
+    """
+    name = bundle_name(version, since)
+    if not default_storage.exists(name):
+        payload = encode_bundle(version, since, _collect(since, version))
+        name = default_storage.save(name, ContentFile(payload))
+    return name
+
+
+# Compactación
+
+BUNDLE_NAME = re.compile(r'^(?:full|delta-\d+)-(\d+)\.bin\.gz$')
+
+
+def compact_changes(before):
+    """
+    Elimina los cambios registrados antes de `before` salvo el último, que
+    conserva la versión actual, y anota hasta qué versión se compactó.
+    Devuelve el número de cambios eliminados.
+    """
+    version = (
+        CatalogChange.objects
+        .filter(created_at__lt=before)
+        .exclude(id=current_version())
+        .aggregate(version=Max('id'))['version']
+    )
+    if version is None:
+        return 0
+    removed, _ = CatalogChange.objects.filter(id__lte=version).delete()
+    CatalogCompaction.objects.create(version=version)
+    return removed
+
+
+def clean_bundles(before):
+    """
+    Elimina los paquetes generados antes de `before` que no son de la
+    versión actual. Devuelve el número de archivos eliminados.
+    """
+    try:
+        _, files = default_storage.listdir(BUNDLE_DIR)
+    except FileNotFoundError:
+        return 0
+    version = current_version()
+    removed = 0
+    for filename in files:
+        match = BUNDLE_NAME.match(filename)
+        if match is None or int(match.group(1)) == version:
+            continue
+        name = f'{BUNDLE_DIR}/{filename}'
+        if default_storage.get_modified_time(name) < before:
+            default_storage.delete(name)
+            removed += 1
+    return removed
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Contadores de popularidad de los lugares.
+
+`Place.favorites_count` y `Place.visits_count` se ajustan con un UPDATE
+atómico en la misma transacción que crea o elimina el favorito o la visita.
+Al borrar un usuario, sus favoritos y visitas se eliminan en cascada sin
+pasar por las vistas, así que se recalculan los lugares afectados. Los
+borrados directos de `Favorite` o `VisitedPlace` (admin, `QuerySet.delete()`)
+no ajustan los contadores; `manage.py rebuild_popularity` los corrige.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from binmap_api.cache import bump_version
+
+from .models import Place, Favorite, VisitedPlace
+
+POPULAR_ORDERING = ['-favorites_count', '-visits_count', 'id']
+
+
+def adjust_popularity(place_id, favorites=0, visits=0):
+    updates = {}
+    if favorites:
+        updates['favorites_count'] = Greatest(F('favorites_count') + favorites, Value(0))
+    if visits:
+        updates['visits_count'] = Greatest(F('visits_count') + visits, Value(0))
+    if updates:
+        Place.objects.filter(pk=place_id).update(**updates)
+
+
+def _count_subquery(model):
+    counts = (
+        model.objects
+        .filter(place=OuterRef('pk'))
+        .order_by()
+        .values('place')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def rebuild_popularity(place_ids=None):
+    """
+    Recalcula los contadores con una sola sentencia UPDATE, de todos los
+    lugares o solo de `place_ids`, e invalida la caché de `Place`.
+    """
+    places = Place.objects.all() if place_ids is None else Place.objects.filter(pk__in=place_ids)
+    updated = places.update(
+        favorites_count=_count_subquery(Favorite),
+        visits_count=_count_subquery(VisitedPlace),
+    )
+    bump_version(Place)
+    return updated
+
+
+def remember_user_places(sender, instance, **kwargs):
+    """
+    `pre_delete` del usuario: guarda los lugares cuyos contadores dependen
+    de él antes de que la cascada borre sus favoritos y visitas.
+    """
+    instance._popularity_places = {
+        *Favorite.objects.filter(user=instance).values_list('place_id', flat=True),
+        *VisitedPlace.objects.filter(user=instance).values_list('place_id', flat=True),
+    }
+
+
+def recount_user_places(sender, instance, **kwargs):
+    """
+    `post_delete` del usuario: recalcula los lugares guardados.
+    """
+    place_ids = getattr(instance, '_popularity_places', None)
+    if place_ids:
+        rebuild_popularity(place_ids)
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de búsqueda de lugares.
+
+Índice invertido en memoria sobre el nombre del lugar y los nombres de su
+categoría, municipio, estado y ruta. Los textos se normalizan sin acentos
+ni mayúsculas ("Teotihuacán" -> "teotihuacan"), la última palabra de la
+consulta se busca por prefijo para autocompletar y los resultados se
+ordenan por relevancia (peso del campo, ajustado por su longitud, x rareza
+del término).
+
+Cada proceso tiene su índice, que se construye completo una vez y después
+se actualiza por lugar: las señales de guardado y borrado anotan cada
+cambio del catálogo en `CatalogChange` (ver `places.offline`) y el índice
+vuelve a indexar solo los lugares afectados por los cambios que aún no ha
+aplicado (los de un municipio renombrado, por ejemplo), incluidos los que
+se hicieron visibles después de otros con un id mayor. Los cambios se
+leen cuando sube la versión de alguno de los modelos indexados en el caché
+de la API y, en cualquier caso, cada `SEARCH_INDEX_POLL_SECONDS`: con un
+caché compartido los demás procesos ven un cambio en su siguiente
+búsqueda, y con el caché local por defecto, como mucho tras ese intervalo.
+Cambios que no tocan los textos indexados, como las miniaturas, no
+reindexan nada.
+"""
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from binmap_api.cache import get_versions
+from routes.models import Route
+from . import offline
+from .models import State, Municipality, Category, Place, CatalogChange
+
+INDEXED_MODELS = (Place, Municipality, State, Category, Route)
+
+# Tabla del registro de cambios -> lookup sobre Place de los lugares afectados
+AFFECTED_PLACES = {
+    'place': 'pk',
+    'municipality': 'municipality_id',
+    'state': 'municipality__state_id',
+    'category': 'category_id',
+    'route': 'route_id',
+}
+# Con más cambios pendientes sale más barato reconstruir el índice completo
+MAX_INCREMENTAL_CHANGES = 500
+
+# Campo indexado -> (lookup sobre Place, peso)
+FIELDS = {
+    'name': ('name', 3.0),
+    'category': ('category__name', 1.5),
+    'municipality': ('municipality__name', 1.0),
+    'state': ('municipality__state__name', 0.5),
+    'route': ('route__name', 1.0),
+}
+
+STOPWORDS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'un', 'una', 'y',
+})
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """
+    Quita acentos y mayúsculas: "Teotihuacán" -> "teotihuacan".
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text, stopwords=STOPWORDS):
+    return [token for token in TOKEN_RE.findall(normalize(text)) if token not in stopwords]
+
+
+def _document(texts):
+    """
+    Peso de cada término en los textos de un lugar (en el orden de FIELDS).
+    """
+    document = {}
+    for text, (_, weight) in zip(texts, FIELDS.values()):
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        # Una coincidencia pesa más en un texto corto ("Teotihuacán")
+        # que en uno largo ("Museo de sitio de Teotihuacán")
+        weight /= math.sqrt(len(tokens))
+        for token in set(tokens):
+            document[token] = document.get(token, 0.0) + weight
+    return document
+
+
+def _rows(queryset):
+    return queryset.values_list('pk', *(lookup for lookup, _ in FIELDS.values()))
+
+
+class PlaceSearchIndex:
+    """
+    Las búsquedas leen el índice sin bloquear: las actualizaciones
+    reemplazan las entradas y la lista de términos en lugar de modificarlas.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = None
+        self.checked_at = 0.0
+        # Último CatalogChange aplicado, (id, tabla, object_id); None sin índice
+        self.last_change = None
+        # Ids ya aplicados de la ventana que se vuelve a leer en cada
+        # actualización (ver `offline.changes_after`)
+        self.applied = set()
+        self.documents = {}
+        self.postings = {}
+        self.tokens = []
+
+    @property
+    def size(self):
+        return len(self.documents)
+
+    def build(self, rows):
+        """
+        Construye el índice a partir de filas (id, *textos en el orden de FIELDS).
+        """
+        documents, postings = {}, defaultdict(dict)
+        for pk, *texts in rows:
+            documents[pk] = document = _document(texts)
+            for token, weight in document.items():
+                postings[token][pk] = weight
+        self.postings = dict(postings)
+        self.tokens = sorted(self.postings)
+        self.documents = documents
+
+    def update(self, rows, removed=()):
+        """
+        Vuelve a indexar los lugares de `rows` y quita los de `removed`.
+        """
+        changed = {}
+        new_documents = {pk: _document(texts) for pk, *texts in rows}
+        for pk in {*removed, *new_documents}:
+            for token in self.documents.pop(pk, {}):
+                entry = changed.get(token)
+                if entry is None:
+                    entry = changed[token] = dict(self.postings.get(token, {}))
+                entry.pop(pk, None)
+        for pk, document in new_documents.items():
+            self.documents[pk] = document
+            for token, weight in document.items():
+                entry = changed.get(token)
+                if entry is None:
+                    entry = changed[token] = dict(self.postings.get(token, {}))
+                entry[pk] = weight
+
+        added = [token for token, entry in changed.items() if entry and token not in self.postings]
+        dropped = {token for token, entry in changed.items() if not entry}
+        for token, entry in changed.items():
+            if entry:
+                self.postings[token] = entry
+        if added or dropped:
+            self.tokens = sorted((set(self.tokens) | set(added)) - dropped)
+        for token in dropped:
+            self.postings.pop(token, None)
+
+    def rebuild(self):
+        last = CatalogChange.objects.order_by('-id').values_list('id', 'model', 'object_id').first()
+        last = last or (0, None, None)
+        # Los cambios se leen antes que los lugares: lo que cambie mientras
+        # tanto se vuelve a aplicar en la siguiente actualización
+        applied = set(offline.changes_after(last[0]).values_list('id', flat=True))
+        self.build(_rows(Place.objects.all()).iterator())
+        self.last_change, self.applied = last, applied
+
+    def apply_changes(self):
+        """
+        Reindexa los lugares afectados por los cambios aún no aplicados.
+        Reconstruye el índice si el último aplicado ya no está en el
+        registro (base de datos restaurada o registro compactado) o si el
+        índice se construyó con el registro vacío.
+        """
+        last_id = self.last_change[0]
+        limit = MAX_INCREMENTAL_CHANGES + len(self.applied) + 1
+        changes = list(
+            (CatalogChange.objects.filter(id=last_id) | offline.changes_after(last_id))
+            .order_by('id').values_list('id', 'model', 'object_id')[:limit + 1]
+        )
+        if len(changes) > limit or (self.last_change not in changes if last_id else changes):
+            return self.rebuild()
+        pending = [change for change in changes if change[0] != last_id and change[0] not in self.applied]
+        if len(pending) > MAX_INCREMENTAL_CHANGES:
+            return self.rebuild()
+
+        if pending:
+            ids = defaultdict(set)
+            for _, model, object_id in pending:
+                ids[model].add(object_id)
+            affected = Q()
+            for model, values in ids.items():
+                affected |= Q(**{f'{AFFECTED_PLACES[model]}__in': values})
+            rows = list(_rows(Place.objects.filter(affected)))
+            found = {row[0] for row in rows}
+            self.update(rows, [pk for pk in ids.get('place', ()) if pk not in found])
+        if changes:
+            self.last_change = changes[-1]
+        self.applied = {change[0] for change in changes}
+
+    def refresh(self):
+        versions = get_versions(INDEXED_MODELS)
+        now = time.monotonic()
+        if versions == self.versions and now - self.checked_at < settings.SEARCH_INDEX_POLL_SECONDS:
+            return
+        with self.lock:
+            if versions == self.versions and now - self.checked_at < settings.SEARCH_INDEX_POLL_SECONDS:
+                return
+            if self.last_change is None:
+                self.rebuild()
+            else:
+                self.apply_changes()
+            self.versions = versions
+            self.checked_at = now
+
+    def _matches(self, token, prefix):
+        postings = self.postings
+        if not prefix:
+            entry = postings.get(token)
+            return [entry] if entry else []
+        matches = []
+        tokens = self.tokens
+        start = bisect.bisect_left(tokens, token)
+        for candidate in tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            entry = postings.get(candidate)
+            if entry:
+                matches.append(entry)
+        return matches
+
+    def _scores(self, term, prefix):
+        scores = {}
+        for entry in self._matches(term, prefix):
+            idf = math.log(1 + self.size / len(entry))
+            for pk, weight in entry.items():
+                scores[pk] = max(scores.get(pk, 0.0), weight * idf)
+        return scores
+
+    def search(self, query, limit=None):
+        """
+        Devuelve los pares (id, puntuación), hasta `limit` si se indica, de
+        los lugares que contienen todas las palabras de la consulta, de mayor
+        a menor relevancia, o None si la consulta no tiene nada que buscar.
+
+        La última palabra se busca por prefijo aunque sea una palabra vacía
+        ("la" mientras se escribe "laguna"); en ese caso, si hay más
+        palabras, solo sube la puntuación de los lugares que la contienen
+        en lugar de descartar los demás ("museo de la"). Una consulta solo
+        con palabras vacías que no encuentra nada no filtra la lista.
+        """
+        words = tokenize(query, stopwords=())
+        if not words:
+            return None
+        last = words[-1]
+        terms = [word for word in words[:-1] if word not in STOPWORDS]
+        optional = None
+        if last not in STOPWORDS or not terms:
+            terms.append(last)
+        else:
+            optional = last
+        self.refresh()
+
+        scores = None
+        for position, term in enumerate(terms):
+            term_scores = self._scores(term, prefix=position == len(terms) - 1 and term == last)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+            if not scores:
+                return None if all(word in STOPWORDS for word in words) else []
+        if optional is not None:
+            for pk, score in self._scores(optional, prefix=True).items():
+                if pk in scores:
+                    scores[pk] += score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+        return ranked[:limit]
+
+
+place_index = PlaceSearchIndex()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Datos sintéticos para desarrollo y benchmarks.
+
+Genera estados → municipios → rutas → lugares, más usuarios con favoritos
+y visitas y un administrador (`ADMIN_EMAIL`) para los endpoints de
+escritura. Con la misma semilla y la misma escala se obtienen exactamente
+los mismos registros, incluidos sus ids, para que los benchmarks sean
+comparables entre ejecuciones.
+
+Los registros se escriben con `bulk_create`, que no emite señales, así que
+al terminar se recalculan los contadores de popularidad, se anotan los
+cambios para los paquetes sin conexión y se invalidan las respuestas en
+caché.
+"""
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from binmap_api.cache import bump_version
+from routes.models import Route, Municipality_has_Route
+from . import offline
+from .models import State, Municipality, Category, Place, Favorite, VisitedPlace
+from .popularity import rebuild_popularity
+
+User = get_user_model()
+
+USER_EMAIL_DOMAIN = 'seed.example.com'
+USER_PASSWORD = 'semilla123'
+ADMIN_EMAIL = f'admin@{USER_EMAIL_DOMAIN}'
+BATCH_SIZE = 1000
+
+STATES = (
+    'Yucatán', 'Quintana Roo', 'Campeche', 'Chiapas', 'Tabasco', 'Oaxaca', 'Veracruz', 'Puebla',
+    'Guerrero', 'Michoacán', 'Jalisco', 'Guanajuato', 'Querétaro', 'Hidalgo', 'Zacatecas', 'Durango',
+    'Sinaloa', 'Sonora', 'Chihuahua', 'Coahuila', 'Nuevo León', 'Tamaulipas', 'San Luis Potosí', 'Nayarit',
+    'Colima', 'Morelos', 'Tlaxcala', 'Aguascalientes', 'Baja California', 'Baja California Sur',
+    'Estado de México', 'Ciudad de México',
+)
+TOWNS = (
+    'Izamal', 'Tekax', 'Tizimín', 'Oxkutzcab', 'Valladolid', 'Motul', 'Ticul', 'Peto', 'Hunucmá', 'Maní',
+    'Conkal', 'Espita', 'Temax', 'Halachó', 'Muna', 'Sacalum', 'Bacalar', 'Calakmul', 'Palenque', 'Comitán',
+    'Tlacotalpan', 'Cuetzalan', 'Taxco', 'Pátzcuaro', 'Tequila', 'Bernal', 'Real de Catorce', 'Álamos',
+)
+TOWN_PREFIXES = ('', '', 'San Juan', 'Santa María', 'Villa', 'San Pedro')
+CATEGORIES = (
+    ('Zona arqueológica', 'Zona Arqueológica'),
+    ('Cenote', 'Cenote'),
+    ('Playa', 'Playa'),
+    ('Museo', 'Museo'),
+    ('Hacienda', 'Hacienda'),
+    ('Reserva natural', 'Reserva'),
+    ('Templo', 'Templo de'),
+    ('Mirador', 'Mirador'),
+)
+PLACE_NAMES = (
+    'Xcaret', 'Dzibilchaltún', 'Ek Balam', 'Xkeken', 'Suytun', 'Mayapán', 'Kabah', 'Sayil', 'Labná',
+    'Yaxunah', 'Chacmultún', 'Oxkintok', 'Aké', 'Sotuta', 'San Antonio', 'Santa Rosa', 'Los Arcos',
+)
+ROUTE_THEMES = ('Ruta Puuc', 'Ruta de los Conventos', 'Ruta de los Cenotes', 'Ruta Maya', 'Ruta Costera', 'Ruta Colonial')
+DESCRIPTION = 'Lugar generado para pruebas de rendimiento.'
+
+
+@dataclass
+class Scale:
+    states: int = 4
+    municipalities: int = 5  # por estado
+    routes: int = 2  # por estado
+    places: int = 5  # por municipio
+    users: int = 10
+    favorites: int = 5  # por usuario
+    visits: int = 3  # por usuario
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _coordinate(value):
+    return Decimal(f'{value:.8f}')
+
+
+def _town(rng):
+    prefix = rng.choice(TOWN_PREFIXES)
+    town = rng.choice(TOWNS)
+    return f'{prefix} {town}' if prefix else town
+
+
+def seed(scale, random_seed=0):
+    """
+    Crea los registros de `scale` y devuelve cuántos se crearon de cada
+    modelo.
+    """
+    rng = random.Random(random_seed)
+    labels = dict(CATEGORIES)
+
+    categories = [
+        Category(id=_uuid(rng), name=name, description=f'{name} ({label})')
+        for name, label in CATEGORIES
+    ]
+    states, municipalities, routes, links, places = [], [], [], [], []
+    for state_index in range(scale.states):
+        state = State(id=_uuid(rng), name=STATES[state_index % len(STATES)])
+        states.append(state)
+        # Centro aproximado del estado dentro del territorio de México
+        center = (rng.uniform(16, 31), rng.uniform(-115, -88))
+
+        state_municipalities = [
+            (Municipality(id=_uuid(rng), name=_town(rng)[:35], state=state),
+             (center[0] + rng.uniform(-1, 1), center[1] + rng.uniform(-1, 1)))
+            for _ in range(scale.municipalities)
+        ]
+        municipalities.extend(municipality for municipality, _ in state_municipalities)
+
+        state_routes = []
+        for route_index in range(scale.routes):
+            state_routes.append(Route(
+                id=_uuid(rng),
+                name=f'{ROUTE_THEMES[route_index % len(ROUTE_THEMES)]} {state.name}'[:50],
+                description=DESCRIPTION,
+                duration=time(rng.randint(1, 9), rng.choice((0, 15, 30, 45))),
+            ))
+        routes.extend(state_routes)
+        if not state_routes:
+            continue
+
+        for municipality, (latitude, longitude) in state_municipalities:
+            # Cada municipio está en una o dos rutas de su estado
+            municipality_routes = rng.sample(state_routes, min(len(state_routes), rng.randint(1, 2)))
+            links.extend(Municipality_has_Route(municipality=municipality, route=route) for route in municipality_routes)
+            for _ in range(scale.places):
+                category = rng.choice(categories)
+                place = Place(
+                    id=_uuid(rng),
+                    name=f'{labels[category.name]} {rng.choice(PLACE_NAMES)}'[:50],
+                    description=DESCRIPTION,
+                    latitude=_coordinate(latitude + rng.uniform(-0.2, 0.2)),
+                    longitude=_coordinate(longitude + rng.uniform(-0.2, 0.2)),
+                    municipality=municipality,
+                    category=category,
+                    route=rng.choice(municipality_routes),
+                )
+                place.update_geohash()
+                places.append(place)
+
+    # Un solo hash de contraseña para todos: calcularlo es lo más lento
+    password = make_password(USER_PASSWORD)
+    users = [
+        User(
+            id=_uuid(rng),
+            username=f'usuario{number}',
+            email=f'usuario{number}@{USER_EMAIL_DOMAIN}',
+            first_name='Usuario',
+            last_name=str(number),
+            password=password,
+        )
+        for number in range(1, scale.users + 1)
+    ]
+    favorites, visits = [], []
+    last_visit = date(2024, 1, 1)
+    for user in users:
+        for place in rng.sample(places, min(len(places), scale.favorites)):
+            favorites.append(Favorite(user=user, place=place))
+        for place in rng.sample(places, min(len(places), scale.visits)):
+            visits.append(VisitedPlace(
+                id=_uuid(rng), user=user, place=place, visited_date=last_visit - timedelta(days=rng.randint(0, 365)),
+            ))
+    admin = User(
+        id=_uuid(rng), username='admin-semilla', email=ADMIN_EMAIL, first_name='Administrador',
+        last_name='Semilla', password=password, is_staff=True,
+    )
+
+    with transaction.atomic():
+        for model, objects in (
+            (Category, categories),
+            (State, states),
+            (Municipality, municipalities),
+            (Route, routes),
+            (Municipality_has_Route, links),
+            (Place, places),
+            (User, [*users, admin]),
+            (Favorite, favorites),
+            (VisitedPlace, visits),
+        ):
+            model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        rebuild_popularity()
+        for model, objects in ((State, states), (Municipality, municipalities), (Category, categories),
+                               (Route, routes), (Place, places)):
+            offline.record_changes(model, [obj.pk for obj in objects])
+
+    bump_version(State, Municipality, Category, Route, Municipality_has_Route, Place, Favorite, VisitedPlace)
+    return {
+        'states': len(states),
+        'municipalities': len(municipalities),
+        'categories': len(categories),
+        'routes': len(routes),
+        'places': len(places),
+        'users': len(users),
+        'favorites': len(favorites),
+        'visits': len(visits),
+    }
+
+
+def clear():
+    """
+    Elimina el catálogo y los usuarios generados.
+    """
+    with transaction.atomic():
+        for model in (Place, Municipality, State, Category, Route):
+            model.objects.all().delete()
+        User.objects.filter(email__endswith=f'@{USER_EMAIL_DOMAIN}').delete()
@@ -2,14 +2,23 @@
 from rest_framework import serializers
 from .models import Municipality, State, Category, Place, Favorite, VisitedPlace
 from django.contrib.auth import get_user_model
+from binmap_api.fast_serializers import FastListSerializer
+from binmap_api.sparse_fields import SparseFieldsSerializerMixin
+from binmap_api.storage import media_storage
 from routes.models import Route
 
 User = get_user_model()
 
 
+def media_url(name, request=None):
+    url = media_storage().url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
 class StateSerializer(serializers.ModelSerializer):
     class Meta:
         model = State
+        list_serializer_class = FastListSerializer
         fields = '__all__'
 
 
@@ -18,21 +27,24 @@ class MunicipalitySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Municipality
+        list_serializer_class = FastListSerializer
         fields = ('id', 'name', 'description', 'state')
 
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
+        list_serializer_class = FastListSerializer
         fields = '__all__'
 
 
-class PlaceSerializer(serializers.ModelSerializer):
+class PlaceSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     municipality = MunicipalitySerializer(read_only=True)
     category = CategorySerializer(read_only=True)
 
     class Meta:
         model = Place
+        list_serializer_class = FastListSerializer
         fields = (
             'id',
             'name',
@@ -44,22 +56,62 @@ class PlaceSerializer(serializers.ModelSerializer):
             'municipality',
             'category',
             'route',
-            'municipality',
-            'category',
-            'route',
+            'derivatives',
         )
+        # Con ?expand= las relaciones no incluidas se devuelven como id
+        expandable_fields = ('municipality', 'category', 'route')
+        field_columns = {'derivatives': ('image', 'video', 'media_derivatives')}
 
     class RouteSerializer(serializers.ModelSerializer):
         class Meta:
             model = Route
+            list_serializer_class = FastListSerializer
             fields = ('id', 'name', 'description', 'duration')
 
     route = RouteSerializer(read_only=True)
+    derivatives = serializers.SerializerMethodField()
+
+    def get_derivatives(self, place):
+        """
+        Miniaturas de la imagen y portada del vídeo con su ancho, para que el
+        cliente elija la adecuada a la pantalla
+        """
+        request = self.context.get('request')
+        media = place.media_derivatives or {}
+        sources = {'image': place.image.name or None, 'poster': place.video.name or None}
+        derivatives = {}
+        for kind, source in sources.items():
+            entry = media.get(kind)
+            if not entry or entry['source'] != source:
+                # Aún no generadas para el archivo actual
+                derivatives[kind] = []
+                continue
+            derivatives[kind] = [
+                {
+                    'width': size['width'],
+                    'height': size['height'],
+                    'webp': media_url(size['webp'], request),
+                    'jpeg': media_url(size['jpeg'], request),
+                }
+                for size in entry['sizes']
+            ]
+        return derivatives
+
+
+class PlaceBulkSerializer(serializers.ModelSerializer):
+    municipality = serializers.UUIDField(source='municipality_id')
+    category = serializers.UUIDField(source='category_id')
+    route = serializers.UUIDField(source='route_id')
+
+    class Meta:
+        model = Place
+        fields = ('name', 'description', 'latitude', 'longitude', 'municipality', 'category', 'route')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
+        list_serializer_class = FastListSerializer
         fields = '__all__'
 
 
@@ -69,12 +121,14 @@ class FavoriteDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Favorite
+        list_serializer_class = FastListSerializer
         fields = '__all__'
 
 
 class VisitedPlaceSerializer(serializers.ModelSerializer):
     class Meta:
         model = VisitedPlace
+        list_serializer_class = FastListSerializer
         fields = '__all__'
 
 
@@ -84,4 +138,5 @@ class VisitedPlaceDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = VisitedPlace
+        list_serializer_class = FastListSerializer
         fields = '__all__'
@@ -1,3 +1,1343 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from binmap_api.cache import bump_version
+from binmap_api.fast_serializers import FastListSerializer
+from binmap_api import metrics
+from binmap_api.metrics import registry, timed
+from binmap_api.renderers import FastJSONRenderer
+from binmap_api.throttling import CacheBucketStore, get_store
+from routes.models import Route
+from routes.serializers import RouteSerializer
+from . import geo, media, offline
+from .management.commands.benchmark import ClientTransport, Command as BenchmarkCommand, build_scenarios, compare
+from .models import State, Municipality, Category, Place, Favorite, VisitedPlace, UploadSession, CatalogChange
+from .seed import ADMIN_EMAIL, USER_EMAIL_DOMAIN, Scale, clear, seed
+from .search import place_index
+from .serializers import FavoriteDetailSerializer, PlaceSerializer
+
+User = get_user_model()
+
+
+def create_catalogue():
+    state = State.objects.create(name='Yucatán')
+    municipality = Municipality.objects.create(name='Mérida', state=state)
+    category = Category.objects.create(name='Zona arqueológica')
+    route = Route.objects.create(name='Ruta Maya', duration=time(2, 30))
+    return municipality, category, route
+
+
+def create_user(name='ana'):
+    return User.objects.create_user(username=name, email=f'{name}@example.com', password='secreto123')
+
+
+def create_place(municipality, category, route, name, latitude, longitude):
+    return Place.objects.create(
+        name=name,
+        description=name,
+        latitude=latitude,
+        longitude=longitude,
+        municipality=municipality,
+        category=category,
+        route=route,
+    )
+
+
+class GeohashTests(TestCase):
+    def test_encode_known_value(self):
+        self.assertEqual(geo.encode(42.6, -5.6, 5), 'ezs42')
+
+    def test_cover_contains_points_inside_window(self):
+        prefixes = geo.cover(20.9, -89.7, 21.1, -89.5)
+        self.assertLessEqual(len(prefixes), geo.MAX_COVER_CELLS)
+        point = geo.encode(21.0, -89.6)
+        self.assertTrue(any(point.startswith(prefix) for prefix in prefixes))
+
+    def test_geohash_follows_coordinates(self):
+        place = create_place(*create_catalogue(), 'Catedral', '20.96710000', '-89.62370000')
+        self.assertEqual(place.geohash, geo.encode(20.9671, -89.6237))
+
+        place.latitude, place.longitude = '21.15520000', '-86.84850000'
+        place.save(update_fields=['latitude', 'longitude'])
+        place.refresh_from_db()
+        self.assertEqual(place.geohash, geo.encode(21.1552, -86.8485))
+
+
+class PlaceGeoFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        catalogue = create_catalogue()
+        cls.merida = create_place(*catalogue, 'Catedral', '20.96710000', '-89.62370000')
+        cls.dzibilchaltun = create_place(*catalogue, 'Dzibilchaltún', '21.09110000', '-89.59240000')
+        cls.cancun = create_place(*catalogue, 'Cancún', '21.16190000', '-86.85150000')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {place['name'] for place in response.data['results']}
+
+    def test_bbox(self):
+        response = self.client.get('/api/v1/places/', {'bbox': '-89.7,20.9,-89.5,21.1'})
+        self.assertEqual(self.names(response), {'Catedral', 'Dzibilchaltún'})
+
+    def test_near_uses_exact_distance(self):
+        distance = geo.haversine_km(20.9671, -89.6237, 21.0911, -89.5924)
+        params = {'near': '20.9671,-89.6237'}
+
+        response = self.client.get('/api/v1/places/', {**params, 'radius': distance - 0.5})
+        self.assertEqual(self.names(response), {'Catedral'})
+
+        response = self.client.get('/api/v1/places/', {**params, 'radius': distance + 0.5})
+        self.assertEqual(self.names(response), {'Catedral', 'Dzibilchaltún'})
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/v1/places/', {'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/places/', {'near': '20,-89'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/places/', {'near': '95,-89', 'radius': 1}).status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN de SQLite')
+    def test_plan_uses_geohash_index(self):
+        for params in ({'near': '20.9671,-89.6237', 'radius': 5}, {'bbox': '-89.7,20.9,-89.5,21.1', 'ordering': 'popular'}):
+            with self.subTest(params=params), CaptureQueriesContext(connection) as context:
+                self.names(self.client.get('/api/v1/places/', params))
+            sql = next(query['sql'] for query in context.captured_queries if 'LIMIT' in query['sql'])
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            # Ningún recorrido de la tabla completa en el orden de la paginación
+            self.assertFalse([step for step in plan if step.startswith('SCAN places_place')], plan)
+            self.assertTrue(any('places_place_geohash' in step for step in plan), plan)
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_places(self, count):
+        for index in range(count):
+            # Relaciones distintas por lugar para que cualquier N+1 se note
+            municipality, category, route = create_catalogue()
+            place = create_place(municipality, category, route, f'Lugar {index}', '20.0', '-89.0')
+            Favorite.objects.create(place=place, user=self.user)
+            VisitedPlace.objects.create(place=place, user=self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_constant_queries_for_any_page_size(self):
+        for url in ('/api/v1/places/', '/api/v1/favorites/', '/api/v1/visited-places/'):
+            with self.subTest(url=url):
+                Place.objects.all().delete()
+                self.add_places(2)
+                small = self.count_queries(url)
+                self.add_places(8)
+                self.assertEqual(self.count_queries(url), small)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.place = create_place(*create_catalogue(), 'Uxmal', '20.36', '-89.77')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        places = [query['sql'] for query in queries.captured_queries if 'FROM "places_place"' in query['sql']]
+        return response, places[-1]
+
+    def test_default_shape_is_unchanged(self):
+        response, _ = self.get('/api/v1/places/')
+        item = response.json()['results'][0]
+        self.assertEqual(list(item), [
+            'id', 'name', 'description', 'latitude', 'longitude', 'image', 'video',
+            'municipality', 'category', 'route', 'derivatives',
+        ])
+        self.assertEqual(item['municipality']['state']['name'], 'Yucatán')
+
+    def test_flat_ids_without_joins(self):
+        response, sql = self.get('/api/v1/places/?fields=name,latitude,longitude,category&expand=')
+        item = response.json()['results'][0]
+        self.assertEqual(item, {
+            'id': str(self.place.pk),
+            'name': 'Uxmal',
+            'latitude': '20.36000000',
+            'longitude': '-89.77000000',
+            'category': str(self.place.category_id),
+        })
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"description"', sql)
+
+    def test_expand_selected_relations(self):
+        response, sql = self.get(f'/api/v1/places/{self.place.pk}/?fields=category,route,derivatives&expand=category')
+        item = response.json()
+        self.assertEqual(item['category']['name'], 'Zona arqueológica')
+        self.assertEqual(item['route'], str(self.place.route_id))
+        self.assertEqual(item['derivatives'], {'image': [], 'poster': []})
+        self.assertIn('"places_category"', sql)
+        self.assertNotIn('"routes_route"', sql)
+        self.assertNotIn('"places_municipality"', sql)
+
+    def test_no_extra_queries(self):
+        create_place(self.place.municipality, self.place.category, self.place.route, 'Kabah', '20.24', '-89.64')
+        for url in ('/api/v1/places/?ordering=popular&page_size=1', '/api/v1/places/?search=uxmal'):
+            with self.subTest(url=url):
+                # La primera búsqueda construye el índice
+                self.client.get(f'{url}&count=true')
+                with CaptureQueriesContext(connection) as full:
+                    self.client.get(url)
+                with CaptureQueriesContext(connection) as sparse:
+                    self.client.get(f'{url}&fields=name&expand=')
+                self.assertEqual(len(sparse.captured_queries), len(full.captured_queries))
+
+    def test_unknown_names(self):
+        response = self.client.get('/api/v1/places/?fields=name,altitude')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('altitude', response.json()['fields'])
+        response = self.client.get('/api/v1/places/?expand=name')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.json())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        catalogue = create_catalogue()
+        for index in range(7):
+            create_place(*catalogue, f'Lugar {index}', '20.0', '-89.0')
+
+    def test_walks_every_place_once(self):
+        client = APIClient()
+        seen = []
+        url = '/api/v1/places/?page_size=3'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], 7)
+            seen.extend(place['id'] for place in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_popular_ties_are_a_keyset(self):
+        busy = Place.objects.order_by('id').last()
+        Place.objects.filter(pk=busy.pk).update(favorites_count=2)
+        client = APIClient()
+        pages = []
+        url = '/api/v1/places/?ordering=popular&page_size=2&count=false'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in context.captured_queries))
+            pages.append([place['id'] for place in response.data['results']])
+            url = response.data['next']
+        seen = [pk for page in pages for pk in page]
+        self.assertEqual(seen[0], str(busy.pk))
+        self.assertEqual(sorted(seen[1:]), seen[1:])
+        self.assertEqual(len(set(seen)), 7)
+
+        # Hacia atrás se recorren las mismas páginas
+        previous = response.data['previous']
+        for page in reversed(pages[:-1]):
+            response = client.get(previous)
+            self.assertEqual([place['id'] for place in response.data['results']], page)
+            previous = response.data['previous']
+        self.assertIsNone(previous)
+
+    def test_count_opt_out(self):
+        with CaptureQueriesContext(connection) as context:
+            response = APIClient().get('/api/v1/places/', {'count': 'false'})
+        self.assertNotIn('count', response.data)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.place = create_place(*create_catalogue(), 'Catedral', '20.96710000', '-89.62370000')
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_repeated_reads_skip_the_database(self):
+        url = f'/api/v1/places/{self.place.pk}/'
+        _, queries = self.get(url)
+        self.assertGreater(queries, 0)
+        _, queries = self.get(url)
+        self.assertEqual(queries, 0)
+
+    def test_related_save_invalidates(self):
+        url = f'/api/v1/places/{self.place.pk}/'
+        self.get(url)
+        state = self.place.municipality.state
+        state.name = 'Quintana Roo'
+        state.save()
+        response, queries = self.get(url)
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.data['municipality']['state']['name'], 'Quintana Roo')
+
+    def test_cascade_delete_invalidates(self):
+        self.get('/api/v1/places/')
+        self.place.category.delete()
+        response, _ = self.get('/api/v1/places/')
+        self.assertEqual(response.data['results'], [])
+
+
+@override_settings(API_CONDITIONAL_GET=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.place = create_place(*create_catalogue(), 'Catedral', '20.96710000', '-89.62370000')
+
+    def test_not_modified_skips_the_database(self):
+        response = self.client.get('/api/v1/places/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/places/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(context.captured_queries), 0)
+
+        response = self.client.get('/api/v1/places/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_produce_a_new_etag(self):
+        etag = self.client.get('/api/v1/places/')['ETag']
+        self.place.name = 'Catedral de San Ildefonso'
+        self.place.save()
+        response = self.client.get('/api/v1/places/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_per_user_etags(self):
+        first, second = create_user('ana'), create_user('luis')
+        self.client.force_authenticate(first)
+        etag = self.client.get('/api/v1/favorites/')['ETag']
+        self.assertEqual(self.client.get('/api/v1/favorites/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_authenticate(second)
+        self.assertEqual(self.client.get('/api/v1/favorites/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        Favorite.objects.create(place=self.place, user=second)
+        self.client.force_authenticate(first)
+        self.assertEqual(self.client.get('/api/v1/favorites/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_object_is_not_modified_404(self):
+        last_modified = self.client.get(f'/api/v1/places/{self.place.pk}/')['Last-Modified']
+        response = self.client.get(f'/api/v1/places/{self.place.pk}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        for pk in (uuid.uuid4(), 'no-es-un-uuid'):
+            response = self.client.get(f'/api/v1/places/{pk}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 404)
+
+    def test_offline_bundle(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.get('/api/v1/offline-bundle/')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/api/v1/offline-bundle/', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            # Un 'since' no válido sigue siendo un error aunque no haya cambios
+            response = self.client.get(
+                '/api/v1/offline-bundle/?since=999', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            )
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(API_CONDITIONAL_GET=False)
+    def test_disabled_without_shared_cache(self):
+        response = self.client.get('/api/v1/places/')
+        self.assertNotIn('ETag', response)
+        response = self.client.get('/api/v1/places/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+
+class PlaceBulkTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='admin', email='admin@example.com', password='secreto123', is_staff=True,
+        ))
+        self.municipality, self.category, self.route = create_catalogue()
+
+    def row(self, name, **extra):
+        return {
+            'name': name,
+            'description': name,
+            'latitude': '20.96710000',
+            'longitude': '-89.62370000',
+            'municipality': str(self.municipality.pk),
+            'category': str(self.category.pk),
+            'route': str(self.route.pk),
+            **extra,
+        }
+
+    def test_create_reports_each_row(self):
+        rows = [self.row(f'Lugar {index}') for index in range(50)]
+        rows.append(self.row('Sin categoría', category='00000000-0000-0000-0000-000000000000'))
+        rows.append({'name': 'Incompleto'})
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/v1/places/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {'created': 50, 'error': 2})
+        self.assertIn('category', response.data['results'][50]['errors'])
+        # Una consulta por tabla referenciada más la inserción, sin importar el tamaño
+        self.assertLess(len(context.captured_queries), 10)
+
+        place = Place.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual(place.geohash, geo.encode(place.latitude, place.longitude))
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(self.row(f'Lugar {index}')) for index in range(3))
+        response = self.client.post('/api/v1/places/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['summary'], {'created': 3})
+
+    def test_update_and_delete(self):
+        first = create_place(self.municipality, self.category, self.route, 'Uno', '20.0', '-89.0')
+        second = create_place(self.municipality, self.category, self.route, 'Dos', '20.0', '-89.0')
+        missing = '00000000-0000-0000-0000-000000000000'
+
+        response = self.client.patch('/api/v1/places/bulk/', [
+            {'id': str(first.pk), 'latitude': '21.16190000', 'longitude': '-86.85150000'},
+            {'id': missing, 'name': 'Nadie'},
+        ], format='json')
+        self.assertEqual(response.data['summary'], {'updated': 1, 'not_found': 1})
+        first.refresh_from_db()
+        self.assertEqual(first.geohash, geo.encode(21.1619, -86.8515))
+
+        response = self.client.delete('/api/v1/places/bulk/', [str(first.pk), {'id': str(second.pk)}, missing], format='json')
+        self.assertEqual(response.data['summary'], {'deleted': 2, 'not_found': 1})
+        self.assertFalse(Place.objects.exists())
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(create_user())
+        response = self.client.post('/api/v1/places/bulk/', [self.row('Lugar')], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class PlaceExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        catalogue = create_catalogue()
+        create_place(*catalogue, 'Catedral', '20.96710000', '-89.62370000')
+        create_place(*catalogue, 'Cancún', '21.16190000', '-86.85150000')
+
+    def test_ndjson(self):
+        response = APIClient().get('/api/v1/places/export/', {'format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual({row['name'] for row in rows}, {'Catedral', 'Cancún'})
+        self.assertEqual(rows[0]['state_name'], 'Yucatán')
+        self.assertEqual(rows[0]['route_name'], 'Ruta Maya')
+
+    def test_csv_with_list_filters(self):
+        response = APIClient().get('/api/v1/places/export/', {'format': 'csv', 'bbox': '-89.7,20.9,-89.5,21.1'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,name,description,latitude,longitude'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Catedral', lines[1])
+
+
+class OfflineBundleTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        catalogue = create_catalogue()
+        self.catedral = create_place(*catalogue, 'Catedral', '20.96710000', '-89.62370000')
+        self.cancun = create_place(*catalogue, 'Cancún', '21.16190000', '-86.85150000')
+
+    def fetch(self, **params):
+        response = self.client.get('/api/v1/offline-bundle/', params)
+        self.assertEqual(response.status_code, 200)
+        name = response.data['url'].split(settings.MEDIA_URL, 1)[1]
+        with default_storage.open(name) as bundle:
+            return response.data, offline.decode_bundle(bundle.read())
+
+    def test_full_snapshot(self):
+        manifest, bundle = self.fetch()
+        self.assertEqual(bundle['version'], manifest['version'])
+        places = {row['name']: row for row in bundle['tables']['place']['rows']}
+        self.assertEqual(set(places), {'Catedral', 'Cancún'})
+        self.assertAlmostEqual(places['Catedral']['latitude'], 20.9671)
+        self.assertEqual(places['Catedral']['municipality_id'], self.catedral.municipality_id)
+        self.assertEqual(bundle['tables']['route']['rows'][0]['duration'], time(2, 30))
+        self.assertEqual(len(bundle['tables']['state']['rows']), 1)
+
+        # La misma versión se sirve desde el archivo ya generado
+        self.assertEqual(self.fetch()[0]['url'], manifest['url'])
+
+    @override_settings(CATALOG_CHANGES_RESCAN_SECONDS=0)
+    def test_delta_since_version(self):
+        # Sin ventana, el delta solo tiene lo que cambió después de la versión
+        manifest, _ = self.fetch()
+        self.catedral.name = 'Catedral de San Ildefonso'
+        self.catedral.save()
+        cancun_id = self.cancun.pk
+        self.cancun.delete()
+
+        _, delta = self.fetch(since=manifest['version'])
+        places = delta['tables']['place']
+        self.assertEqual([row['name'] for row in places['rows']], ['Catedral de San Ildefonso'])
+        self.assertEqual(places['deleted'], [cancun_id])
+        self.assertEqual(delta['tables']['state']['rows'], [])
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get('/api/v1/offline-bundle/', {'since': 'x'}).status_code, 400)
+        version = offline.current_version()
+        self.assertEqual(self.client.get('/api/v1/offline-bundle/', {'since': version + 1}).status_code, 400)
+
+    def test_delta_includes_late_commits(self):
+        # Una transacción que tomó un id antes que otras y hace commit después
+        late = CatalogChange.objects.get(object_id=self.cancun.pk)
+        late.delete()
+        manifest, _ = self.fetch()
+        Place.objects.filter(pk=self.cancun.pk).update(name='Cancún centro')
+        CatalogChange.objects.create(id=late.id, model='place', object_id=self.cancun.pk)
+
+        _, delta = self.fetch(since=manifest['version'])
+        self.assertIn('Cancún centro', [row['name'] for row in delta['tables']['place']['rows']])
+
+    def test_compaction(self):
+        old_manifest, _ = self.fetch()
+        self.catedral.name = 'Catedral de San Ildefonso'
+        self.catedral.save()
+        version = offline.current_version()
+        CatalogChange.objects.update(created_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+        output = io.StringIO()
+        call_command('compact_catalog_changes', bundle_hours=0, stdout=output)
+        self.assertIn('paquetes eliminados', output.getvalue())
+        # Se conserva el último cambio para no perder la versión actual
+        self.assertEqual(list(CatalogChange.objects.values_list('id', flat=True)), [version])
+        self.assertFalse(default_storage.exists(old_manifest['url'].split(settings.MEDIA_URL, 1)[1]))
+
+        # Desde antes de la compactación se recibe el paquete completo
+        manifest, bundle = self.fetch(since=old_manifest['version'] - 1)
+        self.assertEqual((manifest['since'], bundle['since']), (0, 0))
+        self.assertEqual(len(bundle['tables']['place']['rows']), 2)
+        _, delta = self.fetch(since=old_manifest['version'])
+        self.assertEqual([row['name'] for row in delta['tables']['place']['rows']], ['Catedral de San Ildefonso'])
+
+
+class PopularityTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        catalogue = create_catalogue()
+        self.quiet = create_place(*catalogue, 'Tranquilo', '20.0', '-89.0')
+        self.busy = create_place(*catalogue, 'Concurrido', '20.0', '-89.0')
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def counters(self, place):
+        place.refresh_from_db()
+        return place.favorites_count, place.visits_count
+
+    def test_counters_follow_favorites_and_visits(self):
+        self.client.post('/api/v1/favorites/toggle/', {'place': str(self.busy.pk)})
+        self.client.post('/api/v1/visited-places/', {'place': str(self.busy.pk)})
+        self.client.post(f'/api/v1/places/{self.quiet.pk}/toggle_visited/')
+        self.assertEqual(self.counters(self.busy), (1, 1))
+        self.assertEqual(self.counters(self.quiet), (0, 1))
+
+        self.client.post('/api/v1/favorites/toggle/', {'place': str(self.busy.pk)})
+        self.client.post(f'/api/v1/places/{self.quiet.pk}/toggle_visited/')
+        self.assertEqual(self.counters(self.busy), (0, 1))
+        self.assertEqual(self.counters(self.quiet), (0, 0))
+
+        # Guardar un lugar leído antes no pisa los contadores
+        stale = Place.objects.get(pk=self.busy.pk)
+        self.client.post('/api/v1/favorites/toggle/', {'place': str(self.busy.pk)})
+        stale.name = 'Muy concurrido'
+        stale.save()
+        self.assertEqual(self.counters(self.busy), (1, 1))
+
+    def test_popular_ordering(self):
+        self.client.get('/api/v1/places/', {'ordering': 'popular'})
+        self.client.post('/api/v1/favorites/toggle/', {'place': str(self.busy.pk)})
+        response = self.client.get('/api/v1/places/', {'ordering': 'popular'})
+        self.assertEqual(response.data['results'][0]['name'], 'Concurrido')
+
+    def test_rebuild_command(self):
+        Favorite.objects.create(place=self.quiet, user=create_user('luis'))
+        VisitedPlace.objects.create(place=self.quiet, user=create_user('eva'))
+        Place.objects.filter(pk=self.busy.pk).update(favorites_count=7)
+
+        self.client.get('/api/v1/places/', {'ordering': 'popular'})
+        call_command('rebuild_popularity', stdout=io.StringIO())
+        self.assertEqual(self.counters(self.quiet), (1, 1))
+        self.assertEqual(self.counters(self.busy), (0, 0))
+        # El UPDATE no emite señales: la respuesta en caché se invalida igual
+        response = self.client.get('/api/v1/places/', {'ordering': 'popular'})
+        self.assertEqual(response.data['results'][0]['name'], 'Tranquilo')
+
+    def test_user_delete_recounts_places(self):
+        user = create_user('luis')
+        Favorite.objects.create(place=self.busy, user=user)
+        VisitedPlace.objects.create(place=self.busy, user=user)
+        Place.objects.filter(pk=self.busy.pk).update(favorites_count=1, visits_count=1)
+
+        user.delete()
+        self.assertEqual(self.counters(self.busy), (0, 0))
+        self.assertEqual(self.counters(self.quiet), (0, 0))
+
+
+class PlaceSearchTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        municipality, category, route = create_catalogue()
+        self.municipality = municipality
+        self.pyramid = create_place(municipality, category, route, 'Teotihuacán', '19.69', '-98.84')
+        self.museum = create_place(municipality, category, route, 'Museo de Teotihuacan', '19.69', '-98.84')
+        other = Municipality.objects.create(name='Valladolid', state=municipality.state)
+        self.cenote = create_place(other, Category.objects.create(name='Cenote'), route, 'Cenote Zací', '20.69', '-88.20')
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get('/api/v1/places/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_accent_insensitive_prefix_and_ranking(self):
+        self.assertEqual(self.search(search='TEOTIHUACAN'), ['Teotihuacán', 'Museo de Teotihuacan'])
+        self.assertEqual(self.search(search='teoti'), ['Teotihuacán', 'Museo de Teotihuacan'])
+        self.assertEqual(self.search(search='museo teo'), ['Museo de Teotihuacan'])
+        self.assertEqual(self.search(search='zaci valladolid'), ['Cenote Zací'])
+        self.assertEqual(self.search(search='zac merida'), [])
+        self.assertEqual(sorted(self.search(search='merida')), ['Museo de Teotihuacan', 'Teotihuacán'])
+
+    def test_stopwords_while_typing(self):
+        create_place(self.municipality, self.cenote.category, self.cenote.route, 'Laguna de Bacalar', '18.68', '-88.39')
+        # "la" es una palabra vacía, pero la última palabra es un prefijo
+        self.assertEqual(self.search(search='la'), ['Laguna de Bacalar'])
+        self.assertEqual(self.search(search='laguna de'), ['Laguna de Bacalar'])
+        # Una palabra vacía al final no descarta los lugares que no la tienen
+        self.assertEqual(self.search(search='museo de la'), ['Museo de Teotihuacan'])
+        # Solo palabras vacías sin coincidencias: la lista sin filtrar
+        self.assertEqual(len(self.search(search='de el')), Place.objects.count())
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.search(search='cenote'), ['Cenote Zací'])
+        self.cenote.name = 'Gruta Zací'
+        self.cenote.save()
+        self.assertEqual(self.search(search='cenote'), ['Gruta Zací'])
+        self.assertEqual(self.search(search='gruta'), ['Gruta Zací'])
+        self.cenote.delete()
+        self.assertEqual(self.search(search='gruta'), [])
+
+    def test_index_updates_only_affected_places(self):
+        self.assertEqual(self.search(search='cenote'), ['Cenote Zací'])
+        with mock.patch.object(place_index, 'build', wraps=place_index.build) as build:
+            # Las miniaturas suben la versión de Place sin cambiar ningún texto
+            bump_version(Place)
+            self.assertEqual(self.search(search='cenote'), ['Cenote Zací'])
+            self.municipality.name = 'Tekax'
+            self.municipality.save()
+            self.assertEqual(sorted(self.search(search='tekax')), ['Museo de Teotihuacan', 'Teotihuacán'])
+            self.assertEqual(self.search(search='merida'), [])
+            build.assert_not_called()
+
+            # Sin el último cambio aplicado en el registro se reconstruye
+            CatalogChange.objects.all().delete()
+            bump_version(Place)
+            self.assertEqual(sorted(self.search(search='tekax')), ['Museo de Teotihuacan', 'Teotihuacán'])
+            build.assert_called_once()
+
+    def test_index_applies_late_commits(self):
+        self.assertEqual(self.search(search='cenote'), ['Cenote Zací'])
+        late = CatalogChange.objects.get(object_id=self.museum.pk)
+        late.delete()
+        with mock.patch.object(place_index, 'build', wraps=place_index.build) as build:
+            Place.objects.filter(pk=self.museum.pk).update(name='Museo de sitio')
+            CatalogChange.objects.create(id=late.id, model='place', object_id=self.museum.pk)
+            bump_version(Place)
+            self.assertEqual(self.search(search='sitio'), ['Museo de sitio'])
+            build.assert_not_called()
+
+    def test_pagination_walks_every_hit(self):
+        category = Category.objects.get(name='Cenote')
+        for number in range(250):
+            create_place(self.municipality, category, self.cenote.route, f'Cenote {number}', '20.69', '-88.20')
+        place_index.refresh()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/places/', {'search': 'cenote', 'page_size': 100})
+        self.assertEqual(response.data['count'], 251)
+        # El total sale de la lista de coincidencias y solo se leen las filas de la página
+        place_queries = [query['sql'] for query in queries if 'FROM "places_place"' in query['sql']]
+        self.assertEqual(len(place_queries), 1)
+        self.assertNotIn('COUNT(', place_queries[0])
+
+        pages = []
+        while True:
+            pages.append([item['name'] for item in response.data['results']])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        names = sum(pages, [])
+        self.assertEqual(len(names), 251)
+        self.assertEqual(len(set(names)), 251)
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual([item['name'] for item in previous.data['results']], pages[-2])
+
+        # Con otros filtros, el total y las páginas solo cuentan los lugares que los cumplen
+        response = self.client.get('/api/v1/places/', {'search': 'cenote', 'municipality': str(self.cenote.municipality_id)})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual([item['name'] for item in response.data['results']], ['Cenote Zací'])
+
+    def test_exact_related_filters(self):
+        names = self.search(municipality=str(self.municipality.pk))
+        self.assertEqual(sorted(names), ['Museo de Teotihuacan', 'Teotihuacán'])
+        response = self.client.get('/api/v1/places/', {'category': 'cenote'})
+        self.assertEqual(response.status_code, 400)
+
+
+def throttle_rates(**rates):
+    rates = {'anon_read': '', 'user_write': '', 'auth': '', 'search': '', **rates}
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        get_store().clear()
+        self.addCleanup(get_store().clear)
+        create_place(*create_catalogue(), 'Uxmal', '20.36', '-89.77')
+
+    def test_anonymous_reads(self):
+        with throttle_rates(anon_read='3/min'):
+            for _ in range(3):
+                self.assertEqual(self.client.get('/api/v1/places/').status_code, 200)
+            response = self.client.get('/api/v1/places/')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '20')
+
+            # Los usuarios autenticados tienen su propio límite
+            client = APIClient()
+            client.force_authenticate(create_user())
+            self.assertEqual(client.get('/api/v1/places/').status_code, 200)
+
+    def test_search(self):
+        with throttle_rates(search='2/min'):
+            for _ in range(2):
+                self.assertEqual(self.client.get('/api/v1/places/?search=uxmal').status_code, 200)
+            self.assertEqual(self.client.get('/api/v1/places/?search=uxmal').status_code, 429)
+            self.assertEqual(self.client.get('/api/v1/places/').status_code, 200)
+
+    async def test_async_views(self):
+        client = AsyncClient()
+        with throttle_rates(anon_read='2/min', search='1/min'):
+            # Las vistas asíncronas no buscan: ?search= no gasta el límite de búsquedas
+            for _ in range(2):
+                self.assertEqual((await client.get('/api/v1/async/places/?search=uxmal')).status_code, 200)
+            # Comparte el bucket de anon_read con las vistas de DRF
+            self.assertEqual(self.client.get('/api/v1/places/').status_code, 429)
+            response = await client.get('/api/v1/async/places/export/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertIn('error', response.json())
+
+    def test_cache_store(self):
+        store = CacheBucketStore()
+        self.assertEqual(store.consume('prueba', 30, 60), 0)
+        self.assertEqual(store.consume('prueba', 30, 60), 0)
+        self.assertAlmostEqual(store.consume('prueba', 30, 60), 30, delta=1)
+        self.assertEqual(store.consume('otra', 30, 60), 0)
+
+    def test_cache_store_is_atomic(self):
+        store = CacheBucketStore()
+        lock = 'throttle:ocupada:lock'
+        # Otra petición tiene el candado: se espera antes de leer el bucket
+        store.cache.add(lock, 1)
+        release = lambda seconds: store.cache.delete(lock)
+        with mock.patch.object(store, 'update', wraps=store.update) as update:
+            with mock.patch('binmap_api.throttling.time.sleep', side_effect=release) as sleep:
+                self.assertEqual(store.consume('ocupada', 30, 60), 0)
+        sleep.assert_called_once()
+        update.assert_called_once()
+        self.assertIsNone(store.cache.get('throttle:ocupada:lock'))
+
+
+class PerformanceMetricsTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        registry.reset()
+        self.place = create_place(*create_catalogue(), 'Uxmal', '20.36', '-89.77')
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get('/api/v1/places/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", ser;dur=[\d.]+$')
+
+        client = APIClient()
+        client.force_authenticate(create_user())
+        client.post('/api/v1/favorites/toggle/', {'place': str(self.place.pk)})
+
+        with override_settings(METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        metrics = response.content.decode()
+        self.assertIn('binmap_requests_total{view="PlaceViewSet.list",status="200"} 1', metrics)
+        self.assertIn('binmap_requests_total{view="FavoriteViewSet.toggle",status="201"} 1', metrics)
+        self.assertIn('binmap_db_queries_bucket{view="PlaceViewSet.list",le="+Inf"} 1', metrics)
+        self.assertIn('binmap_serializer_duration_seconds_count{view="PlaceViewSet.list"} 1', metrics)
+
+        # Sin token el endpoint solo existe con DEBUG
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_serializer_timing_is_opt_in(self):
+        self.client.get('/api/v1/places/')
+        # La clase base de DRF queda intacta
+        self.assertEqual(BaseSerializer.data.fget.__module__, 'rest_framework.serializers')
+
+        stats = metrics.RequestStats()
+        token = metrics._current.set(stats)
+        try:
+            plain = PlaceSerializer(self.place).data
+            self.assertEqual(stats.serializer_time, 0)
+            serializer = timed(PlaceSerializer(self.place))
+            self.assertEqual(serializer.data, plain)
+        finally:
+            metrics._current.reset(token)
+        self.assertIsInstance(serializer, PlaceSerializer)
+        self.assertGreater(stats.serializer_time, 0)
+
+    def test_slow_queries_are_logged(self):
+        with override_settings(SLOW_QUERY_MS=0), self.assertLogs('binmap_api.metrics', 'WARNING') as logs:
+            self.client.get(f'/api/v1/places/{self.place.pk}/')
+        self.assertTrue(any('Slow query' in line and 'SELECT' in line for line in logs.output))
+
+
+class SeedDataTests(TestCase):
+    def test_seed_is_reproducible(self):
+        scale = Scale(states=2, municipalities=2, routes=1, places=3, users=2, favorites=2, visits=1)
+        counts = seed(scale, random_seed=7)
+        self.assertEqual(counts['places'], 12)
+        self.assertEqual(Place.objects.count(), 12)
+        self.assertEqual(Favorite.objects.count(), 4)
+        self.assertFalse(Place.objects.filter(geohash='').exists())
+        # Los contadores se recalculan aunque bulk_create no emita señales
+        self.assertEqual(sum(Place.objects.values_list('favorites_count', flat=True)), 4)
+        ids = sorted(Place.objects.values_list('pk', flat=True))
+
+        clear()
+        self.assertFalse(Place.objects.exists())
+        self.assertFalse(get_user_model().objects.filter(email__endswith=f'@{USER_EMAIL_DOMAIN}').exists())
+        call_command('seed_data', states=2, municipalities=2, routes=1, places=3, users=2, favorites=2, visits=1,
+                     seed=7, stdout=io.StringIO())
+        self.assertEqual(sorted(Place.objects.values_list('pk', flat=True)), ids)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        for setting in ('MEDIA_ROOT', 'RESUMABLE_UPLOAD_DIR'):
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory)
+            settings_override = override_settings(**{setting: directory}, TASKS_MODE='sync')
+            settings_override.enable()
+            self.addCleanup(settings_override.disable)
+        seed(Scale(states=1, municipalities=1, routes=1, places=2, users=1), random_seed=0)
+        User = get_user_model()
+        self.tokens = {
+            'user': Token.objects.create(user=User.objects.get(email=f'usuario1@{USER_EMAIL_DOMAIN}')).key,
+            'admin': Token.objects.create(user=User.objects.get(email=ADMIN_EMAIL)).key,
+        }
+
+    def test_run_and_compare(self):
+        results = BenchmarkCommand(stdout=io.StringIO()).run(
+            ClientTransport(), self.tokens, {'only': 'states', 'requests': 2, 'concurrency': 1},
+        )
+        self.assertEqual(
+            set(results),
+            {'states list', 'states detail', 'states create', 'states update', 'states delete', 'async states list',
+             'async states detail'},
+        )
+        self.assertFalse([name for name, result in results.items() if result.errors])
+
+        result = results['states list']
+        baseline = {'states list': {'p50': result.p50, 'p95': result.p95, 'queries': result.queries}}
+        self.assertEqual(compare(results, baseline, 0.5), [])
+        baseline['states list'] = {'p50': 0, 'p95': 0, 'queries': -1}
+        regressions = compare({'states list': result}, baseline, 0.5)
+        self.assertTrue(any('consultas' in regression for regression in regressions))
+
+    def test_write_scenarios(self):
+        # Bulk, subidas, alternar visitas y exportación, cada una con lo que consume creado antes
+        results = BenchmarkCommand(stdout=io.StringIO()).run(
+            ClientTransport(), self.tokens, {'only': 'places', 'requests': 2, 'concurrency': 1},
+        )
+        self.assertIn('places video-upload finalize', results)
+        self.assertIn('places bulk delete', results)
+        self.assertFalse([name for name, result in results.items() if result.errors])
+
+    def test_only_filters_before_probing(self):
+        transport = ClientTransport()
+        paths = []
+        request = transport.request
+        transport.request = lambda method, path, *args, **kwargs: paths.append(path) or request(method, path, *args, **kwargs)
+        self.assertEqual([scenario.name for scenario in build_scenarios(transport, self.tokens, 'user-detail')],
+                         ['auth user-detail', 'auth user-detail update'])
+        self.assertEqual(paths, [])
+        build_scenarios(transport, self.tokens, 'favorites detail')
+        self.assertTrue(paths)
+        self.assertTrue(all(path.startswith('/api/v1/favorites/') for path in paths))
+
+
+class FastSerializerTests(TestCase):
+    def test_list_output_matches_drf(self):
+        place = create_place(*create_catalogue(), 'Uxmal\u2028', '20.36', '-89.77')
+        place.image = 'places/images/uxmal.abcdef012345.jpg'
+        place.media_derivatives = {'image': {'source': place.image.name, 'sizes': [
+            {'width': 320, 'height': 240, 'webp': 'a.webp', 'jpeg': 'a.jpg'},
+        ]}}
+        place.save()
+        Favorite.objects.create(user=create_user(), place=place)
+        request = Request(APIRequestFactory().get('/'))
+
+        for serializer_class, queryset in (
+            (PlaceSerializer, Place.objects.all()),
+            (FavoriteDetailSerializer, Favorite.objects.all()),
+            (RouteSerializer, Route.objects.all()),
+        ):
+            items = list(queryset)
+            fast = serializer_class(items, many=True, context={'request': request}).data
+            child = serializer_class(context={'request': request})
+            self.assertIsInstance(serializer_class(many=True), FastListSerializer)
+            drf = [child.to_representation(item) for item in items]
+            self.assertEqual(fast, drf)
+            self.assertEqual(FastJSONRenderer().render(fast), JSONRenderer().render(drf))
+
+    def test_renderer_is_byte_compatible(self):
+        values = [
+            {'id': uuid.uuid4(), 'name': 'Mérida\u2028\u2029\x00"', 'price': Decimal('1.50')},
+            [1.5, 1e16, 1e-05, -2.5e-300, 0.1],
+            {'when': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc), 'day': date(2024, 5, 1)},
+            {1: 'non-string key'},
+            2 ** 70,
+            1e16,
+            ['e1', 'e10,]'],
+        ]
+        for value in values:
+            self.assertEqual(FastJSONRenderer().render(value), JSONRenderer().render(value), value)
+        self.assertEqual(
+            FastJSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+        )
+
+
+class ToggleTests(TestCase):
+    def setUp(self):
+        catalogue = create_catalogue()
+        self.place = create_place(*catalogue, 'Uxmal', '20.36', '-89.77')
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def test_toggle_round_trip(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/favorites/toggle/', {'place': str(self.place.pk)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['place'], self.place.pk)
+        writes = [q for q in queries.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(writes), 3)
+
+        response = self.client.post('/api/v1/favorites/toggle/', {'place': str(self.place.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Favorite.objects.exists())
+
+        response = self.client.post(f'/api/v1/places/{self.place.pk}/toggle_visited/', {'visited_date': '2024-05-01'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(VisitedPlace.objects.get().visited_date.isoformat(), '2024-05-01')
+
+    def test_toggle_unknown_place(self):
+        response = self.client.post('/api/v1/favorites/toggle/', {'place': str(uuid.uuid4())})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/visited-places/toggle/', {'place': 'no-es-un-id'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'/api/v1/places/{uuid.uuid4()}/toggle_visited/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(VisitedPlace.objects.exists())
+
+
+class ConcurrentToggleTests(TransactionTestCase):
+    def test_parallel_toggles(self):
+        catalogue = create_catalogue()
+        place = create_place(*catalogue, 'Kabah', '20.25', '-89.65')
+        user = create_user()
+        barrier = threading.Barrier(6)
+
+        def tap(_):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                return client.post('/api/v1/favorites/toggle/', {'place': str(place.pk)}).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            statuses = list(pool.map(tap, range(6)))
+
+        self.assertTrue(set(statuses) <= {200, 201}, statuses)
+        place.refresh_from_db()
+        self.assertEqual(place.favorites_count, Favorite.objects.filter(place=place).count())
+        self.assertLessEqual(place.favorites_count, 1)
+
+
+class UserStateTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        catalogue = create_catalogue()
+        self.places = [create_place(*catalogue, f'Lugar {i}', '20.0', '-89.0') for i in range(3)]
+        self.user = create_user()
+        Favorite.objects.create(place=self.places[0], user=self.user)
+        VisitedPlace.objects.create(place=self.places[1], user=self.user, visited_date='2024-03-02')
+        Favorite.objects.create(place=self.places[2], user=create_user('luis'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_state(self):
+        ids = [str(place.pk) for place in self.places]
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/places/user-state/', {'ids': ','.join(ids)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[ids[0]], {'favorite': True, 'visited': False, 'visited_date': None})
+        self.assertEqual(response.data[ids[1]]['visited_date'].isoformat(), '2024-03-02')
+        self.assertEqual(response.data[ids[2]], {'favorite': False, 'visited': False, 'visited_date': None})
+
+        response = self.client.post('/api/v1/places/user-state/', {'ids': ids[:2]}, format='json')
+        self.assertEqual(list(response.data), ids[:2])
+        response = self.client.get('/api/v1/places/user-state/', {'ids': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_embedded_in_list(self):
+        anonymous = APIClient().get('/api/v1/places/', {'include': 'user_state'})
+        self.assertNotIn('user_state', anonymous.data['results'][0])
+
+        response = self.client.get('/api/v1/places/', {'include': 'user_state'})
+        states = {item['name']: item['user_state'] for item in response.data['results']}
+        self.assertTrue(states['Lugar 0']['favorite'])
+        self.assertTrue(states['Lugar 1']['visited'])
+        self.assertIn('Cookie', response['Vary'])
+
+        other = APIClient()
+        other.force_authenticate(User.objects.get(username='luis'))
+        response = other.get('/api/v1/places/', {'include': 'user_state'})
+        states = {item['name']: item['user_state'] for item in response.data['results']}
+        self.assertFalse(states['Lugar 0']['favorite'])
+        self.assertTrue(states['Lugar 2']['favorite'])
+
+
+class AsyncReadTests(TestCase):
+    def setUp(self):
+        caches[settings.API_CACHE_ALIAS].clear()
+        catalogue = create_catalogue()
+        self.places = [create_place(*catalogue, f'Lugar {i}', '20.0', '-89.0') for i in range(5)]
+
+    async def test_async_place_list_matches_sync(self):
+        client = AsyncClient()
+        sync = await client.get('/api/v1/places/', {'page_size': 3})
+        response = await client.get('/api/v1/async/places/', {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['results'], json.loads(json.dumps(sync.data['results'])))
+
+        response = await client.get(data['next'])
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNone(response.json()['next'])
+
+    async def test_async_detail(self):
+        client = AsyncClient()
+        place = self.places[0]
+        response = await client.get(f'/api/v1/async/places/{place.pk}/')
+        self.assertEqual(response.json()['municipality']['state']['name'], 'Yucatán')
+        response = await client.get(f'/api/v1/async/routes/{place.route_id}/')
+        self.assertEqual(len(response.json()['places']), 5)
+        response = await client.get(f'/api/v1/async/places/{uuid.uuid4()}/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_export_and_changes(self):
+        client = AsyncClient()
+        response = await client.get('/api/v1/async/places/export/')
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(len(lines), 5)
+
+        version = await offline.acurrent_version()
+        response = await client.get('/api/v1/async/catalog-changes/', {'since': version - 1, 'timeout': 5})
+        self.assertEqual(response.json(), {'version': version, 'changed': True})
+        response = await client.get('/api/v1/async/catalog-changes/', {'since': version, 'timeout': 0})
+        self.assertEqual(response.json(), {'version': version, 'changed': False})
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_async', requests=4, concurrency=2, path=['/api/v1/places/,/api/v1/async/places/'], stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].startswith('/api/v1/async/places/'))
+        self.assertTrue(lines[2].endswith(' 0'))
+
+
+def image_upload(name, width, height, format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class PlaceMediaTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, TASKS_MODE='sync', FFMPEG_BINARY='ffmpeg-no-instalado')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches[settings.API_CACHE_ALIAS].clear()
+        self.catalogue = create_catalogue()
+
+    def create_place_with_image(self, image):
+        place = create_place(*self.catalogue, 'Uxmal', '20.36', '-89.77')
+        with self.captureOnCommitCallbacks(execute=True):
+            place.image = image
+            place.save()
+        place.refresh_from_db()
+        return place
+
+    def test_thumbnails_generated_after_upload(self):
+        place = self.create_place_with_image(image_upload('uxmal.jpg', 2000, 1000))
+        sizes = place.media_derivatives['image']['sizes']
+        self.assertEqual([(size['width'], size['height']) for size in sizes], [(1280, 640), (640, 320), (320, 160)])
+        with default_storage.open(sizes[-1]['webp']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).format, 'WEBP')
+
+        response = APIClient().get(f'/api/v1/places/{place.pk}/')
+        derivatives = response.data['derivatives']
+        self.assertEqual([size['width'] for size in derivatives['image']], [1280, 640, 320])
+        self.assertTrue(derivatives['image'][0]['jpeg'].startswith('http://testserver/media/places/derivatives/'))
+        self.assertEqual(derivatives['poster'], [])
+
+    def test_replaced_image(self):
+        place = self.create_place_with_image(image_upload('chica.png', 200, 100, 'PNG'))
+        old_files = [size['jpeg'] for size in place.media_derivatives['image']['sizes']]
+        self.assertEqual(place.media_derivatives['image']['sizes'][0]['width'], 200)
+
+        # Mientras no se generan las nuevas, las anteriores no se muestran
+        place.image = image_upload('nueva.jpg', 800, 600)
+        place.save()
+        response = APIClient().get(f'/api/v1/places/{place.pk}/')
+        self.assertEqual(response.data['derivatives']['image'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place.save()
+        place.refresh_from_db()
+        self.assertEqual([size['width'] for size in place.media_derivatives['image']['sizes']], [800, 640, 320])
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+
+    def test_discarded_thumbnails_keep_shared_files(self):
+        place = self.create_place_with_image(image_upload('uxmal.jpg', 800, 600))
+        files = list(media._files(place.media_derivatives))
+        render_image = media.render_image
+
+        def render_and_replace(place_id, name):
+            # El vídeo cambia mientras la tarea genera las miniaturas
+            sizes = render_image(place_id, name)
+            Place.objects.filter(pk=place_id).update(video='places/videos/recorrido.mp4')
+            return sizes
+
+        with mock.patch.object(media, 'render_image', render_and_replace):
+            media.process_place_media(place.pk)
+        place.refresh_from_db()
+        self.assertEqual(list(media._files(place.media_derivatives)), files)
+        self.assertTrue(all(default_storage.exists(name) for name in files))
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, TASKS_MODE='sync', FFMPEG_BINARY='ffmpeg-no-instalado',
+            MEDIA_SERVE_MODE='python', DEBUG=True,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.place = create_place(*create_catalogue(), 'Palenque', '17.48', '-92.04')
+        self.video = bytes(range(256)) * 4
+        self.place.video = SimpleUploadedFile('recorrido.mp4', self.video, content_type='video/mp4')
+        self.place.save()
+
+    def test_content_hash_names(self):
+        digest = hashlib.sha256(self.video).hexdigest()[:12]
+        self.assertEqual(self.place.video.name, f'places/videos/recorrido.{digest}.mp4')
+
+        # El mismo contenido se guarda una sola vez
+        other = create_place(self.place.municipality, self.place.category, self.place.route, 'Toniná', '16.9', '-92.0')
+        other.video = SimpleUploadedFile('otro.mp4', self.video)
+        other.save()
+        self.assertEqual(other.video.name, f'places/videos/otro.{digest}.mp4')
+        other.video = SimpleUploadedFile('recorrido.mp4', self.video)
+        other.save()
+        self.assertEqual(other.video.name, self.place.video.name)
+
+    def test_full_response_is_immutable(self):
+        response = self.client.get(self.place.video.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.video)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], '"%s"' % hashlib.sha256(self.video).hexdigest()[:12])
+
+        response = self.client.get(self.place.video.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        url = self.place.video.url
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.video)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.video[100:200])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.video[-24:])
+        response = self.client.get(url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(response.streaming_content), self.video[1000:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.video)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.video)}')
+
+        # Con un If-Range que ya no corresponde se envía el archivo completo
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otro"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_delegated_to_web_server(self):
+        with override_settings(MEDIA_SERVE_MODE='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.client.get(self.place.video.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.place.video.name}')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with override_settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response = self.client.get(self.place.video.url)
+        self.assertEqual(response['X-Sendfile'], self.place.video.path)
+
+    def test_python_mode_only_with_debug(self):
+        with override_settings(DEBUG=False):
+            self.assertEqual(self.client.get(self.place.video.url).status_code, 404)
+            with override_settings(MEDIA_SERVE_MODE='x-accel'):
+                self.assertEqual(self.client.get(self.place.video.url).status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.client.get('/media/places/videos/no-existe.mp4').status_code, 404)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/places/').status_code, 404)
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        for setting in ('MEDIA_ROOT', 'RESUMABLE_UPLOAD_DIR'):
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory)
+            settings_override = override_settings(**{setting: directory}, TASKS_MODE='sync', RESUMABLE_UPLOAD_MAX_CHUNK=1024)
+            settings_override.enable()
+            self.addCleanup(settings_override.disable)
+        self.place = create_place(*create_catalogue(), 'Chichén Itzá', '20.68', '-88.56')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secreto123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.video = bytes(range(256)) * 10
+
+    def start(self, **extra):
+        data = {'filename': 'recorrido.mp4', 'size': len(self.video), **extra}
+        response = self.client.post(f'/api/v1/places/{self.place.pk}/video-upload/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def send(self, url, offset, chunk):
+        return self.client.generic(
+            'PATCH', url, chunk, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_upload_and_resume(self):
+        url = self.start(checksum=hashlib.sha256(self.video).hexdigest())
+        self.assertEqual(self.send(url, 0, self.video[:1000])['Upload-Offset'], '1000')
+
+        # Un reintento con el offset equivocado recibe el offset real
+        response = self.send(url, 0, self.video[:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 1000)
+        self.assertEqual(self.send(url, 1000, self.video[1000:5000]).status_code, 400)
+
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '1000')
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+        self.send(url, 1000, self.video[1000:2000])
+        self.send(url, 2000, self.video[2000:])
+
+        response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 200)
+        self.place.refresh_from_db()
+        with self.place.video.open('rb') as video:
+            self.assertEqual(video.read(), self.video)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.RESUMABLE_UPLOAD_DIR), [])
+
+    def test_checksum_mismatch(self):
+        url = self.start(checksum='0' * 64)
+        for offset in range(0, len(self.video), 1024):
+            self.send(url, offset, self.video[offset:offset + 1024])
+        response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(UploadSession.objects.exists())
+        self.place.refresh_from_db()
+        self.assertFalse(self.place.video)
+
+    def test_only_admins(self):
+        client = APIClient()
+        client.force_authenticate(create_user())
+        response = client.post(f'/api/v1/places/{self.place.pk}/video-upload/', {'filename': 'a.mp4', 'size': 10})
+        self.assertEqual(response.status_code, 403)
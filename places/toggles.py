@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Alternar favoritos y visitas con sentencias atómicas.
+
+Un toggle intenta primero borrar la fila del usuario y el lugar; si no
+había ninguna, la inserta con un INSERT ... SELECT que solo inserta si el
+lugar existe e ignora el conflicto con `unique_together` cuando otra
+petición simultánea ya la insertó. Así se resuelve en dos o tres
+sentencias sin lecturas previas y dos toques seguidos nunca terminan en
+un IntegrityError.
+
+Las sentencias no pasan por `save()` ni `delete()`, de modo que aquí se
+ajustan los contadores de popularidad y la versión del caché.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from binmap_api.cache import bump_version
+from .models import Place, Favorite, VisitedPlace
+from .popularity import adjust_popularity
+
+COUNTERS = {
+    Favorite: 'favorites',
+    VisitedPlace: 'visits',
+}
+
+
+def _delete(model, user, place_id, connection):
+    opts = model._meta
+    quote = connection.ops.quote_name
+    user_field = opts.get_field('user')
+    place_field = opts.get_field('place')
+    sql = 'DELETE FROM {} WHERE {} = %s AND {} = %s'.format(
+        quote(opts.db_table), quote(user_field.column), quote(place_field.column),
+    )
+    params = [
+        user_field.get_db_prep_value(user.pk, connection),
+        place_field.get_db_prep_value(place_id, connection),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _insert(instance, connection):
+    """
+    Inserta `instance` si el lugar existe y no hay otra fila del mismo
+    usuario y lugar. Devuelve False si no se insertó.
+    """
+    opts = instance._meta
+    quote = connection.ops.quote_name
+    fields = [field for field in opts.concrete_fields if not field.db_returning]
+    place_pk = Place._meta.pk
+    sql = 'INSERT INTO {} ({}) SELECT {} WHERE EXISTS (SELECT 1 FROM {} WHERE {} = %s) ON CONFLICT DO NOTHING'.format(
+        quote(opts.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        quote(Place._meta.db_table),
+        quote(place_pk.column),
+    )
+    params = [field.get_db_prep_save(field.pre_save(instance, add=True), connection) for field in fields]
+    params.append(place_pk.get_db_prep_value(instance.place_id, connection))
+
+    returning = opts.pk.db_returning and connection.features.can_return_columns_from_insert
+    if returning:
+        sql += ' RETURNING {}'.format(quote(opts.pk.column))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if returning:
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            instance.pk = row[0]
+        elif not cursor.rowcount:
+            return False
+        elif opts.pk.db_returning:
+            instance.pk = cursor.lastrowid
+    return True
+
+
+def toggle(model, user, place_id, **values):
+    """
+    Alterna la fila de `model` (`Favorite` o `VisitedPlace`) del usuario
+    para el lugar. Devuelve la fila creada, o None si se eliminó; lanza
+    `Place.DoesNotExist` si el lugar no existe.
+    """
+    try:
+        place_id = Place._meta.pk.to_python(place_id)
+    except ValidationError:
+        raise Place.DoesNotExist
+    using = router.db_for_write(model)
+    connection = connections[using]
+    counter = COUNTERS[model]
+
+    with transaction.atomic(using=using):
+        if _delete(model, user, place_id, connection):
+            adjust_popularity(place_id, **{counter: -1})
+            instance = None
+        else:
+            instance = model(user=user, place_id=place_id, **values)
+            if _insert(instance, connection):
+                adjust_popularity(place_id, **{counter: 1})
+            elif Place.objects.using(using).filter(pk=place_id).exists():
+                # Otra petición la insertó entre el DELETE y el INSERT
+                instance = model.objects.using(using).get(user=user, place_id=place_id)
+            else:
+                raise Place.DoesNotExist
+
+        bump_version(model)
+        transaction.on_commit(lambda: bump_version(model), using=using)
+    return instance
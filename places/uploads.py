@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Subidas reanudables de vídeos, al estilo de tus.
+
+1. Se crea una sesión con el nombre, el tamaño total y, opcionalmente, el
+   SHA-256 del archivo.
+2. Los bytes se envían en uno o varios PATCH con la cabecera
+   `Upload-Offset`, que debe coincidir con lo ya recibido. El cuerpo se
+   copia al archivo temporal de la sesión en bloques de CHUNK_READ_SIZE, sin
+   cargarlo en memoria; si la conexión se corta se conserva lo recibido y
+   el cliente continúa desde el offset que devuelve la sesión.
+3. Al finalizar se comprueba el tamaño y el SHA-256 y el archivo se mueve
+   al almacenamiento como vídeo del lugar.
+
+Solo una petición puede escribir en una sesión a la vez: la escritura
+reclama la sesión con un UPDATE condicionado al offset esperado, sin
+mantener abierta una transacción mientras llegan los datos.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.http import UnreadablePostError
+from django.utils import timezone
+from rest_framework import status
+
+from .models import UploadSession
+
+CHUNK_READ_SIZE = 64 * 1024
+# Una escritura que no terminó en este tiempo se da por abandonada
+LOCK_TIMEOUT = timedelta(minutes=10)
+
+
+class UploadError(Exception):
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class UploadConflict(UploadError):
+    status_code = status.HTTP_409_CONFLICT
+
+
+class UploadChecksumMismatch(UploadError):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class _PartFile(File):
+    """
+    Permite que el almacenamiento en disco mueva el archivo temporal en
+    lugar de copiarlo.
+    """
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(session):
+    return os.path.join(settings.RESUMABLE_UPLOAD_DIR, f'{session.pk}.part')
+
+
+def create_session(place, user, filename, size, checksum=''):
+    if not 0 < size <= settings.RESUMABLE_UPLOAD_MAX_SIZE:
+        raise UploadError(f"El tamaño debe estar entre 1 y {settings.RESUMABLE_UPLOAD_MAX_SIZE} bytes")
+    checksum = checksum.lower()
+    if checksum and (len(checksum) != 64 or any(char not in '0123456789abcdef' for char in checksum)):
+        raise UploadError("El checksum debe ser un SHA-256 en hexadecimal")
+
+    os.makedirs(settings.RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    session = UploadSession.objects.create(
+        place=place,
+        user=user,
+        filename=os.path.basename(filename),
+        size=size,
+        checksum=checksum,
+    )
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def _claim(session, offset):
+    now = timezone.now()
+    claimed = (
+        UploadSession.objects
+        .filter(pk=session.pk, offset=offset)
+        .filter(Q(locked_at__isnull=True) | Q(locked_at__lt=now - LOCK_TIMEOUT))
+        .update(locked_at=now)
+    )
+    if not claimed:
+        session.refresh_from_db(fields=['offset'])
+        raise UploadConflict("El offset no coincide con lo recibido o hay otra escritura en curso")
+
+
+def append_chunk(session, offset, stream, length):
+    """
+    Copia hasta `length` bytes de `stream` a partir de `offset` y devuelve
+    el nuevo offset.
+    """
+    if length > settings.RESUMABLE_UPLOAD_MAX_CHUNK:
+        raise UploadError(f"Cada fragmento puede tener como máximo {settings.RESUMABLE_UPLOAD_MAX_CHUNK} bytes")
+    if offset + length > session.size:
+        raise UploadError("El fragmento supera el tamaño declarado")
+
+    _claim(session, offset)
+
+    written = offset
+    try:
+        with open(part_path(session), 'r+b') as part:
+            # Descarta lo que quedara de un intento anterior interrumpido
+            part.seek(offset)
+            part.truncate()
+            remaining = length
+            while remaining:
+                try:
+                    chunk = stream.read(min(CHUNK_READ_SIZE, remaining))
+                except (OSError, UnreadablePostError):
+                    # Conexión cortada: se conserva lo recibido
+                    break
+                if not chunk:
+                    break
+                part.write(chunk)
+                remaining -= len(chunk)
+            written = part.tell()
+    finally:
+        UploadSession.objects.filter(pk=session.pk).update(offset=written, locked_at=None, updated_at=timezone.now())
+    session.offset = written
+    return written
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(session):
+    """
+    Comprueba la subida y la guarda como vídeo del lugar. La sesión se
+    elimina también si el checksum no coincide, para empezar de nuevo.
+    """
+    if session.offset != session.size:
+        raise UploadConflict(f"Faltan {session.size - session.offset} bytes por subir")
+    _claim(session, session.size)
+
+    path = part_path(session)
+    if session.checksum and _sha256(path) != session.checksum:
+        session.delete()
+        raise UploadChecksumMismatch("El checksum no coincide con el archivo recibido")
+
+    place = session.place
+    try:
+        with open(path, 'rb') as part:
+            place.video.save(session.filename, _PartFile(part), save=False)
+        place.save(update_fields=['video'])
+    except Exception:
+        UploadSession.objects.filter(pk=session.pk).update(locked_at=None)
+        raise
+    session.delete()
+    return place
+
+
+def remove_part(sender, instance, **kwargs):
+    try:
+        os.remove(part_path(instance))
+    except FileNotFoundError:
+        pass
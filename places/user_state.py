@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Estado de favorito y visita de varios lugares para un usuario.
+
+Se resuelve con una consulta a favoritos y otra a visitas, ambas sobre el
+índice (usuario, lugar), sin importar cuántos lugares se pidan.
+"""
+import uuid
+
+from .models import Favorite, VisitedPlace
+
+MAX_PLACES = 200
+
+
+def parse_place_ids(values):
+    """
+    Convierte y deduplica los ids recibidos conservando su orden. Lanza
+    ValueError si alguno no es un UUID válido.
+    """
+    place_ids = []
+    for value in values:
+        place_id = uuid.UUID(str(value).strip())
+        if place_id not in place_ids:
+            place_ids.append(place_id)
+    return place_ids
+
+
+def get_user_state(user, place_ids):
+    """
+    Devuelve {id: {'favorite', 'visited', 'visited_date'}} para cada lugar.
+    """
+    favorites = set(
+        Favorite.objects
+        .filter(user=user, place_id__in=place_ids)
+        .values_list('place_id', flat=True)
+    )
+    visits = dict(
+        VisitedPlace.objects
+        .filter(user=user, place_id__in=place_ids)
+        .values_list('place_id', 'visited_date')
+    )
+    return {
+        place_id: {
+            'favorite': place_id in favorites,
+            'visited': place_id in visits,
+            'visited_date': visits.get(place_id),
+        }
+        for place_id in place_ids
+    }
@@ -3,13 +3,21 @@ from rest_framework import viewsets, permissions, filters
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.db import IntegrityError
-from .models import State, Municipality, Category, Place, Favorite, VisitedPlace
+from django.http import Http404, StreamingHttpResponse
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from .models import State, Municipality, Category, Place, Favorite, VisitedPlace, UploadSession
+from .filters import GeoFilter, PlaceOrderingFilter, PlaceSearchFilter, RelatedIdFilter
+from .popularity import adjust_popularity
+from .toggles import toggle
+from .user_state import MAX_PLACES, get_user_state, parse_place_ids
+from . import uploads
 from .serializers import (
     StateSerializer, 
     MunicipalitySerializer, 
     CategorySerializer, 
     PlaceSerializer, 
+    PlaceBulkSerializer,
     FavoriteSerializer,
     FavoriteDetailSerializer,
     VisitedPlaceSerializer,
@@ -17,7 +25,21 @@ from .serializers import (
 )
 from django.contrib.auth import get_user_model
 from rest_framework.decorators import action
+from rest_framework.fields import DateField
+from rest_framework.reverse import reverse
 from django.utils import timezone
+from binmap_api.metrics import SerializerTimingMixin, timed
+from binmap_api.query_plan import QueryPlanMixin
+from binmap_api.sparse_fields import SparseFieldsMixin
+from binmap_api.pagination import KeysetPagination
+from binmap_api.cache import CachedResponseMixin
+from binmap_api.conditional import ConditionalGetMixin
+from binmap_api.bulk import BulkMixin
+from binmap_api.renderers import NDJSONRenderer, CSVRenderer
+from binmap_api.throttling import SearchThrottle
+from .export import export_rows, stream_csv, stream_ndjson
+from . import offline
+from routes.models import Route
 
 User = get_user_model()
 
@@ -34,85 +56,302 @@ class IsAdminUserOrReadOnly(permissions.BasePermission):
         return request.user and (request.user.is_staff or request.user.is_superuser)
 
 
-class StateViewSet(viewsets.ModelViewSet):
+def visit_values(data):
+    """
+    Fecha y notas de una visita tomadas de los datos de la petición
+    """
+    return {
+        'visited_date': DateField().run_validation(data.get('visited_date', timezone.now().date())),
+        'notes': data.get('notes', ''),
+    }
+
+
+class StateViewSet(SerializerTimingMixin, ConditionalGetMixin, CachedResponseMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = State.objects.all()
     serializer_class = StateSerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    cache_models = (State,)
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
 
-class MunicipalityViewSet(viewsets.ModelViewSet):
+class MunicipalityViewSet(SerializerTimingMixin, ConditionalGetMixin, CachedResponseMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Municipality.objects.all()
     serializer_class = MunicipalitySerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    cache_models = (Municipality, State)
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'state__name']
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SerializerTimingMixin, ConditionalGetMixin, CachedResponseMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    cache_models = (Category,)
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
 
-class PlaceViewSet(viewsets.ModelViewSet):
+class PlaceViewSet(SerializerTimingMixin, BulkMixin, ConditionalGetMixin, CachedResponseMixin, SparseFieldsMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Place.objects.all()
     serializer_class = PlaceSerializer
     permission_classes = [IsAdminUserOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'municipality__name', 'municipality__id', 'category__name', 'category__id', 'route__name', 'route__id']
+    cache_models = (Place, Municipality, State, Category, Route)
+    pagination_class = KeysetPagination
+    throttle_classes = [*viewsets.ModelViewSet.throttle_classes, SearchThrottle]
+    filter_backends = [RelatedIdFilter, PlaceSearchFilter, GeoFilter, PlaceOrderingFilter]
+    related_id_filters = {
+        'municipality': 'municipality_id',
+        'category': 'category_id',
+        'route': 'route_id',
+    }
+    # La paginación por cursor lee del último lugar los campos de ?ordering=popular
+    sparse_extra_columns = ('favorites_count', 'visits_count')
+    bulk_serializer_class = PlaceBulkSerializer
+    bulk_foreign_keys = {
+        'municipality_id': Municipality,
+        'category_id': Category,
+        'route_id': Route,
+    }
+
+    def get_cache_models(self):
+        models = super().get_cache_models()
+        if self.request.query_params.get('ordering') == 'popular' or self.includes_user_state():
+            # El orden o el estado dependen de los favoritos y las visitas
+            models = models + (Favorite, VisitedPlace)
+        return models
+
+    def includes_user_state(self):
+        return (
+            self.action == 'list'
+            and self.request.user.is_authenticated
+            and self.request.query_params.get('include') == 'user_state'
+        )
+
+    @property
+    def conditional_per_user(self):
+        return self.includes_user_state()
+
+    def should_cache_response(self, request):
+        return not self.includes_user_state()
+
+    def get_paginated_response(self, data):
+        if self.includes_user_state():
+            place_ids = parse_place_ids(item['id'] for item in data)
+            states = {str(place_id): state for place_id, state in get_user_state(self.request.user, place_ids).items()}
+            for item in data:
+                item['user_state'] = states[item['id']]
+        return super().get_paginated_response(data)
+
+    def prepare_bulk_instance(self, instance):
+        instance.update_geohash()
+        return instance
+
+    def bulk_written(self, results):
+        super().bulk_written(results)
+        # Las escrituras masivas no pasan por las señales del registro de cambios
+        offline.record_changes(Place, [
+            result['id'] for result in results if result['status'] in ('created', 'updated')
+        ])
+
+    def get_bulk_update_fields(self, fields):
+        if {'latitude', 'longitude'} & fields:
+            fields = fields | {'geohash'}
+        return super().get_bulk_update_fields(fields)
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Exporta el catálogo completo como NDJSON (`?format=ndjson`) o CSV
+        (`?format=csv`), aceptando los mismos filtros que la lista
+        """
+        rows = export_rows(self.filter_queryset(self.get_queryset()), request)
+        if request.accepted_renderer.format == CSVRenderer.format:
+            response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="places.csv"'
+        else:
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson; charset=utf-8')
+        return response
+
+    @action(detail=False, methods=['get', 'post'], url_path='user-state', permission_classes=[permissions.IsAuthenticated])
+    def user_state(self, request):
+        """
+        Indica si el usuario tiene como favorito o visitó cada uno de los
+        lugares pedidos (`?ids=id1,id2` o `{"ids": [...]}` por POST)
+        """
+        if request.method == 'POST':
+            values = request.data.get('ids', [])
+            if not isinstance(values, list):
+                values = [values]
+        else:
+            values = [value for value in request.query_params.get('ids', '').split(',') if value]
+
+        if not values:
+            return Response(
+                {"error": "Se requiere la lista de IDs de lugares"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(values) > MAX_PLACES:
+            return Response(
+                {"error": f"Se pueden consultar como máximo {MAX_PLACES} lugares"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            place_ids = parse_place_ids(values)
+        except ValueError:
+            return Response(
+                {"error": "Alguno de los IDs no es válido"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        states = get_user_state(request.user, place_ids)
+        return Response({str(place_id): state for place_id, state in states.items()})
+
+    def upload_session_response(self, request, session, status_code=status.HTTP_200_OK):
+        url = reverse(
+            'place-video-upload-session',
+            kwargs={'pk': session.place_id, 'session_id': session.pk},
+            request=request,
+        )
+        headers = {
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.size),
+            'Cache-Control': 'no-store',
+        }
+        if status_code == status.HTTP_201_CREATED:
+            headers['Location'] = url
+        data = {
+            "id": session.pk,
+            "filename": session.filename,
+            "size": session.size,
+            "offset": session.offset,
+            "url": url,
+        }
+        return Response(data, status=status_code, headers=headers)
+
+    def upload_error_response(self, error, session=None):
+        data = {"error": str(error)}
+        headers = {}
+        if session is not None:
+            data["offset"] = session.offset
+            headers['Upload-Offset'] = str(session.offset)
+        return Response(data, status=error.status_code, headers=headers)
+
+    @action(detail=True, methods=['post'], url_path='video-upload', permission_classes=[permissions.IsAdminUser])
+    def video_upload(self, request, pk=None):
+        """
+        Inicia la subida reanudable del vídeo del lugar a partir de su
+        nombre (`filename`), tamaño en bytes (`size`) y, opcionalmente, su
+        SHA-256 (`checksum`)
+        """
+        place = get_object_or_404(Place, pk=pk)
+        filename = request.data.get('filename')
+        try:
+            size = int(request.data.get('size', 0))
+        except (TypeError, ValueError):
+            size = 0
+        if not filename:
+            return Response(
+                {"error": "Se requiere el nombre del archivo"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            session = uploads.create_session(place, request.user, filename, size, request.data.get('checksum') or '')
+        except uploads.UploadError as error:
+            return self.upload_error_response(error)
+        return self.upload_session_response(request, session, status.HTTP_201_CREATED)
+
+    @action(
+        detail=True,
+        methods=['get', 'patch', 'delete'],
+        url_path=r'video-upload/(?P<session_id>[0-9a-f-]{36})',
+        url_name='video-upload-session',
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def video_upload_session(self, request, pk=None, session_id=None):
+        """
+        GET/HEAD: bytes recibidos. PATCH: añade al archivo el cuerpo de la
+        petición a partir de la cabecera `Upload-Offset`. DELETE: cancela la
+        subida
+        """
+        session = get_object_or_404(UploadSession, pk=session_id, place_id=pk, user=request.user)
+        if request.method == 'DELETE':
+            session.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method == 'PATCH':
+            try:
+                offset = int(request.headers['Upload-Offset'])
+                length = int(request.headers['Content-Length'])
+            except (KeyError, ValueError):
+                return Response(
+                    {"error": "Se requieren las cabeceras Upload-Offset y Content-Length"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                # Se lee del flujo de la petición, nunca de request.data
+                uploads.append_chunk(session, offset, request.stream, length)
+            except uploads.UploadError as error:
+                return self.upload_error_response(error, session)
+        return self.upload_session_response(request, session)
+
+    @action(
+        detail=True,
+        methods=['post'],
+        url_path=r'video-upload/(?P<session_id>[0-9a-f-]{36})/finalize',
+        url_name='video-upload-finalize',
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def video_upload_finalize(self, request, pk=None, session_id=None):
+        """
+        Comprueba que la subida esté completa y su checksum, y la guarda como
+        vídeo del lugar
+        """
+        session = get_object_or_404(UploadSession, pk=session_id, place_id=pk, user=request.user)
+        try:
+            place = uploads.finalize(session)
+        except uploads.UploadError as error:
+            return self.upload_error_response(error, session)
+        serializer = self.get_serializer(place)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def toggle_visited(self, request, pk=None):
         """
         Marca o desmarca un lugar como visitado por el usuario actual
         """
-        place = self.get_object()
-        user = request.user
-        
-        # Verificar si el lugar ya está marcado como visitado por este usuario
-        visited = VisitedPlace.objects.filter(place=place, user=user).first()
-        
-        if visited:
-            # Si ya está marcado como visitado, lo eliminamos
-            visited.delete()
+        try:
+            visited = toggle(VisitedPlace, request.user, pk, **visit_values(request.data))
+        except Place.DoesNotExist:
+            raise Http404
+
+        if visited is None:
             return Response(
                 {"message": "Lugar desmarcado como visitado correctamente"}, 
                 status=status.HTTP_200_OK
             )
-        else:
-            # Si no está marcado como visitado, lo marcamos
-            visited_date = request.data.get('visited_date', timezone.now().date())
-            notes = request.data.get('notes', '')
-            
-            visited = VisitedPlace.objects.create(
-                place=place,
-                user=user,
-                visited_date=visited_date,
-                notes=notes
-            )
-            
-            serializer = VisitedPlaceSerializer(visited)
-            return Response(
-                {"message": "Lugar marcado como visitado correctamente", "data": serializer.data},
-                status=status.HTTP_201_CREATED
-            )
+        serializer = timed(VisitedPlaceSerializer(visited))
+        return Response(
+            {"message": "Lugar marcado como visitado correctamente", "data": serializer.data},
+            status=status.HTTP_201_CREATED
+        )
 
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(SerializerTimingMixin, ConditionalGetMixin, QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = Favorite.objects.all()
     serializer_class = FavoriteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_models = (Favorite, Place, Municipality, State, Category, Route)
+    conditional_per_user = True
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
 
-    def list(self, request):
-        queryset = self.get_queryset()
-        serializer = FavoriteDetailSerializer(queryset, many=True)
-        return Response(serializer.data)
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return FavoriteDetailSerializer
+        return super().get_serializer_class()
 
     def create(self, request):
         # Verificar si el favorito ya existe antes de intentar crearlo
@@ -131,7 +370,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         
         if existing_favorite:
             # Si ya existe, devolver el favorito existente con un mensaje
-            serializer = FavoriteDetailSerializer(existing_favorite)
+            serializer = timed(FavoriteDetailSerializer(existing_favorite))
             return Response(
                 {
                     "message": "Este lugar ya está en tus favoritos",
@@ -150,7 +389,9 @@ class FavoriteViewSet(viewsets.ModelViewSet):
             
             serializer = self.get_serializer(data=data)
             if serializer.is_valid():
-                serializer.save()
+                with transaction.atomic():
+                    instance = serializer.save()
+                    adjust_popularity(instance.place_id, favorites=1)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -162,7 +403,9 @@ class FavoriteViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, pk=None):
         favorite = get_object_or_404(Favorite, id=pk, user=request.user)
-        favorite.delete()
+        with transaction.atomic():
+            favorite.delete()
+            adjust_popularity(favorite.place_id, favorites=-1)
         return Response(status=status.HTTP_204_NO_CONTENT)
         
     @action(detail=False, methods=['post'])
@@ -177,48 +420,41 @@ class FavoriteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Verificar si el favorito ya existe
-        existing_favorite = Favorite.objects.filter(
-            user=request.user, 
-            place_id=place_id
-        ).first()
-        
-        if existing_favorite:
-            # Si ya existe, eliminarlo
-            existing_favorite.delete()
+        try:
+            favorite = toggle(Favorite, request.user, place_id)
+        except Place.DoesNotExist:
+            return Response(
+                {"error": "El lugar no existe"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if favorite is None:
             return Response(
                 {"message": "Favorito eliminado correctamente"}, 
                 status=status.HTTP_200_OK
             )
-        else:
-            # Si no existe, crearlo
-            data = {
-                'place': place_id,
-                'user': request.user.id
-            }
-            
-            serializer = self.get_serializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(
-                    {"message": "Favorito agregado correctamente", "data": serializer.data}, 
-                    status=status.HTTP_201_CREATED
-                )
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(favorite)
+        return Response(
+            {"message": "Favorito agregado correctamente", "data": serializer.data}, 
+            status=status.HTTP_201_CREATED
+        )
 
 
-class VisitedPlaceViewSet(viewsets.ModelViewSet):
+class VisitedPlaceViewSet(SerializerTimingMixin, ConditionalGetMixin, QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = VisitedPlace.objects.all()
     serializer_class = VisitedPlaceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_models = (VisitedPlace, Place, Municipality, State, Category, Route)
+    conditional_per_user = True
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return VisitedPlace.objects.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
 
-    def list(self, request):
-        queryset = self.get_queryset()
-        serializer = VisitedPlaceDetailSerializer(queryset, many=True)
-        return Response(serializer.data)
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return VisitedPlaceDetailSerializer
+        return super().get_serializer_class()
 
     def create(self, request):
         # Verificar si el lugar ya está marcado como visitado antes de intentar crearlo
@@ -237,7 +473,7 @@ class VisitedPlaceViewSet(viewsets.ModelViewSet):
         
         if existing_visit:
             # Si ya está marcado como visitado, devolver el registro existente con un mensaje
-            serializer = VisitedPlaceDetailSerializer(existing_visit)
+            serializer = timed(VisitedPlaceDetailSerializer(existing_visit))
             return Response(
                 {
                     "message": "Este lugar ya está marcado como visitado",
@@ -258,7 +494,9 @@ class VisitedPlaceViewSet(viewsets.ModelViewSet):
             
             serializer = self.get_serializer(data=data)
             if serializer.is_valid():
-                serializer.save()
+                with transaction.atomic():
+                    instance = serializer.save()
+                    adjust_popularity(instance.place_id, visits=1)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -270,7 +508,9 @@ class VisitedPlaceViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, pk=None):
         visited_place = get_object_or_404(VisitedPlace, id=pk, user=request.user)
-        visited_place.delete()
+        with transaction.atomic():
+            visited_place.delete()
+            adjust_popularity(visited_place.place_id, visits=-1)
         return Response(status=status.HTTP_204_NO_CONTENT)
         
     @action(detail=False, methods=['post'])
@@ -285,34 +525,60 @@ class VisitedPlaceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Verificar si el lugar ya está marcado como visitado
-        existing_visit = VisitedPlace.objects.filter(
-            user=request.user, 
-            place_id=place_id
-        ).first()
-        
-        if existing_visit:
-            # Si ya está marcado como visitado, lo eliminamos
-            existing_visit.delete()
+        try:
+            visited = toggle(VisitedPlace, request.user, place_id, **visit_values(request.data))
+        except Place.DoesNotExist:
+            return Response(
+                {"error": "El lugar no existe"}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if visited is None:
             return Response(
                 {"message": "Lugar desmarcado como visitado correctamente"}, 
                 status=status.HTTP_200_OK
             )
-        else:
-            # Si no está marcado como visitado, lo marcamos
-            data = {
-                'place': place_id,
-                'user': request.user.id,
-                'visited_date': request.data.get('visited_date', timezone.now().date()),
-                'notes': request.data.get('notes', '')
-            }
-            
-            serializer = self.get_serializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(
-                    {"message": "Lugar marcado como visitado correctamente", "data": serializer.data}, 
-                    status=status.HTTP_201_CREATED
-                )
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(visited)
+        return Response(
+            {"message": "Lugar marcado como visitado correctamente", "data": serializer.data}, 
+            status=status.HTTP_201_CREATED
+        )
+
+
+class OfflineBundleViewSet(ConditionalGetMixin, viewsets.ViewSet):
+    """
+    API endpoint that returns the offline catalogue bundle
+    """
+    permission_classes = [permissions.AllowAny]
+    cache_models = (State, Municipality, Category, Route, Place)
+
+    def list(self, request):
+        """
+        Devuelve la ubicación del paquete del catálogo para la versión
+        actual: completo, o solo los cambios desde `since`
+        """
+        version = offline.current_version()
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+        if not 0 <= since <= version:
+            # Antes de comprobar If-Modified-Since: un 304 no debe ocultar el error
+            return Response(
+                {"error": f"'since' debe ser una versión entre 0 y {version}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if since and since < offline.compacted_version():
+            # El registro de cambios ya no llega hasta `since`: paquete completo
+            since = 0
+        return self.conditional_response(self.bundle_response, request, version, since)
+
+    def bundle_response(self, request, version, since):
+        name = offline.get_bundle(version, since)
+        return Response({
+            "format": offline.FORMAT,
+            "version": version,
+            "since": since,
+            "url": request.build_absolute_uri(default_storage.url(name)),
+            "size": default_storage.size(name),
+        })
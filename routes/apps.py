@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RoutesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'routes'
+
+    def ready(self):
+        from binmap_api.cache import track_model_changes
+
+        track_model_changes(self.get_model('Route'), self.get_model('Municipality_has_Route'))
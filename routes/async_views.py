@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from binmap_api.async_views import AsyncReadView
+from .models import Route
+from .serializers import RouteSerializer
+
+
+class RouteAsyncView(AsyncReadView):
+    queryset = Route.objects.all()
+    serializer_class = RouteSerializer
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:15
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('places', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('duration', models.TimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Municipality_has_Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('municipality', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='places.municipality')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='routes.route')),
+            ],
+            options={
+                'verbose_name': 'Ruta Municipal',
+                'verbose_name_plural': 'Rutas Municipales',
+                'indexes': [models.Index(fields=['route', 'municipality'], name='route_municipality_idx')],
+                'unique_together': {('municipality', 'route')},
+            },
+        ),
+    ]
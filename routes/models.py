@@ -18,6 +18,9 @@ class Municipality_has_Route(models.Model):
 
     class Meta:
         unique_together = ('municipality', 'route')
+        indexes = [
+            models.Index(fields=['route', 'municipality'], name='route_municipality_idx'),
+        ]
         verbose_name = "Ruta Municipal"
         verbose_name_plural = "Rutas Municipales"
 
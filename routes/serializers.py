@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 from rest_framework import serializers
+from binmap_api.fast_serializers import FastListSerializer
 from places.serializers import MunicipalitySerializer, PlaceSerializer
 from .models import Route, Municipality_has_Route
 
 
 class RouteSerializer(serializers.ModelSerializer):
-    places = PlaceSerializer(read_only=True, many=True)
+    places = PlaceSerializer(source='place_set', read_only=True, many=True)
 
     class Meta:
         model = Route
+        list_serializer_class = FastListSerializer
         fields = ('id', 'name', 'description', 'duration', 'places', 'municipalities')
 
     class NestedMunicipalityHasRouteSerializer(serializers.ModelSerializer):
@@ -16,9 +18,34 @@ class RouteSerializer(serializers.ModelSerializer):
 
         class Meta:
             model = Municipality_has_Route
-            fields = ('municipality')
+            list_serializer_class = FastListSerializer
+            fields = ('municipality',)
 
-    municipalities = NestedMunicipalityHasRouteSerializer(read_only=True, many=True)
+    municipalities = NestedMunicipalityHasRouteSerializer(source='municipality_has_route_set', read_only=True, many=True)
+
+
+class RouteSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight route representation; `place_count` and the bounding box
+    come from SQL aggregates annotated by `RouteViewSet`.
+    """
+    place_count = serializers.IntegerField(read_only=True)
+    municipalities = serializers.SerializerMethodField()
+    bbox = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Route
+        list_serializer_class = FastListSerializer
+        fields = ('id', 'name', 'duration', 'place_count', 'municipalities', 'bbox')
+        prefetch_related = ('municipality_has_route_set',)
+
+    def get_municipalities(self, route):
+        return [link.municipality_id for link in route.municipality_has_route_set.all()]
+
+    def get_bbox(self, route):
+        if route.min_latitude is None:
+            return None
+        return [float(route.min_longitude), float(route.min_latitude), float(route.max_longitude), float(route.max_latitude)]
 
 
 class MunicipalityHasRouteSerializer(serializers.ModelSerializer):
@@ -27,4 +54,15 @@ class MunicipalityHasRouteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Municipality_has_Route
+        list_serializer_class = FastListSerializer
         fields = ('route', 'municipality')
+
+
+class MunicipalityHasRouteBulkSerializer(serializers.ModelSerializer):
+    municipality = serializers.UUIDField(source='municipality_id')
+    route = serializers.UUIDField(source='route_id')
+
+    class Meta:
+        model = Municipality_has_Route
+        fields = ('municipality', 'route')
+        validators = []
@@ -1,3 +1,96 @@
+from datetime import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from places.models import State, Municipality, Category, Place
+from .models import Route, Municipality_has_Route
+
+User = get_user_model()
+
+
+class MunicipalityHasRouteBulkTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='admin', email='admin@example.com', password='secreto123', is_staff=True,
+        ))
+        state = State.objects.create(name='Yucatán')
+        self.merida = Municipality.objects.create(name='Mérida', state=state)
+        self.izamal = Municipality.objects.create(name='Izamal', state=state)
+        self.route = Route.objects.create(name='Ruta Maya', duration=time(2, 30))
+
+    def test_create_rejects_duplicates(self):
+        Municipality_has_Route.objects.create(municipality=self.merida, route=self.route)
+        link = {'municipality': str(self.izamal.pk), 'route': str(self.route.pk)}
+        existing = {'municipality': str(self.merida.pk), 'route': str(self.route.pk)}
+
+        response = self.client.post('/api/v1/municipality-routes/bulk/', [link, link, existing], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['status'] for row in response.data['results']], ['created', 'error', 'error'])
+        self.assertEqual(Municipality_has_Route.objects.count(), 2)
+
+
+class RouteListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def add_route(self, index):
+        state = State.objects.create(name=f'Estado {index}')
+        category = Category.objects.create(name=f'Categoría {index}')
+        route = Route.objects.create(name=f'Ruta {index}', duration=time(1, 15))
+        for number in range(2):
+            municipality = Municipality.objects.create(name=f'Municipio {index}-{number}', state=state)
+            Municipality_has_Route.objects.create(municipality=municipality, route=route)
+            Place.objects.create(
+                name=f'Lugar {index}-{number}',
+                description='',
+                latitude=f'2{number}.50000000',
+                longitude=f'-8{number}.25000000',
+                municipality=municipality,
+                category=category,
+                route=route,
+            )
+        return route
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_nested_places_and_municipalities_in_fixed_queries(self):
+        self.add_route(0)
+        response, queries = self.get('/api/v1/routes/')
+        route = response.data['results'][0]
+        self.assertEqual(len(route['places']), 2)
+        self.assertEqual(route['places'][0]['route']['name'], 'Ruta 0')
+        self.assertEqual(len(route['municipalities']), 2)
+        self.assertIn('state', route['municipalities'][0]['municipality'])
+
+        links, link_queries = self.get('/api/v1/municipality-routes/')
+        self.assertEqual(len(links.data['results'][0]['route']['places']), 2)
+
+        for index in range(1, 6):
+            self.add_route(index)
+        self.assertEqual(self.get('/api/v1/routes/')[1], queries)
+        self.assertEqual(self.get('/api/v1/municipality-routes/')[1], link_queries)
+
+    def test_summary(self):
+        route = self.add_route(0)
+        Route.objects.create(name='Vacía', duration=time(0, 30))
+        response, _ = self.get('/api/v1/routes/?view=summary')
+        summaries = {item['name']: item for item in response.data['results']}
 
-# Create your tests here.
+        self.assertEqual(summaries['Ruta 0']['place_count'], 2)
+        self.assertEqual(summaries['Ruta 0']['bbox'], [-81.25, 20.5, -80.25, 21.5])
+        self.assertEqual(
+            set(summaries['Ruta 0']['municipalities']),
+            set(route.municipality_has_route_set.values_list('municipality_id', flat=True)),
+        )
+        self.assertNotIn('places', summaries['Ruta 0'])
+        self.assertEqual(summaries['Vacía']['place_count'], 0)
+        self.assertIsNone(summaries['Vacía']['bbox'])
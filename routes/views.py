@@ -1,7 +1,19 @@
 # -*- coding: utf-8 -*-
 from rest_framework import viewsets, permissions
+from django.db.models import Count, Max, Min
+from binmap_api.metrics import SerializerTimingMixin
+from binmap_api.query_plan import QueryPlanMixin
+from binmap_api.cache import CachedResponseMixin
+from binmap_api.conditional import ConditionalGetMixin
+from binmap_api.bulk import BulkMixin
+from places.models import Place, Municipality, State, Category
 from .models import Route, Municipality_has_Route
-from .serializers import RouteSerializer, MunicipalityHasRouteSerializer
+from .serializers import (
+    RouteSerializer,
+    RouteSummarySerializer,
+    MunicipalityHasRouteSerializer,
+    MunicipalityHasRouteBulkSerializer
+)
 
 
 class IsAdminUserOrReadOnly(permissions.BasePermission):
@@ -16,19 +28,47 @@ class IsAdminUserOrReadOnly(permissions.BasePermission):
         return request.user and (request.user.is_staff or request.user.is_superuser)
 
 
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(SerializerTimingMixin, ConditionalGetMixin, CachedResponseMixin, QueryPlanMixin, viewsets.ModelViewSet):
     """
-    API endpoint to view and edit routes
+    API endpoint to view and edit routes. `?view=summary` returns per-route
+    place counts, municipality ids and bounding box instead of nested data.
     """
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    cache_models = (Route, Municipality_has_Route, Place, Municipality, State, Category)
 
+    def is_summary(self):
+        return self.request.query_params.get('view') == 'summary' and self.request.method == 'GET'
 
-class MunicipalityHasRouteViewSet(viewsets.ModelViewSet):
+    def get_serializer_class(self):
+        if self.is_summary():
+            return RouteSummarySerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.is_summary():
+            queryset = queryset.annotate(
+                place_count=Count('place'),
+                min_latitude=Min('place__latitude'),
+                max_latitude=Max('place__latitude'),
+                min_longitude=Min('place__longitude'),
+                max_longitude=Max('place__longitude'),
+            )
+        return queryset
+
+
+class MunicipalityHasRouteViewSet(SerializerTimingMixin, BulkMixin, ConditionalGetMixin, CachedResponseMixin, QueryPlanMixin, viewsets.ModelViewSet):
     """
     API endpoint to view and edit relationships between municipalities and routes
     """
     queryset = Municipality_has_Route.objects.all()
     serializer_class = MunicipalityHasRouteSerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    cache_models = (Municipality_has_Route, Route, Place, Municipality, State, Category)
+    bulk_serializer_class = MunicipalityHasRouteBulkSerializer
+    bulk_foreign_keys = {
+        'municipality_id': Municipality,
+        'route_id': Route,
+    }